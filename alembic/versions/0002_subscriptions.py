@@ -0,0 +1,231 @@
+"""Structured subscriptions table
+
+Переносит текстовые users.subscription_settings в таблицу subscriptions
+с временем следующей отправки и индексами для выборки наступивших подписок.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# Разбор настроек зафиксирован здесь в виде на момент миграции:
+# изменения services/subscriptions.py и services/cities.py не должны
+# менять то, что делает уже выпущенная миграция.
+_KINDS = ("weather", "news", "events")
+_FREQUENCIES = ("hourly", "daily", "weekly")
+_TIME_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+_SPACES_RE = re.compile(r"\s+")
+_DASHES_RE = re.compile(r"\s*[-‐‑–—]\s*")
+
+_CITY_ALIASES = {
+    "moscow": "москва",
+    "moskva": "москва",
+    "msk": "москва",
+    "мск": "москва",
+    "saint petersburg": "санкт-петербург",
+    "saint-petersburg": "санкт-петербург",
+    "st petersburg": "санкт-петербург",
+    "st. petersburg": "санкт-петербург",
+    "st-petersburg": "санкт-петербург",
+    "sankt-peterburg": "санкт-петербург",
+    "spb": "санкт-петербург",
+    "спб": "санкт-петербург",
+    "питер": "санкт-петербург",
+    "петербург": "санкт-петербург",
+    "kazan": "казань",
+    "novosibirsk": "новосибирск",
+    "yekaterinburg": "екатеринбург",
+    "ekaterinburg": "екатеринбург",
+    "екб": "екатеринбург",
+    "nizhny novgorod": "нижний новгород",
+    "nizhniy novgorod": "нижний новгород",
+    "нн": "нижний новгород",
+    "samara": "самара",
+    "omsk": "омск",
+    "rostov-on-don": "ростов-на-дону",
+    "rostov-na-donu": "ростов-на-дону",
+    "ростов": "ростов-на-дону",
+    "ufa": "уфа",
+    "krasnoyarsk": "красноярск",
+    "perm": "пермь",
+    "voronezh": "воронеж",
+    "volgograd": "волгоград",
+    "krasnodar": "краснодар",
+    "sochi": "сочи",
+    "kaliningrad": "калининград",
+    "vladivostok": "владивосток",
+    "minsk": "минск",
+}
+
+
+def _normalize_city(city):
+    key = _SPACES_RE.sub(" ", city.strip()).casefold().replace("ё", "е")
+    key = _DASHES_RE.sub("-", key)
+    return _CITY_ALIASES.get(key, key)
+
+
+def _make_subscription(kind, city=None, frequency="daily", time=None):
+    """(тип, город, частота, время) или None, если подписка некорректна."""
+    kind = (kind or "").strip().lower()
+    frequency = (frequency or "daily").strip().lower()
+    if kind not in _KINDS or frequency not in _FREQUENCIES:
+        return None
+    if kind == "weather" and not city:
+        return None
+    time = time or ("00:00" if frequency == "hourly" else "09:00")
+    if not _TIME_RE.match(time):
+        return None
+    hour, minute = time.split(":")
+    return kind, city.strip() if city else None, frequency, f"{int(hour):02d}:{minute}"
+
+
+def _parse_settings(settings):
+    """Подписки из users.subscription_settings (JSON или текст)."""
+    if not settings or not settings.strip():
+        return []
+
+    try:
+        data = json.loads(settings)
+    except ValueError:
+        data = None
+
+    subscriptions = []
+    if isinstance(data, (dict, list)):
+        items = [data] if isinstance(data, dict) else data
+        for item in items:
+            if isinstance(item, dict):
+                subscriptions.append(_make_subscription(
+                    item.get("kind") or item.get("type"),
+                    item.get("city"),
+                    item.get("frequency"),
+                    item.get("time"),
+                ))
+        return [s for s in subscriptions if s]
+
+    for line in re.split(r"[;\n]", settings):
+        words = line.split()
+        if not words:
+            continue
+        kind, rest = words[0], words[1:]
+        time = rest.pop() if rest and _TIME_RE.match(rest[-1]) else None
+        frequency = rest.pop() if rest and rest[-1].lower() in _FREQUENCIES else None
+        city = " ".join(rest) or None
+        subscriptions.append(_make_subscription(kind, city, frequency, time))
+    return [s for s in subscriptions if s]
+
+
+def _next_run_at(frequency, send_time, after, tz):
+    """Ближайшее время отправки строго позже after (наивное UTC); weekly — по понедельникам."""
+    local = after.replace(tzinfo=timezone.utc).astimezone(tz)
+    hour, minute = map(int, send_time.split(":"))
+
+    if frequency == "hourly":
+        candidate = local.replace(minute=minute, second=0, microsecond=0)
+        step = timedelta(hours=1)
+    else:
+        candidate = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        step = timedelta(days=1)
+        if frequency == "weekly":
+            candidate += timedelta(days=-local.weekday() % 7)
+            step = timedelta(days=7)
+
+    while candidate <= local:
+        candidate += step
+    return candidate.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if not inspector.has_table("subscriptions"):
+        op.create_table(
+            "subscriptions",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("kind", sa.String(length=32), nullable=False),
+            sa.Column("city", sa.String(length=255), nullable=True),
+            sa.Column("city_name", sa.String(length=255), nullable=True),
+            sa.Column("frequency", sa.String(length=16), nullable=False),
+            sa.Column("send_time", sa.String(length=5), nullable=False),
+            sa.Column("next_run_at", sa.DateTime(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+    existing = {index["name"] for index in sa.inspect(bind).get_indexes("subscriptions")}
+    indexes = {
+        "ix_subscriptions_user_id": ["user_id"],
+        "ix_subscriptions_kind_city_next_run_at": ["kind", "city", "next_run_at"],
+        "ix_subscriptions_next_run_at": ["next_run_at"],
+    }
+    for name, columns in indexes.items():
+        if name not in existing:
+            op.create_index(name, "subscriptions", columns)
+
+    # Перенос существующих текстовых настроек
+    users = sa.table(
+        "users",
+        sa.column("id", sa.Integer),
+        sa.column("subscription_settings", sa.Text),
+    )
+    subscriptions = sa.table(
+        "subscriptions",
+        sa.column("user_id", sa.Integer),
+        sa.column("kind", sa.String),
+        sa.column("city", sa.String),
+        sa.column("city_name", sa.String),
+        sa.column("frequency", sa.String),
+        sa.column("send_time", sa.String),
+        sa.column("next_run_at", sa.DateTime),
+        sa.column("created_at", sa.DateTime),
+    )
+    tz = ZoneInfo(os.getenv("SUBSCRIPTION_TIMEZONE", "Europe/Moscow"))
+    now = datetime.utcnow()
+
+    result = bind.execute(
+        sa.select(users.c.id, users.c.subscription_settings)
+        .where(users.c.subscription_settings.is_not(None))
+    )
+    batch = []
+    for user_id, settings in result:
+        for kind, city, frequency, send_time in _parse_settings(settings):
+            batch.append({
+                "user_id": user_id,
+                "kind": kind,
+                "city": _normalize_city(city) if city else None,
+                "city_name": city,
+                "frequency": frequency,
+                "send_time": send_time,
+                "next_run_at": _next_run_at(frequency, send_time, now, tz),
+                "created_at": now,
+            })
+        if len(batch) >= 1000:
+            bind.execute(subscriptions.insert(), batch)
+            batch = []
+    if batch:
+        bind.execute(subscriptions.insert(), batch)
+
+
+def downgrade():
+    op.drop_index("ix_subscriptions_next_run_at", table_name="subscriptions")
+    op.drop_index("ix_subscriptions_kind_city_next_run_at", table_name="subscriptions")
+    op.drop_index("ix_subscriptions_user_id", table_name="subscriptions")
+    op.drop_table("subscriptions")
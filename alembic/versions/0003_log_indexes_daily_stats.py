@@ -0,0 +1,43 @@
+"""Log indexes and daily log aggregates
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    existing = {index["name"] for index in sa.inspect(bind).get_indexes("logs")}
+    if "ix_logs_user_id_timestamp" not in existing:
+        op.create_index("ix_logs_user_id_timestamp", "logs", ["user_id", "timestamp"])
+    if "ix_logs_timestamp" not in existing:
+        op.create_index("ix_logs_timestamp", "logs", ["timestamp"])
+
+    if not sa.inspect(bind).has_table("log_daily_stats"):
+        op.create_table(
+            "log_daily_stats",
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("command", sa.String(length=255), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("day", "user_id", "command"),
+        )
+
+
+def downgrade():
+    op.drop_table("log_daily_stats")
+    op.drop_index("ix_logs_timestamp", table_name="logs")
+    op.drop_index("ix_logs_user_id_timestamp", table_name="logs")
@@ -0,0 +1,187 @@
+"""Incremental statistics counters
+
+Создает таблицы счетчиков и однократно заполняет их по существующим
+пользователям, логам и дневным агрегатам.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+import re
+from collections import Counter
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+# Разбор команд зафиксирован здесь в виде на момент миграции
+# (как database.stats.parse_command и services.cities.normalize_city)
+_CITY_COMMANDS = ("/weather", "/events")
+_SUFFIX_RE = re.compile(r"\s*\([^()]*\)\s*$")
+_SPACES_RE = re.compile(r"\s+")
+_DASHES_RE = re.compile(r"\s*[-‐‑–—]\s*")
+
+_CITY_ALIASES = {
+    "moscow": "москва",
+    "moskva": "москва",
+    "msk": "москва",
+    "мск": "москва",
+    "saint petersburg": "санкт-петербург",
+    "saint-petersburg": "санкт-петербург",
+    "st petersburg": "санкт-петербург",
+    "st. petersburg": "санкт-петербург",
+    "st-petersburg": "санкт-петербург",
+    "sankt-peterburg": "санкт-петербург",
+    "spb": "санкт-петербург",
+    "спб": "санкт-петербург",
+    "питер": "санкт-петербург",
+    "петербург": "санкт-петербург",
+    "kazan": "казань",
+    "novosibirsk": "новосибирск",
+    "yekaterinburg": "екатеринбург",
+    "ekaterinburg": "екатеринбург",
+    "екб": "екатеринбург",
+    "nizhny novgorod": "нижний новгород",
+    "nizhniy novgorod": "нижний новгород",
+    "нн": "нижний новгород",
+    "samara": "самара",
+    "omsk": "омск",
+    "rostov-on-don": "ростов-на-дону",
+    "rostov-na-donu": "ростов-на-дону",
+    "ростов": "ростов-на-дону",
+    "ufa": "уфа",
+    "krasnoyarsk": "красноярск",
+    "perm": "пермь",
+    "voronezh": "воронеж",
+    "volgograd": "волгоград",
+    "krasnodar": "краснодар",
+    "sochi": "сочи",
+    "kaliningrad": "калининград",
+    "vladivostok": "владивосток",
+    "minsk": "минск",
+}
+
+
+def _parse_command(command):
+    """«/weather Москва (город не найден)» → ("/weather", "москва")."""
+    command = _SUFFIX_RE.sub("", command)
+    name, _, arg = command.partition(" ")
+    arg = arg.strip()
+    if name not in _CITY_COMMANDS or not arg:
+        return name, None
+    key = _SPACES_RE.sub(" ", arg).casefold().replace("ё", "е")
+    key = _DASHES_RE.sub("-", key)
+    return name, _CITY_ALIASES.get(key, key)
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # Таблица могла появиться раньше через init_db(); тогда счетчики уже
+    # ведет LogWriter, и повторное заполнение удвоило бы их
+    backfill = not inspector.has_table("stat_counters")
+    if backfill:
+        op.create_table(
+            "stat_counters",
+            sa.Column("kind", sa.String(length=32), nullable=False),
+            sa.Column("key", sa.String(length=255), nullable=False),
+            sa.Column("value", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("kind", "key"),
+        )
+        op.create_index("ix_stat_counters_kind_value", "stat_counters", ["kind", "value"])
+
+    if not inspector.has_table("daily_active_users"):
+        op.create_table(
+            "daily_active_users",
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("day", "user_id"),
+        )
+
+    if not backfill:
+        return
+
+    # Однократное заполнение счетчиков по накопленным данным
+    users = sa.table("users", sa.column("id", sa.Integer))
+    logs = sa.table(
+        "logs",
+        sa.column("user_id", sa.Integer),
+        sa.column("command", sa.String),
+        sa.column("timestamp", sa.DateTime),
+    )
+    daily = sa.table(
+        "log_daily_stats",
+        sa.column("day", sa.Date),
+        sa.column("user_id", sa.Integer),
+        sa.column("command", sa.String),
+        sa.column("count", sa.Integer),
+    )
+
+    counters = sa.table(
+        "stat_counters",
+        sa.column("kind", sa.String),
+        sa.column("key", sa.String),
+        sa.column("value", sa.Integer),
+    )
+    active_users = sa.table(
+        "daily_active_users",
+        sa.column("day", sa.Date),
+        sa.column("user_id", sa.Integer),
+    )
+
+    # Счетчики копятся в памяти (их немного: команды, города, дни)
+    # и записываются в конце; активные пользователи — по порциям
+    deltas = Counter()
+    deltas[("total", "users")] = bind.execute(sa.select(sa.func.count()).select_from(users)).scalar()
+
+    sources = (
+        sa.select(logs.c.timestamp, logs.c.user_id, logs.c.command, sa.literal(1)),
+        sa.select(daily.c.day, daily.c.user_id, daily.c.command, daily.c["count"]),
+    )
+    for query in sources:
+        result = bind.execute(query.execution_options(yield_per=BATCH_SIZE))
+        for rows in result.partitions():
+            active = {}
+            for day, user_id, command, count in rows:
+                day = day.date() if isinstance(day, datetime) else day
+                name, city = _parse_command(command)
+                deltas[("total", "logs")] += count
+                deltas[("command", name)] += count
+                if city:
+                    deltas[("city", city)] += count
+                active.setdefault(day, set()).add(user_id)
+
+            for day, user_ids in active.items():
+                known = set(bind.execute(
+                    sa.select(active_users.c.user_id).where(
+                        active_users.c.day == day, active_users.c.user_id.in_(user_ids)
+                    )
+                ).scalars())
+                new_ids = user_ids - known
+                if new_ids:
+                    bind.execute(
+                        active_users.insert(), [{"day": day, "user_id": user_id} for user_id in new_ids]
+                    )
+                    deltas[("dau", day.isoformat())] += len(new_ids)
+
+    rows = [{"kind": kind, "key": key, "value": value} for (kind, key), value in deltas.items() if value]
+    for start in range(0, len(rows), BATCH_SIZE):
+        bind.execute(counters.insert(), rows[start:start + BATCH_SIZE])
+
+
+def downgrade():
+    op.drop_table("daily_active_users")
+    op.drop_index("ix_stat_counters_kind_value", table_name="stat_counters")
+    op.drop_table("stat_counters")
@@ -0,0 +1,392 @@
+"""
+Информационный бот в асинхронном режиме (AsyncTeleBot + aiohttp).
+
+Альтернативная точка входа к wether_news_bot.py с теми же командами:
+медленный ответ одного внешнего API не блокирует обработку остальных
+обновлений. Импорт модуля только читает настройки; клиент Telegram
+создается фабрикой create_app(). Запуск: python async_bot.py
+"""
+
+import asyncio
+import os
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+from telebot.async_telebot import AsyncTeleBot
+
+from database.async_config import AsyncSessionLocal, get_async_engine
+from database.async_crud import get_or_create_user_cached
+from database.config import SessionLocal, get_engine
+from database.log_writer import LogWriter
+from services.cache import AsyncStaleWhileRevalidateCache
+from services.cities import normalize_city
+from services.http import RETRY_STATUSES, CircuitBreaker
+from services.metrics import (
+    MetricsServer,
+    instrument,
+    instrument_engine,
+    log_error,
+    observe_dependency,
+)
+from services.news import NewsSnapshot
+from services.render import HELP_TEXT, START_TEXT, render_events, render_weather, split_message
+from services.throttle import AsyncThrottleMiddleware, UserRateLimiter, parse_limits
+
+
+load_dotenv()
+
+TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
+NEWS_API_KEY = os.getenv("NEWS_API_KEY")
+EVENTS_API_KEY = os.getenv("EVENTS_API_KEY")
+
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.openweathermap.org/data/2.5/weather")
+NEWS_API_URL = os.getenv("NEWS_API_URL", "https://newsapi.org/v2/top-headlines")
+EVENTS_API_URL = os.getenv("EVENTS_API_URL", "https://api.timepad.ru/v1/events/")
+
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_CACHE_MAX_STALE = int(os.getenv("WEATHER_CACHE_MAX_STALE", "3600"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1024"))
+NEWS_REFRESH_INTERVAL = int(os.getenv("NEWS_REFRESH_INTERVAL", "300"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Лимиты команд на пользователя (см. services/throttle.py) и число хранимых ведер
+THROTTLE_LIMITS = os.getenv("THROTTLE_LIMITS", "")
+THROTTLE_MAX_BUCKETS = int(os.getenv("THROTTLE_MAX_BUCKETS", "100000"))
+
+# Таймаут запроса к внешнему API (в секундах) и число соединений с одним API
+# (как в wether_news_bot.py, где у каждого API свой пул)
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "10"))
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "20"))
+
+# Порт HTTP-сервера метрик Prometheus (GET /metrics); 0 — не запускать
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Предохранитель внешних API: число ошибок подряд и пауза до пробного запроса
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+# Клиент Telegram; создается фабрикой create_app()
+bot: AsyncTeleBot | None = None
+
+# Лимиты команд на пользователя (ведра создаются при первых командах)
+throttle = UserRateLimiter(parse_limits(THROTTLE_LIMITS), max_size=THROTTLE_MAX_BUCKETS)
+
+# Пакетная запись логов в фоновом потоке: enqueue не ждет БД
+log_writer = LogWriter(
+    SessionLocal,
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval=LOG_FLUSH_INTERVAL,
+    max_queue=LOG_QUEUE_SIZE,
+    put_timeout=0,
+)
+
+
+class UpstreamAPI:
+    """Внешний API: ограничение числа одновременных запросов, таймаут и предохранитель."""
+
+    def __init__(self, name: str, concurrency: int, timeout: float):
+        self.name = name
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.breaker = CircuitBreaker(name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+
+    async def get(self, url: str, **kwargs) -> tuple[int, dict, dict | None]:
+        """
+        GET-запрос через общую сессию: статус, заголовки и JSON-тело.
+
+        Ответы 5xx и 429 и тело, которое не разбирается как JSON, выбрасываются
+        как ошибки и учитываются предохранителем.
+        """
+        self.breaker.check()
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                async with http_session.get(url, timeout=self.timeout, **kwargs) as response:
+                    if response.status in RETRY_STATUSES:
+                        response.raise_for_status()
+                    data = None
+                    if response.status != 304:
+                        data = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                observe_dependency(self.name, time.perf_counter() - started, e)
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Отмена ничего не говорит о доступности API, но пробный
+                # запрос нужно освободить, иначе предохранитель не замкнется
+                self.breaker.release_probe()
+                raise
+        observe_dependency(self.name, time.perf_counter() - started)
+        self.breaker.record_success()
+        return response.status, dict(response.headers), data
+
+
+WEATHER_API = UpstreamAPI(
+    "openweathermap", int(os.getenv("WEATHER_API_CONCURRENCY", "10")), UPSTREAM_TIMEOUT
+)
+NEWS_API = UpstreamAPI(
+    "newsapi", int(os.getenv("NEWS_API_CONCURRENCY", "2")), UPSTREAM_TIMEOUT
+)
+EVENTS_API = UpstreamAPI(
+    "timepad", int(os.getenv("EVENTS_API_CONCURRENCY", "5")), UPSTREAM_TIMEOUT
+)
+
+# Общая сессия aiohttp с пулом соединений; создается в main()
+http_session: aiohttp.ClientSession | None = None
+
+
+async def get_weather(city):
+    """Получить погоду по названию города через OpenWeatherMap API."""
+    _, _, data = await WEATHER_API.get(
+        WEATHER_API_URL,
+        params={"q": city, "appid": WEATHER_API_KEY, "units": "metric", "lang": "ru"},
+    )
+    return data or {}
+
+
+async def get_events(city=None):
+    """Получить список событий через TimePad API."""
+    params = {
+        "sort": "date",
+        "limit": 5,
+        "fields": "name,starts_at,description,url,location",
+        "is_deleted": "false",
+        "is_confirmed": "true",
+    }
+    if city:
+        params["cities"] = city
+
+    status, _, data = await EVENTS_API.get(
+        EVENTS_API_URL,
+        headers={"Authorization": f"Bearer {EVENTS_API_KEY}"},
+        params=params,
+    )
+    if status == 200 and data:
+        return data.get("values", [])
+
+    print(f"TimePad API error: {status} {data}")
+    return []
+
+
+weather_cache = AsyncStaleWhileRevalidateCache(
+    get_weather,
+    ttl=WEATHER_CACHE_TTL,
+    max_size=WEATHER_CACHE_SIZE,
+    max_stale=WEATHER_CACHE_MAX_STALE,
+    key_func=normalize_city,
+    cacheable=lambda data: data.get("cod") == 200,
+)
+
+news_snapshot = NewsSnapshot(NEWS_API_KEY, limit=5)
+
+
+async def refresh_news():
+    """Обновить снимок новостей через общую сессию."""
+    news_snapshot.fetches += 1
+    try:
+        status, headers, data = await NEWS_API.get(
+            NEWS_API_URL,
+            params=news_snapshot.request_params(),
+            headers=news_snapshot.request_headers(),
+        )
+    except Exception as e:
+        return news_snapshot.apply_error(e)
+    return news_snapshot.apply_response(status, headers, data)
+
+
+async def refresh_news_forever():
+    """Периодически обновлять снимок новостей."""
+    while True:
+        await refresh_news()
+        await asyncio.sleep(NEWS_REFRESH_INTERVAL)
+
+
+async def send_message(chat_id, text, **kwargs):
+    """bot.send_message с замером времени Telegram по текущей команде."""
+    started = time.perf_counter()
+    try:
+        result = await bot.send_message(chat_id, text, **kwargs)
+    except Exception as e:
+        observe_dependency("telegram", time.perf_counter() - started, e)
+        raise
+    observe_dependency("telegram", time.perf_counter() - started)
+    return result
+
+
+async def send_long(chat_id, text):
+    """Отправить текст, при необходимости несколькими сообщениями."""
+    for chunk in split_message(text):
+        await send_message(chat_id, chunk)
+
+
+async def log_command(message, command):
+    """Зарегистрировать пользователя (если нужно) и записать команду в лог."""
+    async with AsyncSessionLocal() as db:
+        user = await get_or_create_user_cached(
+            db, message.from_user.id, message.from_user.first_name or "Пользователь"
+        )
+    log_writer.enqueue(user.id, command)
+    return user
+
+
+@instrument("/start")
+async def start_handler(message):
+    """Команда /start — регистрация пользователя и приветствие."""
+    try:
+        user = await log_command(message, "/start")
+        await send_message(message.chat.id, START_TEXT.format(name=user.name))
+    except Exception as e:
+        log_error("Ошибка при обработке команды /start", e)
+        await send_message(
+            message.chat.id,
+            "Привет! Я твой информационный помощник. \n\n"
+            "Набери /help, чтобы узнать, что я умею.",
+        )
+
+
+@instrument("/help")
+async def help_handler(message):
+    """Команда /help — список доступных команд."""
+    try:
+        await log_command(message, "/help")
+    except Exception as e:
+        log_error("Ошибка при обработке команды /help", e)
+    await send_message(message.chat.id, HELP_TEXT)
+
+
+@instrument("/weather")
+async def weather_handler(message):
+    """Команда /weather — прогноз погоды для указанного города."""
+    parts = message.text.split(maxsplit=1)
+    if len(parts) < 2:
+        await send_message(
+            message.chat.id, "Пожалуйста, укажите город. Пример: /weather Москва"
+        )
+        await log_command(message, "/weather (без города)")
+        return
+
+    city = parts[1]
+    try:
+        data = await weather_cache.get(city)
+    except Exception as e:
+        log_error("Ошибка при получении погоды", e)
+        await send_message(message.chat.id, "Произошла ошибка при получении погоды.")
+        await log_command(message, f"/weather {city} (ошибка)")
+        return
+
+    if data.get("cod") != 200:
+        await send_message(
+            message.chat.id, f"Город '{city}' не найден. Попробуйте еще раз."
+        )
+        await log_command(message, f"/weather {city} (город не найден)")
+        return
+
+    await send_message(message.chat.id, render_weather(city, data))
+    await log_command(message, f"/weather {city}")
+
+
+@instrument("/news")
+async def news_handler(message):
+    """Команда /news — свежие новости из общего снимка."""
+    text = news_snapshot.text
+    if text is None:
+        await refresh_news()
+        text = news_snapshot.text
+
+    if not text:
+        await send_message(
+            message.chat.id, "Не удалось получить новости. Попробуйте позже."
+        )
+        await log_command(message, "/news (ошибка получения)")
+        return
+
+    await send_long(message.chat.id, text)
+    await log_command(message, "/news")
+
+
+@instrument("/events")
+async def events_handler(message):
+    """Команда /events — список событий (по городу, если указан)."""
+    parts = message.text.split(maxsplit=1)
+    city = parts[1] if len(parts) > 1 else None
+
+    # Тот же формат, что в wether_news_bot.py: по нему прогревается кэш событий
+    try:
+        await log_command(message, f"/events {city}" if city else "/events")
+    except Exception as e:
+        log_error("Ошибка при обработке команды /events", e)
+
+    try:
+        events = await get_events(city)
+        if not events:
+            await send_message(
+                message.chat.id,
+                "Не удалось найти события. Попробуйте позже или укажите другой город.",
+            )
+            return
+
+        await send_long(message.chat.id, render_events(events))
+
+    except Exception as e:
+        log_error("Ошибка при получении событий", e)
+        await send_message(message.chat.id, "Произошла ошибка при получении событий.")
+
+
+def create_app(token: str | None = None) -> AsyncTeleBot:
+    """
+    Создать клиент Telegram с обработчиками команд
+    (токен по умолчанию — из TELEGRAM_BOT_TOKEN).
+    """
+    global bot
+    token = token or TOKEN
+    if not token:
+        raise ValueError("TELEGRAM_BOT_TOKEN не найден в переменных окружения")
+
+    bot = AsyncTeleBot(token)
+    # Команды сверх лимита отклоняются до обработчика, без обращений к БД и API
+    bot.setup_middleware(
+        AsyncThrottleMiddleware(throttle, lambda chat_id, text: send_message(chat_id, text))
+    )
+    bot.register_message_handler(start_handler, commands=["start"])
+    bot.register_message_handler(help_handler, commands=["help"])
+    bot.register_message_handler(weather_handler, commands=["weather"])
+    bot.register_message_handler(news_handler, commands=["news"])
+    bot.register_message_handler(events_handler, commands=["events"])
+    return bot
+
+
+async def main():
+    """Создать общую HTTP-сессию, запустить фоновые задачи и опрос Telegram."""
+    global http_session
+    if bot is None:
+        create_app()
+
+    connector = aiohttp.TCPConnector(limit_per_host=UPSTREAM_POOL_SIZE, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        http_session = session
+        # Время SQL-запросов: асинхронные запросы обработчиков и пакетная запись логов
+        instrument_engine(get_async_engine().sync_engine)
+        instrument_engine(get_engine())
+        log_writer.start()
+        if METRICS_PORT:
+            MetricsServer(port=METRICS_PORT).start()
+        news_task = asyncio.create_task(refresh_news_forever())
+        print("Бот запущен (асинхронный режим)!")
+        try:
+            await bot.infinity_polling()
+        finally:
+            news_task.cancel()
+            await bot.close_session()
+            await get_async_engine().dispose()
+            log_writer.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        print(f"Ошибка при запуске бота {e}")
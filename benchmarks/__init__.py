@@ -0,0 +1 @@
+# Нагрузочные тесты бота с заглушками Telegram и внешних API
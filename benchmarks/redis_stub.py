@@ -0,0 +1,184 @@
+"""
+Локальная замена Redis для проверки общего состояния (STATE_BACKEND=redis://...).
+
+Понимает протокол RESP и только те команды, которые использует
+services/state.RedisBackend: GET, SET (NX, XX, PX, EX), DEL, INCRBY,
+PEXPIRE, MULTI/EXEC и EVAL двух скриптов аренды лидера (протокол RESP2).
+Запуск: python -m benchmarks.redis_stub --port 6379
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+
+from services import state
+
+
+class RedisStub:
+    """Сервер в фоновом потоке; все команды выполняются под одной блокировкой."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._values: dict[bytes, tuple[bytes, float | None]] = {}
+        self._lock = threading.Lock()
+        self.commands = 0
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            disable_nagle_algorithm = True
+
+            def handle(self):
+                queued: list[list[bytes]] | None = None
+                while True:
+                    try:
+                        command = stub._read_command(self.rfile)
+                    except (ConnectionError, ValueError):
+                        return
+                    if command is None:
+                        return
+                    name = command[0].upper()
+                    if name == b"MULTI":
+                        queued = []
+                        reply = b"+OK\r\n"
+                    elif name == b"EXEC" and queued is not None:
+                        with stub._lock:
+                            replies = [stub._execute(item) for item in queued]
+                        reply = b"*%d\r\n" % len(replies) + b"".join(replies)
+                        queued = None
+                    elif queued is not None:
+                        queued.append(command)
+                        reply = b"+QUEUED\r\n"
+                    else:
+                        with stub._lock:
+                            reply = stub._execute(command)
+                    self.wfile.write(reply)
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.server.serve_forever, name="redis-stub", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # ---------------------------------------------------------------
+    # Протокол
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _read_command(rfile) -> list[bytes] | None:
+        line = rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(rfile.readline()[1:])
+            args.append(rfile.read(length + 2)[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(value: bytes | None) -> bytes:
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    # ---------------------------------------------------------------
+    # Команды (под блокировкой)
+    # ---------------------------------------------------------------
+    def _get(self, key: bytes) -> bytes | None:
+        item = self._values.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.monotonic():
+            del self._values[key]
+            return None
+        return item[0]
+
+    def _expire(self, key: bytes, milliseconds: int) -> int:
+        value = self._get(key)
+        if value is None:
+            return 0
+        self._values[key] = (value, time.monotonic() + milliseconds / 1000)
+        return 1
+
+    def _execute(self, command: list[bytes]) -> bytes:
+        self.commands += 1
+        name, args = command[0].upper(), command[1:]
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name in (b"CLIENT", b"SELECT"):
+            return b"+OK\r\n"
+        if name == b"HELLO":
+            if args and args[0] != b"2":
+                return b"-NOPROTO unsupported protocol version\r\n"
+            info = [b"server", b"redis-stub", b"version", b"7.0.0", b"proto", b"2"]
+            return b"*%d\r\n" % len(info) + b"".join(map(self._bulk, info))
+        if name == b"GET":
+            return self._bulk(self._get(args[0]))
+        if name == b"SET":
+            return self._set(args)
+        if name == b"DEL":
+            return b":%d\r\n" % sum(self._values.pop(key, None) is not None for key in args)
+        if name == b"INCRBY":
+            item = self._values.get(args[0])
+            expires_at = item[1] if item and self._get(args[0]) is not None else None
+            value = int(self._get(args[0]) or 0) + int(args[1])
+            self._values[args[0]] = (str(value).encode(), expires_at)
+            return b":%d\r\n" % value
+        if name == b"PEXPIRE":
+            return b":%d\r\n" % self._expire(args[0], int(args[1]))
+        if name == b"EVAL":
+            return self._eval(args[0].decode(), args[2:])
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    def _set(self, args: list[bytes]) -> bytes:
+        key, value = args[0], args[1]
+        options = [item.upper() for item in args[2:]]
+        expires_at = None
+        for unit, scale in ((b"PX", 1000), (b"EX", 1)):
+            if unit in options:
+                expires_at = time.monotonic() + int(args[2 + options.index(unit) + 1]) / scale
+        exists = self._get(key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return b"$-1\r\n"
+        self._values[key] = (value, expires_at)
+        return b"+OK\r\n"
+
+    def _eval(self, script: str, args: list[bytes]) -> bytes:
+        key, value = args[0], args[1]
+        if self._get(key) != value:
+            return b":0\r\n"
+        if script == state._RENEW_SCRIPT:
+            return b":%d\r\n" % self._expire(key, int(args[2]))
+        if script == state._RELEASE_SCRIPT:
+            del self._values[key]
+            return b":1\r\n"
+        return b"-ERR unsupported script\r\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальная замена Redis для проверки общего состояния")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args(argv)
+
+    stub = RedisStub(args.host, args.port)
+    print(f"Заглушка Redis: {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Повтор команд из таблицы logs как нагрузки на обработчики wether_news_bot.py.
+
+Строки logs читаются из исходной БД по времени порциями (yield_per,
+на PostgreSQL — серверный курсор), поэтому память не зависит от размера
+таблицы. Каждая строка превращается в обновление Telegram от того же
+пользователя и подается в бота с исходными интервалами (--speed 1),
+ускоренными в N раз (--speed N) или без пауз (--speed 0). Бот работает
+на заглушках внешних API и временной SQLite, как в benchmarks.run.
+В отчете — задержка обработчиков по командам, доля попаданий в кэши
+погоды и событий и число запросов к внешним API.
+
+Примеры:
+    python -m benchmarks.replay --source-url sqlite:///bot.db --speed 10
+    python -m benchmarks.replay --source-url postgresql://bot@db/bot --speed 0 \\
+        --since 2024-05-01 --until 2024-05-02 --output replay.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from array import array
+from datetime import datetime
+
+from sqlalchemy import create_engine, select
+
+from benchmarks.redis_stub import RedisStub
+from benchmarks.run import git_commit, percentile, prepare_environment
+from benchmarks.stubs import Profile, StubServer
+from database.models import Log, User
+from fake_telegram import make_update
+
+# Пометки, которые обработчики добавляют к команде в логе:
+# «/weather Москва (ошибка)», «/weather (без города)»
+_NOTE_RE = re.compile(r"\s*\([^()]*\)$")
+
+
+def replay_command(command: str) -> str | None:
+    """Текст сообщения для команды из лога (None, если это не команда)."""
+    text = _NOTE_RE.sub("", command or "").strip()
+    return text if text.startswith("/") else None
+
+
+def read_logs(source_url: str, since=None, until=None, limit=None, chunk_size: int = 1000):
+    """
+    Команды из logs по времени: (время, telegram_id, текст).
+
+    Читаются только нужные столбцы, без объектов ORM, порциями по chunk_size.
+    """
+    query = (
+        select(Log.timestamp, User.telegram_id, Log.command)
+        .join(User, User.id == Log.user_id)
+        .order_by(Log.timestamp, Log.id)
+    )
+    if since is not None:
+        query = query.where(Log.timestamp >= since)
+    if until is not None:
+        query = query.where(Log.timestamp < until)
+    if limit:
+        query = query.limit(limit)
+
+    engine = create_engine(source_url)
+    try:
+        with engine.connect() as connection:
+            result = connection.execution_options(yield_per=chunk_size).execute(query)
+            for timestamp, telegram_id, command in result:
+                text = replay_command(command)
+                if text is not None:
+                    yield timestamp, telegram_id, text
+    finally:
+        engine.dispose()
+
+
+def hit_rate(stats: dict) -> float:
+    """Доля запросов, обслуженных кэшем (включая устаревшие значения)."""
+    hits = stats["hits"] + stats["stale_hits"]
+    total = hits + stats["misses"]
+    return round(hits / total, 4) if total else 0.0
+
+
+def latency_summary(samples: array) -> dict:
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50) * 1000, 3),
+        "p95": round(percentile(values, 95) * 1000, 3),
+        "p99": round(percentile(values, 99) * 1000, 3),
+        "max": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def run(args) -> dict:
+    """Повторить команды из лога и вернуть отчет."""
+    stubs = StubServer({
+        "weather": Profile(args.weather_latency / 1000, 0),
+        "news": Profile(args.news_latency / 1000, 0),
+        "events": Profile(args.events_latency / 1000, 0),
+        "telegram": Profile(args.telegram_latency / 1000, 0),
+    })
+    stubs.start()
+    database_url = prepare_environment(stubs, args.database_url)
+    if database_url == args.source_url:
+        raise ValueError("Повтор пишет логи в свою БД: --database-url должен отличаться от --source-url")
+
+    redis_stub = None
+    if args.state == "stub":
+        redis_stub = RedisStub()
+        redis_stub.start()
+    os.environ["STATE_BACKEND"] = redis_stub.url if redis_stub else args.state
+
+    import wether_news_bot
+
+    from sqlalchemy import event
+
+    from database.config import get_engine, init_db
+    from services.throttle import Limit
+
+    app = wether_news_bot.create_app()
+    init_db()
+    engine = get_engine()
+    db_queries = itertools.count()
+    event.listen(engine, "before_cursor_execute", lambda *a, **kw: next(db_queries))
+
+    # Ускоренный повтор упирается в лимиты команд на пользователя
+    if not args.throttle:
+        app.throttle.limits = {"default": Limit(10**9, 1)}
+
+    # Задержки по командам: array вместо списка — 8 байт на замер
+    latencies: dict[str, array] = {}
+    latencies_lock = threading.Lock()
+    handler = app.bot.dispatcher._handler
+
+    def timed_handler(update):
+        command = update.message.text.split(maxsplit=1)[0] if update.message else "?"
+        begin = time.perf_counter()
+        try:
+            handler(update)
+        finally:
+            elapsed = time.perf_counter() - begin
+            with latencies_lock:
+                latencies.setdefault(command, array("d")).append(elapsed)
+
+    app.bot.dispatcher._handler = timed_handler
+    app.log_writer.start()
+    app.outbox.start()
+    app.bot.dispatcher.start()
+
+    from telebot import types
+
+    queries_before = next(db_queries)
+    stubs.reset()
+    sent = 0
+    max_lag = 0.0
+    first = previous = None
+    offset = 0.0
+    begin = time.perf_counter()
+    for timestamp, telegram_id, text in read_logs(
+        args.source_url, args.since, args.until, args.limit, args.chunk_size
+    ):
+        # Простои длиннее --max-gap сокращаются, чтобы не ждать ночь
+        if previous is not None:
+            offset += min((timestamp - previous).total_seconds(), args.max_gap)
+        previous = timestamp
+        if args.speed:
+            lag = time.perf_counter() - (begin + offset / args.speed)
+            if lag < 0:
+                time.sleep(-lag)
+            else:
+                max_lag = max(max_lag, lag)
+        first = first or timestamp
+        sent += 1
+        update = types.Update.de_json(make_update(sent, telegram_id, text))
+        app.bot.process_new_updates([update])
+
+    def processed() -> int:
+        with latencies_lock:
+            return sum(len(samples) for samples in latencies.values())
+
+    deadline = time.monotonic() + args.timeout
+    expected = sent - sum(app.bot.dispatcher.stats()["shed"])
+    while processed() < expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    duration = time.perf_counter() - begin
+
+    app.bot.dispatcher.stop()
+    app.outbox.stop(args.timeout)
+    app.log_writer.stop(args.timeout)
+    queries = next(db_queries) - queries_before - 1
+    stubs.stop()
+    if redis_stub is not None:
+        redis_stub.stop()
+
+    done = processed()
+    upstream = {api: stubs.calls[api] for api in ("weather", "news", "events")}
+    per_message = (lambda value: value / done) if done else (lambda value: 0.0)
+    weather_cache = app.weather_cache.stats()
+    events_cache = app.events_cache.stats()
+    config = {**vars(args), "database": database_url.split(":", 1)[0]}
+    config["source_url"] = args.source_url.split(":", 1)[0]
+    return {
+        "version": 1,
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": {key: str(value) if isinstance(value, datetime) else value for key, value in config.items()},
+        "results": {
+            "messages": sent,
+            "processed": done,
+            "shed": sent - expected,
+            "throttled": app.throttle.stats()["rejected"],
+            "first_logged_at": first.isoformat() if first else None,
+            "logged_span_seconds": round((previous - first).total_seconds(), 3) if previous and first else 0.0,
+            "duration_seconds": round(duration, 3),
+            "messages_per_second": round(done / duration, 1) if duration else 0.0,
+            "max_schedule_lag_seconds": round(max_lag, 3),
+            "latency_ms": latency_summary(array("d", itertools.chain(*latencies.values()))),
+            "latency_ms_by_command": {
+                command: latency_summary(samples) for command, samples in sorted(latencies.items())
+            },
+            "cache_hit_rate": {
+                "weather": hit_rate(weather_cache),
+                "events": hit_rate(events_cache),
+            },
+            "caches": {"weather": weather_cache, "events": events_cache},
+            "db_queries_per_message": round(per_message(queries), 3),
+            "upstream_calls": upstream,
+            "upstream_calls_per_message": round(per_message(sum(upstream.values())), 4),
+            "telegram_sends_per_message": round(per_message(stubs.calls["telegram"]), 3),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Повтор команд из таблицы logs на заглушках API")
+    parser.add_argument("--source-url", default=os.getenv("DATABASE_URL"), help="БД с логами (по умолчанию DATABASE_URL)")
+    parser.add_argument("--database-url", default=None, help="БД бота при повторе (по умолчанию — временная SQLite)")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="начало периода (UTC, ISO 8601)")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="конец периода (не включая)")
+    parser.add_argument("--limit", type=int, default=None, help="не больше стольких команд")
+    parser.add_argument("--speed", type=float, default=1, help="ускорение относительно лога (0 — без пауз)")
+    parser.add_argument("--max-gap", type=float, default=60, help="простои длиннее стольких секунд сокращаются")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="строк лога за одно чтение")
+    parser.add_argument("--throttle", action="store_true", help="применять лимиты команд на пользователя")
+    for api, latency in (("weather", 50), ("news", 100), ("events", 150), ("telegram", 30)):
+        parser.add_argument(f"--{api}-latency", type=float, default=latency, help="задержка, мс")
+    parser.add_argument(
+        "--state", default="memory",
+        help="общее состояние: memory, stub (локальная замена Redis) или redis://...",
+    )
+    parser.add_argument("--timeout", type=float, default=60, help="ожидание обработки, с")
+    parser.add_argument("--output", default=None, help="файл для результатов в JSON")
+    args = parser.parse_args()
+    if not args.source_url:
+        parser.error("укажите --source-url или DATABASE_URL")
+
+    report = run(args)
+    print(json.dumps(report["results"], ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Локальные заглушки внешних API для нагрузочных тестов.
+
+Один HTTP-сервер отвечает за OpenWeatherMap, NewsAPI, TimePad
+и Telegram Bot API (sendMessage). Для каждого API задаются задержка
+ответа и доля ошибок 503; число запросов считается по API.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlparse
+
+# Префикс пути → имя API
+ROUTES = {
+    "/data/2.5/weather": "weather",
+    "/data/2.5/group": "weather",
+    "/data/2.5/find": "weather",
+    "/v2/top-headlines": "news",
+    "/v1/events": "events",
+    "/bot": "telegram",
+}
+
+
+class Profile(NamedTuple):
+    """Поведение заглушки: задержка (в секундах) и доля ответов 503."""
+
+    latency: float = 0.0
+    error_rate: float = 0.0
+
+
+def weather_body(query: dict) -> dict:
+    # /group: погода по списку идентификаторов
+    if "id" in query:
+        ids = query["id"][0].split(",")
+        return {"cnt": len(ids), "list": [{**_weather_item(""), "id": int(i)} for i in ids]}
+    # /find: города вокруг точки (здесь — один город в самой точке)
+    if "cnt" in query:
+        coord = {"lat": float(query["lat"][0]), "lon": float(query["lon"][0])}
+        return {"count": 1, "list": [{**_weather_item(""), "id": 0, "coord": coord}]}
+    city = query.get("q", [""])[0]
+    if city.lower().startswith("нет"):
+        return {"cod": "404", "message": "city not found"}
+    return {"cod": 200, **_weather_item(city)}
+
+
+def _weather_item(city: str) -> dict:
+    return {
+        "name": city,
+        "weather": [{"description": "ясно"}],
+        "main": {"temp": 20.5, "feels_like": 19.0, "humidity": 40},
+        "wind": {"speed": 3.2},
+    }
+
+
+def news_body(query: dict) -> dict:
+    return {
+        "status": "ok",
+        "articles": [
+            {"title": f"Заголовок {i}", "url": f"https://example.com/news/{i}"}
+            for i in range(5)
+        ],
+    }
+
+
+def events_body(query: dict) -> dict:
+    city = query.get("cities", ["Москва"])[0]
+    return {
+        "values": [
+            {
+                "name": f"Событие {i} ({city})",
+                "starts_at": "2030-01-01T19:00:00+0300",
+                "url": f"https://example.com/events/{i}",
+                "location": {"city": city, "address": "ул. Примерная, 1"},
+            }
+            for i in range(5)
+        ]
+    }
+
+
+def telegram_body(body: dict) -> dict:
+    return {
+        "ok": True,
+        "result": {
+            "message_id": random.randint(1, 2**31),
+            "date": int(time.time()),
+            "chat": {"id": int(body.get("chat_id", 0)), "type": "private"},
+            "text": body.get("text", ""),
+        },
+    }
+
+
+class StubServer:
+    """HTTP-сервер заглушек в фоновом потоке."""
+
+    def __init__(self, profiles: dict[str, Profile] | None = None, host: str = "127.0.0.1"):
+        self.profiles = profiles or {}
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub._handle(self)
+
+            def do_POST(self):
+                stub._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, 0), Handler)
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="stubs", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+
+    def _handle(self, request: BaseHTTPRequestHandler):
+        parsed = urlparse(request.path)
+        api = next((name for prefix, name in ROUTES.items() if parsed.path.startswith(prefix)), None)
+        length = int(request.headers.get("Content-Length") or 0)
+        raw = request.rfile.read(length) if length else b""
+        if api is None:
+            return self._reply(request, 404, {})
+
+        with self._lock:
+            self.calls[api] += 1
+        profile = self.profiles.get(api, Profile())
+        if profile.latency:
+            time.sleep(profile.latency)
+        if profile.error_rate and random.random() < profile.error_rate:
+            with self._lock:
+                self.errors[api] += 1
+            return self._reply(request, 503, {"error": "stub failure"})
+
+        query = parse_qs(parsed.query)
+        if api == "telegram":
+            # telebot передает параметры в строке запроса
+            query.update(parse_qs(raw.decode()) if raw else {})
+            body = {key: values[0] for key, values in query.items()}
+            return self._reply(request, 200, telegram_body(body))
+        builders = {"weather": weather_body, "news": news_body, "events": events_body}
+        self._reply(request, 200, builders[api](query))
+
+    @staticmethod
+    def _reply(request: BaseHTTPRequestHandler, status: int, data: dict):
+        payload = json.dumps(data, ensure_ascii=False).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
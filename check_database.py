@@ -4,11 +4,18 @@
 
 Выводит количество пользователей и логов,
 а также последние записи из таблиц.
+
+С флагом --stats выводит статистику из накопительных счетчиков
+(без полного прохода по таблицам), с --json — в формате JSON.
 """
 
+import argparse
+import json
+
 from database.config import get_db
 from database.crud import get_user_by_telegram_id, get_user_logs
 from database.models import User, Log
+from database.stats import read_stats
 from sqlalchemy.orm import Session
 
 
@@ -64,5 +71,43 @@ def check_database():
         db.close()
 
 
+def print_stats(days: int = 7, top: int = 10, as_json: bool = False):
+    """Вывести статистику из счетчиков: итоги, команды, активность, города."""
+    db = next(get_db())
+    try:
+        stats = read_stats(db, days=days, top=top)
+    finally:
+        db.close()
+
+    if as_json:
+        print(json.dumps(stats, ensure_ascii=False))
+        return
+
+    print(f"Пользователей: {stats['users_total']}")
+    print(f"Логов: {stats['logs_total']}")
+
+    print("\nКоманды:")
+    for command, count in sorted(stats["commands"].items(), key=lambda item: -item[1]):
+        print(f"{command}: {count}")
+
+    print(f"\nАктивные пользователи за {days} дн.:")
+    for day, count in stats["active_users"].items():
+        print(f"{day}: {count}")
+
+    print(f"\nТоп-{top} городов:")
+    for city, count in stats["top_cities"].items():
+        print(f"{city}: {count}")
+
+
 if __name__ == "__main__":
-    check_database()
+    parser = argparse.ArgumentParser(description="Проверка базы данных бота")
+    parser.add_argument("--stats", action="store_true", help="статистика из счетчиков")
+    parser.add_argument("--json", action="store_true", help="вывод статистики в JSON")
+    parser.add_argument("--days", type=int, default=7, help="дней активности (по умолчанию 7)")
+    parser.add_argument("--top", type=int, default=10, help="число городов в топе (по умолчанию 10)")
+    args = parser.parse_args()
+
+    if args.stats or args.json:
+        print_stats(days=args.days, top=args.top, as_json=args.json)
+    else:
+        check_database()
@@ -0,0 +1,68 @@
+"""
+Асинхронное подключение к базе данных (для асинхронного режима бота).
+"""
+
+import os
+import threading
+
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from database.config import engine_options
+
+load_dotenv()
+
+# Асинхронные драйверы для синхронных схем из DATABASE_URL
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Заменить синхронный драйвер в строке подключения на асинхронный."""
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+_async_engine: AsyncEngine | None = None
+_async_engine_lock = threading.Lock()
+
+
+def get_async_database_url() -> str:
+    """ASYNC_DATABASE_URL или DATABASE_URL с асинхронным драйвером."""
+    url = os.environ.get("ASYNC_DATABASE_URL") or (
+        to_async_url(os.environ["DATABASE_URL"]) if os.environ.get("DATABASE_URL") else None
+    )
+    if not url:
+        raise ValueError("DATABASE_URL не найден в переменных окружения")
+    return url
+
+
+def get_async_engine() -> AsyncEngine:
+    """Асинхронный движок (создается при первом вызове)."""
+    global _async_engine
+    if _async_engine is None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                url = get_async_database_url()
+                _async_engine = create_async_engine(url, **engine_options(url))
+    return _async_engine
+
+
+class LazyAsyncSessionMaker(async_sessionmaker):
+    """async_sessionmaker, который при первой сессии привязывается к get_async_engine()."""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None and "bind" not in local_kw:
+            self.configure(bind=get_async_engine())
+        return super().__call__(**local_kw)
+
+
+AsyncSessionLocal = LazyAsyncSessionMaker(class_=AsyncSession, expire_on_commit=False)
@@ -0,0 +1,84 @@
+"""
+Асинхронные CRUD-операции для пользователей и логов.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import User, Log
+from database.stats import add_counters
+from database.user_cache import CachedUser, user_cache
+
+# Диалекты с поддержкой INSERT ... ON CONFLICT DO NOTHING
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+async def get_user_by_telegram_id(db: AsyncSession, telegram_id: int) -> User | None:
+    """Получить пользователя по Telegram ID."""
+    result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+    return result.scalars().first()
+
+
+async def get_or_create_user(db: AsyncSession, telegram_id: int, name: str) -> User:
+    """
+    Получить пользователя или создать нового.
+
+    Если пользователя одновременно создал другой обработчик,
+    возвращается уже существующая запись.
+    """
+    user = await get_user_by_telegram_id(db, telegram_id)
+    if not user:
+        user = User(telegram_id=telegram_id, name=name)
+        db.add(user)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            user = await get_user_by_telegram_id(db, telegram_id)
+    return user
+
+
+async def get_or_create_user_cached(
+    db: AsyncSession, telegram_id: int, name: str
+) -> CachedUser:
+    """
+    Получить пользователя через кэш процесса, создав его при необходимости.
+
+    Новый пользователь вставляется через INSERT ... ON CONFLICT DO NOTHING.
+    """
+    user = user_cache.get(telegram_id)
+    if user is not None:
+        return user
+
+    query = select(User.id, User.name).where(User.telegram_id == telegram_id)
+    row = (await db.execute(query)).first()
+    if row is None:
+        dialect_insert = _UPSERT_INSERTS.get(db.bind.dialect.name)
+        if dialect_insert is None:
+            await get_or_create_user(db, telegram_id, name)
+        else:
+            result = await db.execute(
+                dialect_insert(User)
+                .values(telegram_id=telegram_id, name=name, registered_at=datetime.utcnow())
+                .on_conflict_do_nothing(index_elements=[User.telegram_id])
+            )
+            if result.rowcount == 1:
+                await db.run_sync(add_counters, {("total", "users"): 1})
+            await db.commit()
+        row = (await db.execute(query)).one()
+
+    user = CachedUser(row.id, row.name)
+    user_cache.put(telegram_id, user)
+    return user
+
+
+async def create_log(db: AsyncSession, user_id: int, command: str) -> Log:
+    """Создать лог запроса."""
+    db_log = Log(user_id=user_id, command=command)
+    db.add(db_log)
+    await db.commit()
+    return db_log
@@ -1,9 +1,16 @@
 """
 Конфигурация подключения к базе данных и управление сессиями.
+
+Движок создается при первом обращении (get_engine или первая сессия),
+поэтому импорт модуля не открывает соединений. Схема БД управляется
+миграциями Alembic (alembic upgrade head) или явным вызовом init_db().
 """
 
 import os
+import threading
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 from database.models import Base
@@ -11,20 +18,73 @@ from database.models import Base
 # Загружаем переменные окружения
 load_dotenv()
 
-# Получаем строку подключения из переменных окружения
-DATABASE_URL = os.environ.get("DATABASE_URL")
+# Пул соединений (для SQLite используются настройки по умолчанию):
+# постоянные соединения, дополнительные при пиковой нагрузке,
+# ожидание свободного соединения и время жизни соединения (в секундах)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+_engine: Engine | None = None
+_engine_lock = threading.Lock()
+
+
+def get_database_url() -> str:
+    """Строка подключения из переменной окружения DATABASE_URL."""
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        raise ValueError("DATABASE_URL не найден в переменных окружения")
+    return url
+
+
+def engine_options(url: str) -> dict:
+    """Параметры create_engine для строки подключения."""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def get_engine() -> Engine:
+    """Движок базы данных (создается при первом вызове)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = get_database_url()
+                _engine = create_engine(url, **engine_options(url))
+    return _engine
+
+
+def init_db():
+    """Создать недостающие таблицы без миграций (для разработки и тестов)."""
+    Base.metadata.create_all(bind=get_engine())
+
+
+class LazySessionMaker(sessionmaker):
+    """sessionmaker, который при первой сессии привязывается к get_engine()."""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None and "bind" not in local_kw:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
 
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL не найден в переменных окружения")
 
-# Создаем движок базы данных
-engine = create_engine(DATABASE_URL)
+# Фабрика сессий; после commit объекты не перечитываются из БД
+SessionLocal = LazySessionMaker(autocommit=False, autoflush=False, expire_on_commit=False)
 
-# Создаем все таблицы
-Base.metadata.create_all(bind=engine)
 
-# Фабрика сессий
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def __getattr__(name):
+    # database.config.engine по-прежнему доступен, но создается лениво
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_db():
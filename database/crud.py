@@ -2,16 +2,29 @@
 CRUD-операции для работы с пользователями и логами.
 """
 
+from datetime import datetime
+
+from typing import Iterator
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from database.models import User, Log
+from database.middleware import after_commit
+from database.models import User, Log, Subscription
+from database.stats import add_counters, record_log_batch
+from database.user_cache import CachedUser, user_cache
+
+# Диалекты с поддержкой INSERT ... ON CONFLICT DO NOTHING
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
 
 
 def create_user(db: Session, telegram_id: int, name: str) -> User:
     """Создать нового пользователя."""
     db_user = User(telegram_id=telegram_id, name=name)
     db.add(db_user)
+    add_counters(db, {("total", "users"): 1})
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 
@@ -28,15 +41,83 @@ def get_or_create_user(db: Session, telegram_id: int, name: str) -> User:
     return user
 
 
+def upsert_user(db: Session, telegram_id: int, name: str) -> CachedUser:
+    """
+    Получить пользователя или создать нового без гонки по telegram_id.
+
+    Новый пользователь вставляется через INSERT ... ON CONFLICT DO NOTHING
+    (на других СУБД — в точке сохранения), поэтому два одновременных первых
+    сообщения не нарушают уникальность. Вставка только отправляется в БД
+    (flush): фиксирует ее SessionMiddleware вместе с остальной работой обновления.
+    """
+    query = select(User.id, User.name).where(User.telegram_id == telegram_id)
+    row = db.execute(query).first()
+    if row is None:
+        dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+        values = {
+            "telegram_id": telegram_id,
+            "name": name,
+            "registered_at": datetime.utcnow(),
+        }
+        if dialect_insert is not None:
+            result = db.execute(
+                dialect_insert(User).values(**values).on_conflict_do_nothing(
+                    index_elements=[User.telegram_id]
+                )
+            )
+            if result.rowcount == 1:
+                add_counters(db, {("total", "users"): 1})
+        else:
+            # Откат точки сохранения не затрагивает остальную работу сессии
+            try:
+                with db.begin_nested():
+                    db.execute(insert(User).values(**values))
+                    add_counters(db, {("total", "users"): 1})
+                    db.flush()
+            except IntegrityError:
+                pass
+        row = db.execute(query).one()
+    return CachedUser(row.id, row.name)
+
+
+def get_or_create_user_cached(db: Session, telegram_id: int, name: str) -> CachedUser:
+    """
+    Получить пользователя через кэш процесса.
+
+    Для вернувшегося пользователя запросов к БД не выполняется.
+    Найденный в БД пользователь попадает в кэш после фиксации транзакции:
+    при откате в кэше не останется id несохраненной строки.
+    """
+    user = user_cache.get(telegram_id)
+    if user is None:
+        user = upsert_user(db, telegram_id, name)
+        after_commit(db, lambda: user_cache.put(telegram_id, user))
+    return user
+
+
 def create_log(db: Session, user_id: int, command: str) -> Log:
     """Создать лог запроса."""
     db_log = Log(user_id=user_id, command=command)
     db.add(db_log)
     db.commit()
-    db.refresh(db_log)
     return db_log
 
 
+def create_logs_bulk(db: Session, records: list[dict]) -> int:
+    """
+    Создать логи одной пачкой (executemany), обновить счетчики
+    статистики и зафиксировать транзакцию.
+
+    Каждая запись — словарь с ключами user_id, command, timestamp.
+    """
+    if not records:
+        return 0
+    db.execute(insert(Log), records)
+    record_log_batch(db, records)
+    db.commit()
+    return len(records)
+
+
 def get_user_logs(db: Session, user_id: int, limit: int = 10) -> list[Log]:
     """Получить логи пользователя (по умолчанию — последние 10)."""
     return (
@@ -58,5 +139,64 @@ def update_user_subscription(
     if user:
         user.subscription_settings = subscription_settings
         db.commit()
-        db.refresh(user)
+        user_cache.invalidate_user_id(user.id)
     return user
+
+
+def replace_user_subscriptions(db: Session, user_id: int, rows: list[dict]) -> int:
+    """
+    Заменить подписки пользователя.
+
+    Каждая запись — словарь с ключами kind, city, city_name,
+    frequency, send_time, next_run_at.
+    """
+    db.execute(delete(Subscription).where(Subscription.user_id == user_id))
+    if rows:
+        db.execute(insert(Subscription), [{**row, "user_id": user_id} for row in rows])
+    db.commit()
+    return len(rows)
+
+
+def get_due_subscriptions(
+    db: Session,
+    now: datetime,
+    kind: str | None = None,
+    city: str | None = None,
+    batch_size: int = 1000,
+) -> Iterator:
+    """
+    Подписки, срок отправки которых наступил (next_run_at <= now).
+
+    Один проход по индексу next_run_at, а при указании kind и city —
+    по составному индексу (kind, city, next_run_at). Строки читаются
+    порциями по batch_size и содержат telegram_id пользователя.
+    """
+    query = (
+        select(
+            Subscription.id,
+            Subscription.kind,
+            Subscription.city,
+            Subscription.city_name,
+            Subscription.frequency,
+            Subscription.send_time,
+            User.telegram_id,
+        )
+        .join(User, User.id == Subscription.user_id)
+        .where(Subscription.next_run_at <= now)
+    )
+    if kind is not None:
+        query = query.where(Subscription.kind == kind)
+        if city is not None:
+            query = query.where(Subscription.city == city)
+    return db.execute(
+        query.order_by(Subscription.next_run_at).execution_options(yield_per=batch_size)
+    )
+
+
+def advance_subscriptions(db: Session, updates: list[dict]) -> int:
+    """Пакетно сдвинуть next_run_at (записи вида {"id": ..., "next_run_at": ...})."""
+    if not updates:
+        return 0
+    db.execute(update(Subscription), updates)
+    db.commit()
+    return len(updates)
@@ -1,10 +1,9 @@
-from database.models import Base
-from database.config import engine
+from database.config import init_db
 
 
 def init_database():
     """Инициализация базы данных - создание всех таблиц"""
-    Base.metadata.create_all(bind=engine)
+    init_db()
     print("База данных инициализирована успешно!")
 
 
@@ -0,0 +1,160 @@
+"""
+Буферизованная запись логов команд.
+
+Обработчики кладут записи в очередь и сразу возвращаются, а фоновый поток
+сохраняет их пачками одним INSERT — по размеру пачки или по таймеру.
+"""
+
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from database.crud import create_logs_bulk
+
+
+class LogWriter:
+    """Фоновый писатель логов с ограниченной очередью."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        put_timeout: float = 0.05,
+    ):
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def start(self):
+        """Запустить фоновый поток записи."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="log-writer", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Остановить поток, предварительно записав все накопленные логи."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def enqueue(self, user_id: int, command: str, timestamp: datetime | None = None) -> bool:
+        """
+        Поставить лог в очередь на запись.
+
+        Если очередь заполнена, ждет не дольше put_timeout,
+        после чего запись отбрасывается. Возвращает False, если лог отброшен.
+        """
+        record = {
+            "user_id": user_id,
+            "command": command,
+            "timestamp": timestamp or datetime.utcnow(),
+        }
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            print(f"Очередь логов переполнена, лог отброшен: {command}")
+            return False
+        self.enqueued += 1
+        return True
+
+    def stats(self) -> dict:
+        """Глубина очереди и метрики записи."""
+        return {
+            "queue_depth": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+            "avg_flush_seconds": (
+                self.total_flush_seconds / self.flushes if self.flushes else 0.0
+            ),
+        }
+
+    def _run(self):
+        """Основной цикл: копить пачку до batch_size или до flush_interval."""
+        batch: list[dict] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                batch.append(self._queue.get(timeout=min(timeout, 0.1)))
+            except queue.Empty:
+                pass
+
+            stopping = self._stop.is_set()
+            if stopping:
+                batch.extend(self._drain())
+
+            if batch and (
+                len(batch) >= self.batch_size
+                or time.monotonic() >= deadline
+                or stopping
+            ):
+                for start in range(0, len(batch), self.batch_size):
+                    self._flush(batch[start:start + self.batch_size])
+                batch = []
+
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+            if stopping:
+                return
+
+    def _drain(self) -> list[dict]:
+        """Забрать из очереди все оставшиеся записи."""
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                return records
+
+    def _flush(self, batch: list[dict]):
+        """Записать пачку логов; при ошибке — одна повторная попытка."""
+        started = time.perf_counter()
+        for attempt in range(2):
+            db = self._session_factory()
+            try:
+                create_logs_bulk(db, batch)
+                self.written += len(batch)
+                break
+            except Exception as e:
+                db.rollback()
+                print(f"Ошибка при записи логов (попытка {attempt + 1}): {e}")
+            finally:
+                db.close()
+        else:
+            self.failed += len(batch)
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self.total_flush_seconds += elapsed
@@ -0,0 +1,70 @@
+"""
+Одна сессия БД на обновление Telegram (unit of work).
+"""
+
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from telebot.handler_backends import BaseMiddleware
+
+
+def after_commit(db: Session, callback: Callable[[], None]):
+    """
+    Выполнить callback после фиксации текущей транзакции сессии
+    (сразу, если транзакции нет). При откате callback не выполняется.
+
+    Так данные, которые ссылаются на еще не зафиксированные строки
+    (кэш пользователей, логи для LogWriter), уходят наружу только после commit.
+    """
+    if not db.in_transaction():
+        callback()
+        return
+    callbacks = db.info.get("after_commit")
+    if callbacks is None:
+        callbacks = db.info["after_commit"] = []
+        event.listen(db, "after_commit", _run_after_commit)
+        event.listen(db, "after_rollback", lambda session: session.info.pop("after_commit", None))
+    callbacks.append(callback)
+
+
+def _run_after_commit(session: Session):
+    for callback in session.info.pop("after_commit", []):
+        try:
+            callback()
+        except Exception as e:
+            print(f"Ошибка после фиксации транзакции: {e}")
+
+
+class SessionMiddleware(BaseMiddleware):
+    """
+    Открывает сессию перед обработчиком и передает ее аргументом db.
+
+    После обработчика вся его работа фиксируется одним commit,
+    а если обработчик выбросил исключение — откатывается.
+    Сессия закрывается в любом случае.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session]):
+        super().__init__()
+        self.update_types = ["message"]
+        self._session_factory = session_factory
+
+    def pre_process(self, message, data):
+        # Соединение берется из пула только при первом запросе к БД
+        data["db"] = self._session_factory()
+
+    def post_process(self, message, data, exception):
+        db = data.pop("db", None)
+        if db is None:
+            return
+        try:
+            if exception is None:
+                db.commit()
+            else:
+                db.rollback()
+        except Exception as e:
+            db.rollback()
+            print(f"Ошибка при фиксации транзакции: {e}")
+        finally:
+            db.close()
@@ -3,7 +3,7 @@ SQLAlchemy модели базы данных для информационно
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, Text, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -25,6 +25,9 @@ class User(Base):
     # Связь с логами
     logs = relationship("Log", back_populates="user")
 
+    # Связь с подписками
+    subscriptions = relationship("Subscription", back_populates="user")
+
 
 class Log(Base):
     """Модель лога запросов"""
@@ -38,3 +41,66 @@ class Log(Base):
 
     # Связь с пользователем
     user = relationship("User", back_populates="logs")
+
+    __table_args__ = (
+        Index("ix_logs_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_logs_timestamp", "timestamp"),
+    )
+
+
+class LogDailyStat(Base):
+    """Модель дневного агрегата логов: число команд пользователя за день"""
+
+    __tablename__ = "log_daily_stats"
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    command = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class Subscription(Base):
+    """Модель подписки на регулярные уведомления"""
+
+    __tablename__ = "subscriptions"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String(32), nullable=False)  # weather, news, events
+    city = Column(String(255), nullable=True)  # нормализованное название города
+    city_name = Column(String(255), nullable=True)  # название в написании пользователя
+    frequency = Column(String(16), nullable=False)  # hourly, daily, weekly
+    send_time = Column(String(5), nullable=False)  # HH:MM в часовом поясе подписок
+    next_run_at = Column(DateTime, nullable=False)  # следующая отправка (UTC)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Связь с пользователем
+    user = relationship("User", back_populates="subscriptions")
+
+    __table_args__ = (
+        Index("ix_subscriptions_kind_city_next_run_at", "kind", "city", "next_run_at"),
+        Index("ix_subscriptions_next_run_at", "next_run_at"),
+    )
+
+
+class StatCounter(Base):
+    """Модель накопительного счетчика статистики"""
+
+    __tablename__ = "stat_counters"
+
+    kind = Column(String(32), primary_key=True)  # total, command, city, dau
+    key = Column(String(255), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_stat_counters_kind_value", "kind", "value"),
+    )
+
+
+class DailyActiveUser(Base):
+    """Модель отметки активности пользователя за день"""
+
+    __tablename__ = "daily_active_users"
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
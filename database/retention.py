@@ -0,0 +1,133 @@
+"""
+Хранение логов: сворачивание старых записей в дневные агрегаты.
+
+Сырые логи старше срока хранения переносятся в log_daily_stats
+(день, пользователь, команда, количество) и удаляются, поэтому размер
+таблицы logs и время запросов к ней не растут со временем.
+"""
+
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from database.models import DailyActiveUser, Log, LogDailyStat
+
+# Диалекты с поддержкой INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _add_daily_stats(db: Session, rows: list[dict]):
+    """Прибавить количества к агрегатам (создавая недостающие строки)."""
+    dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(LogDailyStat)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["day", "user_id", "command"],
+                set_={"count": LogDailyStat.count + stmt.excluded["count"]},
+            ),
+            rows,
+        )
+        return
+
+    for row in rows:
+        key = (row["day"], row["user_id"], row["command"])
+        if db.get(LogDailyStat, key) is None:
+            db.add(LogDailyStat(**row))
+            db.flush()
+        else:
+            db.execute(
+                update(LogDailyStat)
+                .where(
+                    LogDailyStat.day == row["day"],
+                    LogDailyStat.user_id == row["user_id"],
+                    LogDailyStat.command == row["command"],
+                )
+                .values(count=LogDailyStat.count + row["count"])
+            )
+
+
+def rollup_day(db: Session, day) -> int:
+    """
+    Свернуть логи одного дня в агрегаты и удалить их.
+
+    Выполняется в одной транзакции; возвращает число удаленных логов.
+    """
+    start = datetime.combine(day, time.min)
+    end = start + timedelta(days=1)
+    in_day = (Log.timestamp >= start, Log.timestamp < end)
+
+    grouped = db.execute(
+        select(Log.user_id, Log.command, func.count().label("count"))
+        .where(*in_day)
+        .group_by(Log.user_id, Log.command)
+    ).all()
+    if grouped:
+        _add_daily_stats(
+            db,
+            [
+                {"day": day, "user_id": row.user_id, "command": row.command, "count": row.count}
+                for row in grouped
+            ],
+        )
+    deleted = db.execute(delete(Log).where(*in_day)).rowcount
+    db.commit()
+    return deleted
+
+
+def rollup_logs(db: Session, retention_days: int, now: datetime | None = None) -> int:
+    """
+    Свернуть все логи старше retention_days дней (целыми сутками, по UTC).
+
+    Каждый день обрабатывается отдельной транзакцией, чтобы не держать
+    блокировку долго. Возвращает общее число удаленных логов.
+    """
+    cutoff = ((now or datetime.utcnow()) - timedelta(days=retention_days)).date()
+
+    # Отметки активности нужны только для подсчета новых активных за день
+    db.execute(delete(DailyActiveUser).where(DailyActiveUser.day < cutoff))
+    db.commit()
+
+    oldest = db.execute(select(func.min(Log.timestamp))).scalar()
+    if oldest is None:
+        return 0
+
+    deleted = 0
+    day = oldest.date()
+    while day < cutoff:
+        deleted += rollup_day(db, day)
+        day += timedelta(days=1)
+    return deleted
+
+
+class LogRetentionJob:
+    """Ежедневное сворачивание старых логов в планировщике."""
+
+    def __init__(self, session_factory, retention_days: int = 90):
+        self._session_factory = session_factory
+        self.retention_days = retention_days
+        self.runs = 0
+        self.deleted = 0
+
+    def schedule(self, scheduler, hour: int = 3, minute: int = 30):
+        """Добавить ежедневный запуск в планировщик."""
+        scheduler.add_job(
+            self.run, "cron", hour=hour, minute=minute,
+            id="log_retention", replace_existing=True,
+        )
+
+    def run(self):
+        """Свернуть логи старше срока хранения."""
+        db = self._session_factory()
+        try:
+            deleted = rollup_logs(db, self.retention_days)
+            self.runs += 1
+            self.deleted += deleted
+            print(f"Свернуто старых логов: {deleted}")
+        except Exception as e:
+            db.rollback()
+            print(f"Ошибка при сворачивании логов: {e}")
+        finally:
+            db.close()
@@ -0,0 +1,161 @@
+"""
+Накопительная статистика по командам и пользователям.
+
+Счетчики обновляются инкрементально при записи логов и регистрации
+пользователей, поэтому чтение статистики не требует полного прохода
+по таблицам users и logs.
+"""
+
+import re
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from database.models import DailyActiveUser, StatCounter
+from services.cities import normalize_city
+
+# Диалекты с поддержкой INSERT ... ON CONFLICT
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+# Команды, у которых аргумент — название города
+CITY_COMMANDS = ("/weather", "/events")
+
+_SUFFIX_RE = re.compile(r"\s*\([^()]*\)\s*$")
+
+
+def parse_command(command: str) -> tuple[str, str | None]:
+    """
+    Разобрать строку лога на команду и город.
+
+    «/weather Москва (город не найден)» → ("/weather", "москва").
+    """
+    command = _SUFFIX_RE.sub("", command)
+    name, _, arg = command.partition(" ")
+    arg = arg.strip()
+    city = normalize_city(arg) if name in CITY_COMMANDS and arg else None
+    return name, city
+
+
+def add_counters(db: Session, deltas: dict[tuple[str, str], int]):
+    """Прибавить значения к счетчикам (kind, key) без фиксации транзакции."""
+    rows = [
+        {"kind": kind, "key": key, "value": value}
+        for (kind, key), value in deltas.items()
+        if value
+    ]
+    if not rows:
+        return
+
+    dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(StatCounter)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["kind", "key"],
+                set_={"value": StatCounter.value + stmt.excluded["value"]},
+            ),
+            rows,
+        )
+        return
+
+    for row in rows:
+        counter = db.get(StatCounter, (row["kind"], row["key"]))
+        if counter is None:
+            db.add(StatCounter(**row))
+        else:
+            counter.value += row["value"]
+    db.flush()
+
+
+def apply_log_counts(db: Session, entries: Iterable[tuple[date, int, str, int]]):
+    """
+    Учесть в статистике логи вида (день, user_id, команда, количество).
+
+    Обновляет общий счетчик логов, счетчики команд и городов
+    и число активных пользователей по дням. Транзакцию не фиксирует.
+    """
+    deltas: Counter = Counter()
+    active: dict[date, set[int]] = {}
+    for day, user_id, command, count in entries:
+        name, city = parse_command(command)
+        deltas[("total", "logs")] += count
+        deltas[("command", name)] += count
+        if city:
+            deltas[("city", city)] += count
+        active.setdefault(day, set()).add(user_id)
+
+    for day, user_ids in active.items():
+        known = set(
+            db.execute(
+                select(DailyActiveUser.user_id).where(
+                    DailyActiveUser.day == day,
+                    DailyActiveUser.user_id.in_(user_ids),
+                )
+            ).scalars()
+        )
+        new_ids = user_ids - known
+        if not new_ids:
+            continue
+        rows = [{"day": day, "user_id": user_id} for user_id in new_ids]
+        dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            # Другой процесс мог отметить пользователя после выборки выше:
+            # считаем только строки, которые вставил этот запрос
+            inserted = db.execute(
+                dialect_insert(DailyActiveUser)
+                .values(rows)
+                .on_conflict_do_nothing()
+                .returning(DailyActiveUser.user_id)
+            ).scalars().all()
+            added = len(inserted)
+        else:
+            db.add_all(DailyActiveUser(**row) for row in rows)
+            added = len(rows)
+        deltas[("dau", day.isoformat())] += added
+
+    add_counters(db, deltas)
+
+
+def record_log_batch(db: Session, records: list[dict]):
+    """Учесть в статистике пачку логов из LogWriter (без фиксации транзакции)."""
+    apply_log_counts(
+        db,
+        (
+            (record["timestamp"].date(), record["user_id"], record["command"], 1)
+            for record in records
+        ),
+    )
+
+
+def read_stats(db: Session, days: int = 7, top: int = 10, today: date | None = None) -> dict:
+    """
+    Прочитать статистику из счетчиков.
+
+    Возвращает общее число пользователей и логов, число вызовов
+    по командам, активных пользователей за последние days дней
+    и top самых популярных городов.
+    """
+    today = today or datetime.utcnow().date()
+    day_keys = [(today - timedelta(days=offset)).isoformat() for offset in range(days)]
+
+    def counters(kind: str, limit: int | None = None, keys: list[str] | None = None) -> dict:
+        query = select(StatCounter.key, StatCounter.value).where(StatCounter.kind == kind)
+        if keys is not None:
+            query = query.where(StatCounter.key.in_(keys))
+        if limit is not None:
+            query = query.order_by(StatCounter.value.desc()).limit(limit)
+        return dict(db.execute(query).all())
+
+    totals = counters("total")
+    active = counters("dau", keys=day_keys)
+    return {
+        "users_total": totals.get("users", 0),
+        "logs_total": totals.get("logs", 0),
+        "commands": counters("command"),
+        "active_users": {key: active.get(key, 0) for key in day_keys},
+        "top_cities": counters("city", limit=top),
+    }
@@ -0,0 +1,76 @@
+"""
+Кэш пользователей в памяти процесса: telegram_id → (id, имя).
+
+Позволяет не обращаться к БД при каждом сообщении вернувшегося пользователя.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class CachedUser(NamedTuple):
+    """Данные пользователя, которые нужны обработчикам команд."""
+
+    id: int
+    name: str
+
+
+class UserCache:
+    """Потокобезопасный LRU-кэш пользователей ограниченного размера."""
+
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._users: OrderedDict[int, CachedUser] = OrderedDict()
+        self._telegram_ids: dict[int, int] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id: int) -> CachedUser | None:
+        """Получить пользователя по Telegram ID или None."""
+        with self._lock:
+            user = self._users.get(telegram_id)
+            if user is None:
+                self.misses += 1
+                return None
+            self._users.move_to_end(telegram_id)
+            self.hits += 1
+            return user
+
+    def put(self, telegram_id: int, user: CachedUser):
+        """Сохранить пользователя, вытеснив давно не использованных."""
+        with self._lock:
+            self._users[telegram_id] = user
+            self._users.move_to_end(telegram_id)
+            self._telegram_ids[user.id] = telegram_id
+            while len(self._users) > self.max_size:
+                _, evicted = self._users.popitem(last=False)
+                self._telegram_ids.pop(evicted.id, None)
+
+    def invalidate_user_id(self, user_id: int):
+        """Удалить из кэша пользователя по внутреннему ID."""
+        with self._lock:
+            telegram_id = self._telegram_ids.pop(user_id, None)
+            if telegram_id is not None:
+                self._users.pop(telegram_id, None)
+
+    def clear(self):
+        """Очистить кэш."""
+        with self._lock:
+            self._users.clear()
+            self._telegram_ids.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Размер кэша и счетчики попаданий/промахов."""
+        with self._lock:
+            return {"size": len(self._users), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache(int(os.getenv("USER_CACHE_SIZE", "100000")))
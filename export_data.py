@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Выгрузка таблиц users и logs в CSV или Parquet.
+
+Строки читаются порциями по возрастанию id: каждая порция — отдельный
+короткий запрос «id > последний выгруженный», поэтому память не зависит
+от размера таблицы, а SQLite не блокируется на все время выгрузки.
+Порции дописываются в файл сразу, после каждой порции CSV номер
+последней строки и размер файла сохраняются в <таблица>.<формат>.checkpoint
+вместе с периодом --since/--until. С флагом --resume выгрузка продолжается
+с этой отметки: CSV обрезается до сохраненного размера (строки, записанные
+после отметки, выгружаются заново), а другой период — ошибка.
+
+Для Parquet нужен пакет pyarrow (pip install pyarrow). Файл Parquet
+пишется группами строк и дописать его нельзя, поэтому продолжение
+создает новый файл <таблица>.after-<id>.parquet (только если после
+отметки есть строки), а номер последней строки сохраняется при закрытии файла.
+
+Примеры:
+    python export_data.py --table logs --since 2024-05-01 --until 2024-06-01
+    python export_data.py --format parquet --output-dir export --resume
+"""
+
+import argparse
+import csv
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, select
+
+from database.config import get_engine
+from database.models import Log, User
+
+# Таблица → (модель, столбец времени для --since/--until)
+TABLES = {
+    "users": (User, User.registered_at),
+    "logs": (Log, Log.timestamp),
+}
+
+
+def read_chunks(model, time_column=None, since=None, until=None, after_id: int = 0, chunk_size: int = 10000):
+    """Строки таблицы по возрастанию id порциями по chunk_size (списки кортежей)."""
+    columns = list(model.__table__.columns)
+    engine = get_engine()
+    while True:
+        query = select(*columns).where(model.id > after_id).order_by(model.id).limit(chunk_size)
+        if since is not None:
+            query = query.where(time_column >= since)
+        if until is not None:
+            query = query.where(time_column < until)
+        with engine.connect() as connection:
+            rows = connection.execute(query).all()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+
+
+def _period(since, until) -> dict:
+    return {
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+    }
+
+
+def load_checkpoint(path: str, since=None, until=None) -> tuple[int, int]:
+    """
+    Номер последней выгруженной строки и размер файла на этот момент
+    ((0, 0), если выгрузки не было). Отметка другого периода — ValueError.
+    """
+    if not os.path.exists(path):
+        return 0, 0
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    period = _period(since, until)
+    saved = {key: checkpoint.get(key) for key in period}
+    if saved != period:
+        raise ValueError(
+            f"Отметка {path} сохранена для периода {saved}, а не {period}: "
+            "продолжить можно только с тем же --since/--until"
+        )
+    return int(checkpoint["last_id"]), int(checkpoint.get("offset", 0))
+
+
+def save_checkpoint(path: str, last_id: int, since=None, until=None, offset: int = 0):
+    # Запись через временный файл: при обрыве остается прежняя отметка
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump({
+            "last_id": last_id,
+            "offset": offset,
+            **_period(since, until),
+            "saved_at": datetime.utcnow().isoformat(),
+        }, f)
+    os.replace(temporary, path)
+
+
+class CsvWriter:
+    """
+    CSV с заголовком; при продолжении файл обрезается до offset байт
+    (размер на момент отметки) и строки дописываются после него.
+    """
+
+    def __init__(self, path: str, columns: list[str], offset: int = 0):
+        self.path = path
+        if offset:
+            os.truncate(path, offset)
+        self._file = open(path, "a" if offset else "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        if not offset:
+            self._writer.writerow(columns)
+
+    def write(self, rows: list[tuple]):
+        self._writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+        )
+        # Строки на диске до сохранения отметки продолжения
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    @property
+    def offset(self) -> int:
+        """Размер файла в байтах (после write)."""
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Parquet: каждая порция — отдельная группа строк. Файл создается
+    при первой порции, поэтому без новых строк он не появляется.
+    """
+
+    def __init__(self, path: str, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("Для --format parquet установите пакет pyarrow") from e
+        self.path = path
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([(column.name, self._arrow_type(column.type)) for column in columns])
+        self._writer = None
+
+    def _arrow_type(self, column_type):
+        if isinstance(column_type, Integer):
+            return self._pyarrow.int64()
+        if isinstance(column_type, DateTime):
+            return self._pyarrow.timestamp("us")
+        return self._pyarrow.string()
+
+    def write(self, rows: list[tuple]):
+        if self._writer is None:
+            self._writer = self._pyarrow.parquet.ParquetWriter(self.path, self._schema)
+        columns = list(zip(*rows))
+        self._writer.write_table(
+            self._pyarrow.table(
+                {field.name: list(values) for field, values in zip(self._schema, columns)},
+                schema=self._schema,
+            )
+        )
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def export_table(
+    name: str,
+    output_dir: str = ".",
+    fmt: str = "csv",
+    since=None,
+    until=None,
+    resume: bool = False,
+    chunk_size: int = 10000,
+) -> int:
+    """Выгрузить таблицу; возвращает число выгруженных строк."""
+    model, time_column = TABLES[name]
+    columns = list(model.__table__.columns)
+    checkpoint = os.path.join(output_dir, f"{name}.{fmt}.checkpoint")
+    after_id, offset = load_checkpoint(checkpoint, since, until) if resume else (0, 0)
+
+    if fmt == "csv":
+        if offset and not os.path.exists(os.path.join(output_dir, f"{name}.csv")):
+            raise ValueError(f"Нет файла {name}.csv для продолжения выгрузки по отметке {checkpoint}")
+        writer = CsvWriter(os.path.join(output_dir, f"{name}.csv"), [c.name for c in columns], offset)
+    else:
+        filename = f"{name}.after-{after_id}.parquet" if after_id else f"{name}.parquet"
+        writer = ParquetWriter(os.path.join(output_dir, filename), columns)
+
+    exported = 0
+    last_id = after_id
+    try:
+        for rows in read_chunks(model, time_column, since, until, after_id, chunk_size):
+            writer.write(rows)
+            exported += len(rows)
+            last_id = rows[-1][0]
+            if fmt == "csv":
+                save_checkpoint(checkpoint, last_id, since, until, writer.offset)
+            print(f"{name}: {exported} строк (до id {last_id})")
+    finally:
+        writer.close()
+        # Файл Parquet читаем только после закрытия, поэтому отметка — здесь
+        if fmt == "parquet" and last_id != after_id:
+            save_checkpoint(checkpoint, last_id, since, until)
+
+    if exported or fmt == "csv":
+        print(f"{name}: выгружено {exported} строк в {writer.path}")
+    else:
+        print(f"{name}: новых строк нет, файл не создан")
+    return exported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Выгрузка пользователей и логов в CSV или Parquet")
+    parser.add_argument("--table", choices=(*TABLES, "all"), default="all", help="таблица (по умолчанию обе)")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv", help="формат файлов")
+    parser.add_argument("--output-dir", default=".", help="каталог для файлов")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="начало периода (UTC, ISO 8601)")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="конец периода (не включая)")
+    parser.add_argument("--resume", action="store_true", help="продолжить с последней выгруженной строки")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="строк за один запрос")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for table in TABLES if args.table == "all" else (args.table,):
+        try:
+            export_table(
+                table,
+                output_dir=args.output_dir,
+                fmt=args.format,
+                since=args.since,
+                until=args.until,
+                resume=args.resume,
+                chunk_size=args.chunk_size,
+            )
+        except ValueError as e:
+            parser.error(str(e))
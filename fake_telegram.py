@@ -0,0 +1,88 @@
+"""
+Имитация Telegram для локальной проверки режима webhook.
+
+Отправляет на webhook бота POST-запросы с синтетическими обновлениями,
+как это делает Telegram (включая заголовок с секретным токеном
+и повторную доставку части обновлений).
+
+Пример:
+    python fake_telegram.py --url http://127.0.0.1:8443/webhook --secret s3cret --count 100
+"""
+
+import argparse
+import itertools
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+
+from services.webhook import SECRET_HEADER
+
+COMMANDS = ("/start", "/help", "/weather Москва", "/weather Казань", "/news", "/events")
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    """Обновление Telegram с текстовым сообщением от пользователя chat_id."""
+    user = {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+        },
+    }
+
+
+def post_update(url: str, update: dict, secret: str | None = None, timeout: float = 10) -> int:
+    """Отправить обновление на webhook; возвращает HTTP-статус ответа."""
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers[SECRET_HEADER] = secret
+    request = urllib.request.Request(
+        url, data=json.dumps(update).encode(), headers=headers, method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка синтетических обновлений на webhook")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/webhook")
+    parser.add_argument("--secret", default=None)
+    parser.add_argument("--count", type=int, default=100, help="число обновлений")
+    parser.add_argument("--chats", type=int, default=10, help="число разных чатов")
+    parser.add_argument("--rate", type=float, default=0, help="обновлений в секунду (0 — без паузы)")
+    parser.add_argument(
+        "--duplicates", type=float, default=0.1, help="доля повторно доставленных обновлений"
+    )
+    parser.add_argument("--start-id", type=int, default=1)
+    args = parser.parse_args()
+
+    statuses: dict[int, int] = {}
+    started = time.perf_counter()
+    commands = itertools.cycle(COMMANDS)
+    for update_id in range(args.start_id, args.start_id + args.count):
+        update = make_update(update_id, random.randint(1, args.chats), next(commands))
+        deliveries = 2 if random.random() < args.duplicates else 1
+        for _ in range(deliveries):
+            status = post_update(args.url, update, args.secret)
+            statuses[status] = statuses.get(status, 0) + 1
+        if args.rate:
+            time.sleep(1 / args.rate)
+
+    elapsed = time.perf_counter() - started
+    print(f"Отправлено обновлений: {args.count} за {elapsed:.2f} с")
+    for status, count in sorted(statuses.items()):
+        print(f"  HTTP {status}: {count}")
+
+
+if __name__ == "__main__":
+    main()
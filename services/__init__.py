@@ -0,0 +1 @@
+# Сервисный слой бота: кэши, фоновые задачи и интеграции
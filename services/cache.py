@@ -0,0 +1,366 @@
+"""
+Кэш ответов внешних API: LRU + TTL, stale-while-revalidate и объединение запросов.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class _Entry:
+    """Запись кэша: значение, исходный аргумент загрузчика и время загрузки."""
+
+    __slots__ = ("value", "arg", "loaded_at")
+
+    def __init__(self, value: Any, arg: Any, loaded_at: float):
+        self.value = value
+        self.arg = arg
+        self.loaded_at = loaded_at
+
+
+class _Call:
+    """Выполняющаяся загрузка, результата которой ждут остальные потоки."""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class StaleWhileRevalidateCache:
+    """
+    Потокобезопасный кэш перед медленным загрузчиком.
+
+    - свежая запись (моложе ttl) отдается сразу;
+    - устаревшая запись (моложе ttl + max_stale) тоже отдается сразу,
+      а в фоне запускается ровно одно обновление;
+    - при промахе загрузку выполняет только первый поток,
+      остальные запросы того же ключа ждут его результата;
+    - если загрузка не удалась, отдается последнее известное значение
+      любой давности (если оно есть);
+    - размер ограничен max_size, вытесняются давно не использованные записи;
+    - с общим хранилищем shared (services/state.py) перед загрузкой
+      проверяется запись, загруженная другим процессом, а загруженные
+      значения (JSON) публикуются для остальных процессов.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Any], Any],
+        ttl: float,
+        max_size: int = 1024,
+        max_stale: float = 0,
+        key_func: Callable[[Any], Hashable] | None = None,
+        cacheable: Callable[[Any], bool] | None = None,
+        shared=None,
+        namespace: str = "",
+    ):
+        self._loader = loader
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_stale = max_stale
+        self._key_func = key_func or (lambda arg: arg)
+        self._cacheable = cacheable or (lambda value: True)
+        self.shared = shared
+        self.namespace = namespace
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._inflight: dict[Hashable, _Call] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.fallbacks = 0
+        self.shared_hits = 0
+
+    def get(self, arg: Any) -> Any:
+        """Получить значение для аргумента, загрузив его при необходимости."""
+        key = self._key_func(arg)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.loaded_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+                if age < self.ttl + self.max_stale:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._inflight:
+                        self._start_refresh(key, entry.arg)
+                    return entry.value
+
+            self.misses += 1
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+
+        if leader:
+            self._load(key, arg, call)
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    raise call.error
+                self.fallbacks += 1
+                return entry.value
+        return call.value
+
+    def peek(self, arg: Any) -> Any:
+        """Вернуть закэшированное значение без загрузки (даже устаревшее) или None."""
+        with self._lock:
+            entry = self._entries.get(self._key_func(arg))
+            return entry.value if entry is not None else None
+
+    def expires_in(self, arg: Any) -> float | None:
+        """Сколько секунд запись останется свежей (отрицательно — устарела), None — нет записи."""
+        with self._lock:
+            entry = self._entries.get(self._key_func(arg))
+            if entry is None:
+                return None
+            return entry.loaded_at + self.ttl - time.monotonic()
+
+    def put(self, arg: Any, value: Any) -> None:
+        """Положить готовое значение в кэш (например, при прогреве)."""
+        if self._cacheable(value):
+            key = self._key_func(arg)
+            with self._lock:
+                self._store(key, arg, value)
+            self._write_shared(key, value)
+
+    def refresh(self, arg: Any, background: bool = True) -> bool:
+        """
+        Обновить ключ, если его обновление еще не выполняется.
+
+        При background=False загрузка выполняется в текущем потоке.
+        """
+        key = self._key_func(arg)
+        with self._lock:
+            if key in self._inflight:
+                return False
+            if background:
+                self._start_refresh(key, arg)
+                return True
+            call = self._inflight[key] = _Call()
+            self.refreshes += 1
+        self._load(key, arg, call, True)
+        return True
+
+    def invalidate(self, arg: Any) -> None:
+        """Удалить запись из кэша."""
+        with self._lock:
+            self._entries.pop(self._key_func(arg), None)
+
+    def keys(self) -> list[Hashable]:
+        """Ключи кэша от давно использованных к недавним."""
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        """Счетчики попаданий, промахов и фоновых обновлений."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "fallbacks": self.fallbacks,
+                "shared_hits": self.shared_hits,
+            }
+
+    def _start_refresh(self, key: Hashable, arg: Any) -> None:
+        """Запустить фоновое обновление (вызывается под блокировкой)."""
+        call = self._inflight[key] = _Call()
+        self.refreshes += 1
+        threading.Thread(
+            target=self._load,
+            args=(key, arg, call, True),
+            name=f"cache-refresh-{key}",
+            daemon=True,
+        ).start()
+
+    def _load(self, key: Hashable, arg: Any, call: _Call, background: bool = False) -> None:
+        """Вызвать загрузчик и опубликовать результат ожидающим потокам."""
+        shared = self._read_shared(key)
+        loaded_at = None
+        if shared is not None:
+            call.value, loaded_at = shared
+        else:
+            try:
+                call.value = self._loader(arg)
+            except Exception as e:
+                call.error = e
+        cached = call.error is None and self._cacheable(call.value)
+        with self._lock:
+            if cached:
+                self._store(key, arg, call.value, loaded_at)
+                if shared is not None:
+                    self.shared_hits += 1
+            elif background:
+                self.refresh_errors += 1
+            del self._inflight[key]
+        call.done.set()
+        if cached and shared is None:
+            self._write_shared(key, call.value)
+
+        if background and call.error is not None:
+            print(f"Ошибка фонового обновления кэша ({key}): {call.error}")
+
+    def _read_shared(self, key: Hashable) -> tuple[Any, float] | None:
+        """Свежая запись общего хранилища: значение и время загрузки (по monotonic)."""
+        if self.shared is None:
+            return None
+        try:
+            raw = self.shared.get(f"cache:{self.namespace}:{key}")
+            if raw is None:
+                return None
+            item = json.loads(raw)
+        except Exception as e:
+            print(f"Ошибка чтения общего кэша ({key}): {e}")
+            return None
+        age = max(0.0, time.time() - item["t"])
+        if age >= self.ttl:
+            return None
+        return item["v"], time.monotonic() - age
+
+    def _write_shared(self, key: Hashable, value: Any) -> None:
+        """Опубликовать значение для других процессов."""
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(
+                f"cache:{self.namespace}:{key}",
+                json.dumps({"t": time.time(), "v": value}, ensure_ascii=False),
+                ttl=self.ttl + self.max_stale,
+            )
+        except Exception as e:
+            print(f"Ошибка записи в общий кэш ({key}): {e}")
+
+    def _store(self, key: Hashable, arg: Any, value: Any, loaded_at: float | None = None) -> None:
+        """Сохранить запись и вытеснить лишние (вызывается под блокировкой)."""
+        self._entries[key] = _Entry(value, arg, loaded_at if loaded_at is not None else time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class AsyncStaleWhileRevalidateCache:
+    """
+    Вариант StaleWhileRevalidateCache для asyncio с асинхронным загрузчиком.
+
+    Работает в одном цикле событий, поэтому обходится без блокировок:
+    одновременные промахи ждут одну и ту же задачу загрузки.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Any], Awaitable[Any]],
+        ttl: float,
+        max_size: int = 1024,
+        max_stale: float = 0,
+        key_func: Callable[[Any], Hashable] | None = None,
+        cacheable: Callable[[Any], bool] | None = None,
+    ):
+        self._loader = loader
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_stale = max_stale
+        self._key_func = key_func or (lambda arg: arg)
+        self._cacheable = cacheable or (lambda value: True)
+
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.fallbacks = 0
+
+    async def get(self, arg: Any) -> Any:
+        """Получить значение для аргумента, загрузив его при необходимости."""
+        key = self._key_func(arg)
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.loaded_at
+            if age < self.ttl + self.max_stale:
+                self._entries.move_to_end(key)
+                if age < self.ttl:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    if key not in self._inflight:
+                        self.refreshes += 1
+                        self._start_load(key, entry.arg, background=True)
+                return entry.value
+
+        self.misses += 1
+        task = self._inflight.get(key) or self._start_load(key, arg)
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            entry = self._entries.get(key)
+            if entry is None:
+                raise
+            self.fallbacks += 1
+            return entry.value
+
+    def stats(self) -> dict[str, int]:
+        """Счетчики попаданий, промахов и фоновых обновлений."""
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "fallbacks": self.fallbacks,
+        }
+
+    def _start_load(self, key: Hashable, arg: Any, background: bool = False) -> asyncio.Task:
+        """Запустить задачу загрузки ключа."""
+        task = asyncio.ensure_future(self._load(key, arg, background))
+        if background:
+            # Ошибка фонового обновления уже учтена в _load
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+
+    async def _load(self, key: Hashable, arg: Any, background: bool) -> Any:
+        """Вызвать загрузчик и сохранить результат."""
+        try:
+            value = await self._loader(arg)
+        except Exception as e:
+            if background:
+                self.refresh_errors += 1
+                print(f"Ошибка фонового обновления кэша ({key}): {e}")
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        if self._cacheable(value):
+            self._entries[key] = _Entry(value, arg, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        elif background:
+            self.refresh_errors += 1
+        return value
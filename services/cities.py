@@ -0,0 +1,56 @@
+"""
+Нормализация названий городов.
+"""
+
+import re
+
+_SPACES_RE = re.compile(r"\s+")
+_DASHES_RE = re.compile(r"\s*[-‐‑–—]\s*")
+
+# Синонимы и латинские написания, сводимые к одному ключу
+CITY_ALIASES = {
+    "moscow": "москва",
+    "moskva": "москва",
+    "msk": "москва",
+    "мск": "москва",
+    "saint petersburg": "санкт-петербург",
+    "saint-petersburg": "санкт-петербург",
+    "st petersburg": "санкт-петербург",
+    "st. petersburg": "санкт-петербург",
+    "st-petersburg": "санкт-петербург",
+    "sankt-peterburg": "санкт-петербург",
+    "spb": "санкт-петербург",
+    "спб": "санкт-петербург",
+    "питер": "санкт-петербург",
+    "петербург": "санкт-петербург",
+    "kazan": "казань",
+    "novosibirsk": "новосибирск",
+    "yekaterinburg": "екатеринбург",
+    "ekaterinburg": "екатеринбург",
+    "екб": "екатеринбург",
+    "nizhny novgorod": "нижний новгород",
+    "nizhniy novgorod": "нижний новгород",
+    "нн": "нижний новгород",
+    "samara": "самара",
+    "omsk": "омск",
+    "rostov-on-don": "ростов-на-дону",
+    "rostov-na-donu": "ростов-на-дону",
+    "ростов": "ростов-на-дону",
+    "ufa": "уфа",
+    "krasnoyarsk": "красноярск",
+    "perm": "пермь",
+    "voronezh": "воронеж",
+    "volgograd": "волгоград",
+    "krasnodar": "краснодар",
+    "sochi": "сочи",
+    "kaliningrad": "калининград",
+    "vladivostok": "владивосток",
+    "minsk": "минск",
+}
+
+
+def normalize_city(city: str) -> str:
+    """Привести название города к ключу: регистр, пробелы, «ё» и синонимы."""
+    key = _SPACES_RE.sub(" ", city.strip()).casefold().replace("ё", "е")
+    key = _DASHES_RE.sub("-", key)
+    return CITY_ALIASES.get(key, key)
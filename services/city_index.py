@@ -0,0 +1,355 @@
+"""
+Локальный справочник городов для проверки и нормализации названий.
+
+Индекс собирается один раз из выгрузки GeoNames (cities15000.txt и т.п.):
+
+    python -m services.city_index cities15000.txt data/cities.idx \
+        --alternate-names alternateNamesV2.txt
+
+и открывается через mmap: записи фиксированного размера читаются прямо
+из файла, поэтому индекс не занимает память процесса и разделяется
+между процессами. Ключи поиска — названия в латинской транслитерации,
+так что «Москва», «Moskva» и «Moscow» находят один город.
+
+Формат файла: заголовок, таблица городов, отсортированная таблица
+ключей и блок строк UTF-8.
+"""
+
+import argparse
+import bisect
+import mmap
+import re
+import struct
+import unicodedata
+from functools import lru_cache
+from typing import NamedTuple
+
+from services.cities import normalize_city
+
+MAGIC = b"CITYIDX1"
+_HEADER = struct.Struct("<8sII")
+# geonameid, широта, долгота, население, страна, название, русское название
+_CITY = struct.Struct("<IffI2sIHIH")
+# ключ (смещение, длина), номер города
+_KEY = struct.Struct("<IHI")
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+    "ж": "zh", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    "і": "i", "ї": "yi", "є": "ye", "ґ": "g", "ў": "u",
+})
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+_CYRILLIC_RE = re.compile(r"[а-яё]", re.IGNORECASE)
+
+
+def search_key(name: str) -> str:
+    """
+    Ключ поиска: синонимы из CITY_ALIASES, транслитерация кириллицы,
+    без диакритики и знаков препинания («Санкт-Петербург» → «sankt peterburg»).
+    """
+    key = normalize_city(name).translate(_TRANSLIT)
+    key = unicodedata.normalize("NFKD", key)
+    key = "".join(char for char in key if not unicodedata.combining(char))
+    return _NON_ALNUM_RE.sub(" ", key).strip()
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Расстояние Дамерау — Левенштейна (с перестановкой соседних букв).
+
+    Если расстояние больше limit, возвращает limit + 1, не досчитывая.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: list[int] = []
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            cost = char_a != char_b
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class City(NamedTuple):
+    """Город из справочника."""
+
+    id: int
+    name: str
+    local_name: str
+    country: str
+    lat: float
+    lon: float
+    population: int
+
+    @property
+    def display_name(self) -> str:
+        """Название для ответов пользователю (русское, если известно)."""
+        return self.local_name or self.name
+
+
+class CityIndex:
+    """
+    Поиск города по названию: точный, по префиксу и с опечатками.
+
+    Из нескольких городов с одинаковым названием выбирается самый крупный.
+    Результаты resolve() кэшируются, поэтому повторные запросы
+    одного и того же названия почти бесплатны.
+    """
+
+    def __init__(self, path: str, cache_size: int = 4096):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.city_count, self.key_count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path}: не является индексом городов")
+        self._cities_offset = _HEADER.size
+        self._keys_offset = self._cities_offset + self.city_count * _CITY.size
+        self._strings_offset = self._keys_offset + self.key_count * _KEY.size
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def close(self):
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return self.city_count
+
+    # ---------------------------------------------------------------
+    # Чтение записей
+    # ---------------------------------------------------------------
+    def _string(self, offset: int, length: int) -> bytes:
+        start = self._strings_offset + offset
+        return self._mm[start:start + length]
+
+    def _key(self, position: int) -> tuple[bytes, int]:
+        offset, length, city = _KEY.unpack_from(self._mm, self._keys_offset + position * _KEY.size)
+        return self._string(offset, length), city
+
+    def city(self, number: int) -> City:
+        """Город по номеру записи в индексе."""
+        geonameid, lat, lon, population, country, name_offset, name_length, local_offset, local_length = (
+            _CITY.unpack_from(self._mm, self._cities_offset + number * _CITY.size)
+        )
+        return City(
+            id=geonameid,
+            name=self._string(name_offset, name_length).decode(),
+            local_name=self._string(local_offset, local_length).decode(),
+            country=country.decode(),
+            lat=round(lat, 4),
+            lon=round(lon, 4),
+            population=population,
+        )
+
+    def _lower_bound(self, key: bytes) -> int:
+        return bisect.bisect_left(range(self.key_count), key, key=lambda position: self._key(position)[0])
+
+    def _scan_prefix(self, prefix: bytes):
+        """Пары (ключ, номер города) с ключом, начинающимся с prefix."""
+        position = self._lower_bound(prefix)
+        while position < self.key_count:
+            key, city = self._key(position)
+            if not key.startswith(prefix):
+                return
+            yield key, city
+            position += 1
+
+    # ---------------------------------------------------------------
+    # Поиск
+    # ---------------------------------------------------------------
+    def exact(self, name: str) -> City | None:
+        """Город с точно совпадающим (после нормализации) названием."""
+        key = search_key(name).encode()
+        if not key:
+            return None
+        position = self._lower_bound(key)
+        if position < self.key_count:
+            found, city = self._key(position)
+            if found == key:
+                return self.city(city)
+        return None
+
+    def prefix(self, text: str, limit: int = 10) -> list[City]:
+        """Крупнейшие города, одно из названий которых начинается с text."""
+        key = search_key(text).encode()
+        if not key:
+            return []
+        numbers = {city for _, city in self._scan_prefix(key)}
+        cities = sorted(map(self.city, numbers), key=lambda city: -city.population)
+        return cities[:limit]
+
+    def fuzzy(self, text: str, max_distance: int | None = None, max_candidates: int = 2000) -> City | None:
+        """
+        Ближайший город с опечаткой не больше max_distance
+        (по умолчанию 1 для коротких названий и 2 для остальных).
+
+        Кандидаты — ключи с теми же двумя первыми буквами (или с этими
+        буквами, переставленными местами) и близкой длиной. Просматривается
+        не больше max_candidates ключей, поэтому неизвестное название стоит
+        ограниченного времени и на полной выгрузке GeoNames. Другие опечатки
+        в первых двух буквах не исправляются.
+        """
+        key = search_key(text)
+        if not key:
+            return None
+        if max_distance is None:
+            max_distance = 1 if len(key) <= 5 else 2
+
+        prefixes = [key[:2]]
+        if len(key) >= 2 and key[0] != key[1]:
+            prefixes.append(key[1] + key[0])
+
+        letters = set(key)
+        best: tuple[int, int] | None = None  # (расстояние, -население)
+        best_city = None
+        budget = max_candidates
+        for prefix in prefixes:
+            for found, number in self._scan_prefix(prefix.encode()):
+                budget -= 1
+                if budget < 0:
+                    break
+                if abs(len(found) - len(key)) > max_distance:
+                    continue
+                found = found.decode()
+                # Каждая правка убирает и добавляет не больше одной буквы,
+                # поэтому по набору букв большинство ключей отсеивается без DP
+                found_letters = set(found)
+                if len(letters - found_letters) > max_distance or len(found_letters - letters) > max_distance:
+                    continue
+                distance = edit_distance(key, found, max_distance)
+                if distance > max_distance:
+                    continue
+                city = self.city(number)
+                rank = (distance, -city.population)
+                if best is None or rank < best:
+                    best, best_city = rank, city
+        return best_city
+
+    def _resolve(self, name: str) -> City | None:
+        return self.exact(name) or self.fuzzy(name)
+
+    def stats(self) -> dict:
+        info = self.resolve.cache_info()
+        return {
+            "cities": self.city_count,
+            "keys": self.key_count,
+            "hits": info.hits,
+            "misses": info.misses,
+        }
+
+
+# -------------------------------------------------------------------
+# Сборка индекса
+# -------------------------------------------------------------------
+def _local_names(path: str, geonameids: set[int], language: str) -> dict[int, str]:
+    """Названия на языке language из alternateNamesV2.txt (предпочтительные — первыми)."""
+    names: dict[int, tuple[bool, str]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            row = line.rstrip("\n").split("\t")
+            if len(row) < 5 or row[2] != language:
+                continue
+            geonameid = int(row[1])
+            if geonameid not in geonameids:
+                continue
+            preferred = row[4] == "1"
+            if geonameid not in names or (preferred and not names[geonameid][0]):
+                names[geonameid] = (preferred, row[3])
+    return {geonameid: name for geonameid, (_, name) in names.items()}
+
+
+def build_index(
+    cities_path: str,
+    output_path: str,
+    alternate_names_path: str | None = None,
+    language: str = "ru",
+    min_population: int = 0,
+) -> int:
+    """
+    Собрать индекс из файла городов GeoNames; возвращает число городов.
+
+    Без alternate_names_path русским названием считается
+    первое кириллическое из альтернативных названий города.
+    """
+    rows = []
+    with open(cities_path, encoding="utf-8") as f:
+        for line in f:
+            row = line.rstrip("\n").split("\t")
+            if len(row) < 15:
+                continue
+            population = int(row[14] or 0)
+            if population < min_population:
+                continue
+            rows.append(row)
+
+    local = {}
+    if alternate_names_path:
+        local = _local_names(alternate_names_path, {int(row[0]) for row in rows}, language)
+
+    strings = bytearray()
+    string_offsets: dict[bytes, int] = {}
+
+    def add_string(value: str) -> tuple[int, int]:
+        data = value.encode()[:0xFFFF]
+        if data not in string_offsets:
+            string_offsets[data] = len(strings)
+            strings.extend(data)
+        return string_offsets[data], len(data)
+
+    cities = bytearray()
+    keys: list[tuple[bytes, int, int]] = []  # ключ, -население, номер города
+    for number, row in enumerate(rows):
+        geonameid, name, ascii_name, alternate = int(row[0]), row[1], row[2], row[3]
+        alternates = [item for item in alternate.split(",") if item]
+        local_name = local.get(geonameid) or next(
+            (item for item in alternates if _CYRILLIC_RE.search(item)), ""
+        )
+        population = int(row[14] or 0)
+        cities.extend(_CITY.pack(
+            geonameid, float(row[4]), float(row[5]), population,
+            row[8].encode()[:2].ljust(2), *add_string(name), *add_string(local_name),
+        ))
+        city_keys = {search_key(item) for item in (name, ascii_name, local_name, *alternates)}
+        for key in city_keys:
+            if len(key) >= 2:
+                keys.append((key.encode(), -population, number))
+
+    keys.sort()
+    key_table = bytearray()
+    for key, _, number in keys:
+        key_table.extend(_KEY.pack(*add_string(key.decode()), number))
+
+    with open(output_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(rows), len(keys)))
+        f.write(cities)
+        f.write(key_table)
+        f.write(strings)
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сборка индекса городов из выгрузки GeoNames")
+    parser.add_argument("cities", help="файл городов GeoNames (например, cities15000.txt)")
+    parser.add_argument("output", help="путь к файлу индекса")
+    parser.add_argument("--alternate-names", help="alternateNamesV2.txt для русских названий")
+    parser.add_argument("--language", default="ru", help="язык названий для ответов")
+    parser.add_argument("--min-population", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    count = build_index(
+        args.cities, args.output, args.alternate_names, args.language, args.min_population
+    )
+    print(f"Индекс {args.output}: {count} городов")
+
+
+if __name__ == "__main__":
+    main()
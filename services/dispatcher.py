@@ -0,0 +1,156 @@
+"""
+Распределение обновлений Telegram по пулу рабочих потоков.
+
+Обновления одного чата всегда попадают к одному и тому же потоку
+(по chat.id), поэтому обрабатываются строго по порядку, а разные чаты —
+параллельно.
+"""
+
+import queue
+import threading
+from typing import Any, Callable
+
+import telebot
+
+_STOP = object()
+
+
+def update_chat_id(update) -> int:
+    """Чат, к которому относится обновление (для выбора рабочего потока)."""
+    for attr in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        message = getattr(update, attr, None)
+        if message is not None:
+            return message.chat.id
+
+    callback_query = getattr(update, "callback_query", None)
+    if callback_query is not None and callback_query.message is not None:
+        return callback_query.message.chat.id
+
+    for attr in ("inline_query", "chosen_inline_result", "callback_query"):
+        event = getattr(update, attr, None)
+        if event is not None:
+            return event.from_user.id
+
+    return update.update_id
+
+
+class ChatDispatcher:
+    """Фиксированный пул потоков с отдельной ограниченной очередью у каждого."""
+
+    def __init__(
+        self,
+        handler: Callable[[Any], None],
+        num_workers: int = 8,
+        queue_size: int = 100,
+    ):
+        self._handler = handler
+        self.num_workers = num_workers
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(num_workers)]
+        self._threads: list[threading.Thread] = []
+
+        self._lock = threading.Lock()
+        self.dispatched = [0] * num_workers
+        self.processed = [0] * num_workers
+        self.shed = [0] * num_workers
+        self.errors = [0] * num_workers
+
+    def start(self):
+        """Запустить рабочие потоки."""
+        if self._threads:
+            return
+        for index in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._run, args=(index,), name=f"dispatch-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10):
+        """Дождаться обработки поставленных в очередь обновлений и остановить потоки."""
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, chat_id: int, item: Any) -> bool:
+        """
+        Поставить элемент в очередь потока, отвечающего за чат.
+
+        Если очередь потока заполнена, элемент отбрасывается (False).
+        """
+        index = hash(chat_id) % self.num_workers
+        try:
+            self._queues[index].put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.shed[index] += 1
+            print(f"Очередь обработчика {index} переполнена, обновление чата {chat_id} отброшено")
+            return False
+        with self._lock:
+            self.dispatched[index] += 1
+        return True
+
+    def stats(self) -> dict:
+        """Глубина очередей и счетчики по рабочим потокам."""
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "queue_depth": [q.qsize() for q in self._queues],
+                "dispatched": list(self.dispatched),
+                "processed": list(self.processed),
+                "shed": list(self.shed),
+                "errors": list(self.errors),
+            }
+
+    def _run(self, index: int):
+        """Цикл рабочего потока: обрабатывать элементы своей очереди по порядку."""
+        q = self._queues[index]
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            try:
+                self._handler(item)
+            except Exception as e:
+                with self._lock:
+                    self.errors[index] += 1
+                print(f"Ошибка при обработке обновления: {e}")
+            with self._lock:
+                self.processed[index] += 1
+
+
+class DispatchingTeleBot(telebot.TeleBot):
+    """
+    TeleBot, который передает обновления в ChatDispatcher вместо
+    собственного пула потоков.
+    """
+
+    def __init__(self, token: str, num_workers: int = 8, queue_size: int = 100, **kwargs):
+        kwargs["threaded"] = False
+        super().__init__(token, **kwargs)
+        self.dispatcher = ChatDispatcher(
+            self._process_update, num_workers=num_workers, queue_size=queue_size
+        )
+        # Отсев повторно полученных обновлений (например, UpdateDeduplicator)
+        self.dedup = None
+
+    def process_new_updates(self, updates):
+        """Распределить обновления по рабочим потокам по chat.id."""
+        for update in updates:
+            # Смещение сдвигается и для повторов: иначе новый лидер, получивший
+            # уже принятые другим узлом обновления, запрашивал бы их бесконечно
+            self.last_update_id = max(self.last_update_id, update.update_id)
+            if self.dedup is not None and not self.dedup.add(update.update_id):
+                continue
+            self.submit_update(update)
+
+    def submit_update(self, update) -> bool:
+        """Поставить одно обновление в очередь; False, если оно отброшено."""
+        if update.update_id > self.last_update_id:
+            self.last_update_id = update.update_id
+        return self.dispatcher.submit(update_chat_id(update), update)
+
+    def _process_update(self, update):
+        """Обработать одно обновление зарегистрированными обработчиками."""
+        super().process_new_updates([update])
@@ -0,0 +1,98 @@
+"""
+Прогрев кэша событий для самых популярных городов.
+
+Популярность определяется по логам команды /events за последние часы
+(без городов, которых нет в справочнике); записи этих городов обновляются в фоне до истечения срока жизни,
+поэтому большинство ответов на /events не обращается к TimePad.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from database.models import Log
+from database.stats import parse_command
+from services.cache import StaleWhileRevalidateCache
+
+# Пометка в логе команды с городом, которого нет в справочнике
+UNKNOWN_CITY_MARK = "(город не найден)"
+
+
+class EventsPrefetcher:
+    """Фоновое обновление кэша событий для популярных городов."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        cache: StaleWhileRevalidateCache,
+        top: int = 20,
+        window_hours: int = 24,
+        is_known_city: Callable[[str], bool] | None = None,
+    ):
+        self._session_factory = session_factory
+        # Проверка по справочнику городов (без нее учитываются все города)
+        self._is_known_city = is_known_city
+        self.cache = cache
+        self.top = top
+        self.window_hours = window_hours
+        self.interval = cache.ttl / 2
+
+        self.runs = 0
+        self.prefetched = 0
+
+    def schedule(self, scheduler, interval: int):
+        """Добавить периодический прогрев в планировщик."""
+        self.interval = interval
+        scheduler.add_job(
+            self.run, "interval", seconds=interval,
+            id="events_prefetch", replace_existing=True,
+        )
+
+    def popular_cities(self, now: datetime | None = None) -> list[str]:
+        """Самые запрашиваемые в /events города за последние window_hours часов."""
+        since = (now or datetime.utcnow()) - timedelta(hours=self.window_hours)
+        db = self._session_factory()
+        try:
+            rows = db.execute(
+                select(Log.command, func.count().label("count"))
+                .where(
+                    Log.timestamp >= since,
+                    or_(Log.command == "/events", Log.command.like("/events %")),
+                    Log.command.not_like(f"%{UNKNOWN_CITY_MARK}"),
+                )
+                .group_by(Log.command)
+            ).all()
+        finally:
+            db.close()
+
+        counts: Counter = Counter()
+        names: dict[str, str] = {}
+        # Для города берется самое частое написание
+        for command, count in sorted(rows, key=lambda row: -row.count):
+            _, city = parse_command(command)
+            if city:
+                counts[city] += count
+                names.setdefault(city, command.split(maxsplit=1)[1])
+        popular = []
+        for city, _ in counts.most_common():
+            if len(popular) == self.top:
+                break
+            if self._is_known_city is None or self._is_known_city(names[city]):
+                popular.append(names[city])
+        return popular
+
+    def run(self):
+        """
+        Обновить записи, которые отсутствуют или истекут до следующего запуска.
+
+        Города обновляются по очереди, чтобы не создавать всплеск запросов к TimePad.
+        """
+        self.runs += 1
+        for city in [None, *self.popular_cities()]:
+            expires_in = self.cache.expires_in(city)
+            if expires_in is None or expires_in < self.interval:
+                if self.cache.refresh(city, background=False):
+                    self.prefetched += 1
@@ -0,0 +1,187 @@
+"""
+Общий HTTP-клиент для внешних API (OpenWeatherMap, NewsAPI, TimePad).
+
+У каждого API свой пул keep-alive соединений, таймауты на подключение
+и чтение, ограниченные повторы с экспоненциальной задержкой при 5xx и 429
+(с учетом Retry-After) и предохранитель, который при недоступности API
+сразу отклоняет запросы, не дожидаясь таймаутов.
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from services.metrics import DEPENDENCY_ERRORS, observe_dependency
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """Запрос отклонен: внешний API считается недоступным."""
+
+
+class CircuitBreaker:
+    """
+    Предохранитель: после failure_threshold ошибок подряд размыкается
+    на reset_timeout секунд, затем пропускает один пробный запрос.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        """closed, open или half-open."""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def allow(self) -> bool:
+        """Можно ли выполнить запрос сейчас."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        """Учесть успешный запрос: предохранитель замыкается."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        """Учесть ошибку; при достижении порога предохранитель размыкается."""
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    self.opened += 1
+                    print(f"Внешний API {self.name} недоступен, запросы приостановлены")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release_probe(self):
+        """
+        Освободить пробный запрос, не учитывая его исход (например, отмененный):
+        следующий запрос снова станет пробным.
+        """
+        with self._lock:
+            self._probing = False
+
+    def check(self):
+        """Выбросить CircuitOpenError, если запрос выполнять нельзя."""
+        if not self.allow():
+            raise CircuitOpenError(f"Внешний API {self.name} временно недоступен")
+
+
+class _CappedRetry(Retry):
+    """Повторы, которые не ждут дольше MAX_RETRY_AFTER секунд по Retry-After."""
+
+    MAX_RETRY_AFTER = 10.0
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.MAX_RETRY_AFTER)
+        return None
+
+
+class UpstreamClient:
+    """HTTP-клиент одного внешнего API."""
+
+    def __init__(
+        self,
+        name: str,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10,
+        retries: int = 2,
+        backoff_factor: float = 0.5,
+        pool_size: int = 20,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+    ):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+
+        retry = _CappedRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            backoff_max=backoff_factor * 2 ** retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.requests = 0
+        self.failures = 0
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET-запрос с таймаутами, повторами и предохранителем.
+
+        Ответы 5xx и 429 (после всех повторов) и сетевые ошибки
+        считаются отказами API.
+        """
+        try:
+            self.breaker.check()
+        except CircuitOpenError as e:
+            DEPENDENCY_ERRORS.inc(dependency=self.name, error=type(e).__name__)
+            raise
+        kwargs.setdefault("timeout", self.timeout)
+        self.requests += 1
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, **kwargs)
+        except requests.RequestException as e:
+            observe_dependency(self.name, time.perf_counter() - started, e)
+            self.failures += 1
+            self.breaker.record_failure()
+            raise
+
+        observe_dependency(self.name, time.perf_counter() - started)
+        if response.status_code in RETRY_STATUSES:
+            DEPENDENCY_ERRORS.inc(dependency=self.name, error=f"HTTP {response.status_code}")
+            self.failures += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def stats(self) -> dict:
+        """Счетчики запросов и состояние предохранителя."""
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "circuit": self.breaker.state,
+            "rejected": self.breaker.rejected,
+        }
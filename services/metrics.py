@@ -0,0 +1,344 @@
+"""
+Метрики бота в формате Prometheus.
+
+Гистограммы времени обработчиков и зависимостей (БД, внешние API,
+отправка в Telegram), счетчики результатов по командам и классам ошибок,
+а также текущие значения очередей и кэшей. Запись метрики — это несколько
+арифметических операций под блокировкой, поэтому метрики можно держать
+включенными постоянно.
+"""
+
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Команда, которую обрабатывает текущий поток или задача asyncio
+current_command: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_command", default="background"
+)
+# Была ли в текущем обработчике ошибка, перехваченная им самим
+_handler_error: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "handler_error", default=None
+)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{str(value).replace(chr(34), chr(39))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счетчик с метками."""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(labels.get(name, "") for name in self.labels)
+        return self._values.get(key, 0)
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # метки → [счетчики корзин..., +Inf], сумма
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Замерить время выполнения блока."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        key = tuple(labels.get(name, "") for name in self.labels)
+        entry = self._values.get(key)
+        return sum(entry[0]) if entry else 0
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(counts), total[0]) for key, (counts, total) in self._values.items())
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(float(bound))
+                labels = _format_labels(self.labels, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Набор метрик и функций, возвращающих текущие значения (gauge)."""
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._gauges: dict[str, tuple[str, Callable[[], float | dict[str, float]], str]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), **kwargs) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help, labels, **kwargs))
+
+    def gauge(self, name: str, help: str, func: Callable[[], float | dict[str, float]], label: str = ""):
+        """
+        Значение, вычисляемое при каждом чтении метрик.
+
+        func возвращает число или словарь «значение метки label → число».
+        """
+        with self._lock:
+            self._gauges[name] = (help, func, label)
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            gauges = list(self._gauges.items())
+
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        for name, (help, func, label) in gauges:
+            try:
+                value = func()
+            except Exception as e:
+                print(f"Ошибка при чтении метрики {name}: {e}")
+                continue
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge"])
+            if isinstance(value, dict):
+                for key, item in sorted(value.items()):
+                    lines.append(f"{name}{_format_labels((label,), (key,))} {_format_value(item)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HANDLER_SECONDS = registry.histogram(
+    "bot_handler_seconds", "Время обработки команды", ("command",)
+)
+HANDLER_RESULTS = registry.counter(
+    "bot_handler_results_total", "Результаты обработки команд", ("command", "outcome")
+)
+ERRORS = registry.counter(
+    "bot_errors_total", "Ошибки по командам и классам исключений", ("command", "error")
+)
+DEPENDENCY_SECONDS = registry.histogram(
+    "bot_dependency_seconds",
+    "Время обращений к зависимостям (БД, внешние API, Telegram)",
+    ("dependency", "command"),
+)
+DEPENDENCY_ERRORS = registry.counter(
+    "bot_dependency_errors_total", "Ошибки обращений к зависимостям", ("dependency", "error")
+)
+
+
+def observe_dependency(
+    dependency: str, seconds: float, error: BaseException | None = None, command: str | None = None
+):
+    """
+    Учесть обращение к зависимости в контексте текущей команды
+    (или команды command — для работы, отложенной в другой поток).
+    """
+    DEPENDENCY_SECONDS.observe(
+        seconds, dependency=dependency, command=command or current_command.get()
+    )
+    if error is not None:
+        DEPENDENCY_ERRORS.inc(dependency=dependency, error=type(error).__name__)
+
+
+def log_error(message: str, error: BaseException):
+    """Напечатать ошибку и учесть ее в метриках текущей команды."""
+    print(f"{message}: {error}")
+    ERRORS.inc(command=current_command.get(), error=type(error).__name__)
+    _handler_error.set(type(error).__name__)
+
+
+@contextmanager
+def handler_scope(command: str):
+    """Замерить обработку команды и учесть ее результат."""
+    command_token = current_command.set(command)
+    error_token = _handler_error.set(None)
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception as e:
+        outcome = type(e).__name__
+        ERRORS.inc(command=command, error=outcome)
+        raise
+    finally:
+        if outcome == "ok" and _handler_error.get():
+            outcome = "handled_error"
+        HANDLER_SECONDS.observe(time.perf_counter() - started, command=command)
+        HANDLER_RESULTS.inc(command=command, outcome=outcome)
+        _handler_error.reset(error_token)
+        current_command.reset(command_token)
+
+
+def instrument(command: str):
+    """
+    Декоратор обработчика: время выполнения и результат по команде.
+
+    Результат — ok, handled_error (ошибка перехвачена обработчиком
+    и передана в log_error) или имя класса неперехваченного исключения.
+    Работает и с обычными, и с async-обработчиками.
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with handler_scope(command):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with handler_scope(command):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# Движки, к которым уже подключены замеры (повторный вызов ничего не делает)
+_instrumented_engines = weakref.WeakSet()
+_instrumented_lock = threading.Lock()
+
+
+def instrument_engine(engine, dependency: str = "db"):
+    """
+    Замерять время SQL-запросов движка SQLAlchemy (в т.ч. AsyncEngine.sync_engine).
+
+    Повторный вызов для того же движка (например, второй create_app()
+    в одном процессе) не добавляет обработчиков, и запросы не учитываются дважды.
+    """
+    from sqlalchemy import event
+
+    with _instrumented_lock:
+        if engine in _instrumented_engines:
+            return
+        _instrumented_engines.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        observe_dependency(dependency, time.perf_counter() - conn.info["query_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection else None
+        if started:
+            observe_dependency(dependency, time.perf_counter() - started.pop(), context.original_exception)
+
+
+class MetricsServer:
+    """HTTP-сервер, отдающий метрики по GET /metrics."""
+
+    def __init__(self, registry: Registry = registry, host: str = "0.0.0.0", port: int = 9100):
+        metrics_registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = metrics_registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self) -> threading.Thread:
+        """Запустить сервер в фоновом потоке."""
+        thread = threading.Thread(target=self.httpd.serve_forever, name="metrics", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,160 @@
+"""
+Общий снимок новостей, который периодически обновляется в фоне.
+
+Обработчик /news отвечает готовым текстом из памяти, поэтому число
+запросов к NewsAPI не зависит от числа пользователей.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from services.render import render_news
+
+NEWS_API_URL = "https://newsapi.org/v2/top-headlines"
+
+
+class NewsSnapshot:
+    """Последние заголовки NewsAPI и готовый текст сообщения."""
+
+    def __init__(
+        self,
+        api_key: str,
+        country: str = "us",
+        limit: int = 5,
+        timeout=10,
+        http=None,
+        url: str = NEWS_API_URL,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self.country = country
+        self.limit = limit
+        self.timeout = timeout
+        # Клиент с методом get как у requests (например, UpstreamClient)
+        self.http = http or requests
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.articles: list[dict] = []
+        self.text: str | None = None
+        self.updated_at: float | None = None
+        self._etag: str | None = None
+        self._last_modified: str | None = None
+        self._last_attempt = 0.0
+
+        self.fetches = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def refresh(self) -> bool:
+        """
+        Обновить снимок.
+
+        Использует ETag/If-Modified-Since, если NewsAPI их отдает.
+        При ошибке сохраняется последний удачный снимок.
+        Возвращает True, если снимок актуален.
+        """
+        with self._refresh_lock:
+            return self._fetch()
+
+    def get_text(self) -> str | None:
+        """
+        Текст сообщения с новостями или None, если новостей нет.
+
+        До первого удачного обновления выполняет загрузку сама
+        (одну на все одновременные запросы и не чаще раза в 30 секунд).
+        """
+        if self.text is None and time.monotonic() - self._last_attempt > 30:
+            with self._refresh_lock:
+                if self.text is None and time.monotonic() - self._last_attempt > 30:
+                    self._fetch()
+        return self.text
+
+    def schedule(self, scheduler, interval: int):
+        """Добавить периодическое обновление в планировщик, первое — сразу."""
+        scheduler.add_job(
+            self.refresh,
+            "interval",
+            seconds=interval,
+            id="news_snapshot",
+            replace_existing=True,
+            next_run_time=datetime.now(scheduler.timezone),
+        )
+
+    def stats(self) -> dict:
+        """Счетчики обновлений и возраст снимка в секундах."""
+        return {
+            "fetches": self.fetches,
+            "not_modified": self.not_modified,
+            "errors": self.errors,
+            "age": time.time() - self.updated_at if self.updated_at else None,
+        }
+
+    def request_params(self) -> dict:
+        """Параметры запроса к NewsAPI."""
+        return {"country": self.country, "apiKey": self.api_key}
+
+    def request_headers(self) -> dict:
+        """Заголовки условного запроса по сохраненным ETag/Last-Modified."""
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+        return headers
+
+    def apply_response(self, status: int, headers, data: dict | None) -> bool:
+        """
+        Применить ответ NewsAPI, полученный любым HTTP-клиентом.
+
+        Возвращает True, если снимок актуален.
+        """
+        if status == 304:
+            self.not_modified += 1
+            self.updated_at = time.time()
+            return True
+
+        if status != 200 or not data or data.get("status") != "ok":
+            self.errors += 1
+            message = data.get("message", "") if data else ""
+            print(f"Ошибка при обновлении новостей: {status} {message}")
+            return self.text is not None
+
+        articles = data.get("articles", [])[: self.limit]
+        if not articles:
+            return self.text is not None
+
+        text = render_news(articles)
+        with self._lock:
+            self.articles = articles
+            self.text = text
+            self.updated_at = time.time()
+            self._etag = headers.get("ETag")
+            self._last_modified = headers.get("Last-Modified")
+        return True
+
+    def apply_error(self, error: Exception) -> bool:
+        """Учесть сетевую ошибку; последний удачный снимок сохраняется."""
+        self.errors += 1
+        print(f"Ошибка при обновлении новостей: {error}")
+        return self.text is not None
+
+    def _fetch(self) -> bool:
+        """Запрос к NewsAPI (вызывается под _refresh_lock)."""
+        self.fetches += 1
+        self._last_attempt = time.monotonic()
+        try:
+            response = self.http.get(
+                self.url,
+                params=self.request_params(),
+                headers=self.request_headers(),
+                timeout=self.timeout,
+            )
+            data = response.json() if response.status_code != 304 else None
+        except Exception as e:
+            return self.apply_error(e)
+
+        return self.apply_response(response.status_code, response.headers, data)
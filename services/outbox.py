@@ -0,0 +1,214 @@
+"""
+Очередь исходящих сообщений Telegram.
+
+Обработчики ставят сообщения в очередь и сразу возвращаются, а фоновые
+потоки отправляют их с учетом общего и поканального лимита Telegram.
+Несколько ожидающих сообщений одному чату объединяются в одно (не длиннее
+4096 символов), ответы 429 повторяются после указанной сервером паузы.
+Сообщения одного чата отправляются строго по порядку.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Hashable
+
+from services.metrics import current_command, observe_dependency
+from services.ratelimit import SendRateLimiter
+from services.render import MAX_MESSAGE_LENGTH, split_message
+
+_STOP = object()
+
+
+def retry_after(error: Exception) -> float | None:
+    """Пауза из ответа 429 Telegram (None, если это другая ошибка)."""
+    if getattr(error, "error_code", None) != 429:
+        return None
+    result_json = getattr(error, "result_json", None) or {}
+    return float(result_json.get("parameters", {}).get("retry_after", 1))
+
+
+class Outbox:
+    """Фоновая отправка сообщений с ограничением частоты и объединением."""
+
+    def __init__(
+        self,
+        send: Callable[..., object],
+        rate_limiter: SendRateLimiter | None = None,
+        num_workers: int = 4,
+        max_queue: int = 10000,
+        max_retries: int = 3,
+        separator: str = "\n\n",
+    ):
+        self._send = send
+        self.rate_limiter = rate_limiter or SendRateLimiter()
+        self.num_workers = num_workers
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.separator = separator
+
+        # chat_id → [(текст, параметры send_message, время постановки, команда)]
+        self._pending: dict[Hashable, list[tuple[str, dict, float, str]]] = {}
+        # Чаты, которые стоят в _ready или сейчас отправляются
+        self._scheduled: set[Hashable] = set()
+        self._ready: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._backlog = 0
+        self._threads: list[threading.Thread] = []
+
+        self.enqueued = 0
+        self.sent = 0
+        self.messages_sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_latency_seconds = 0.0
+        self.total_latency_seconds = 0.0
+        self.total_send_seconds = 0.0
+
+    def start(self):
+        """Запустить потоки отправки."""
+        if self._threads:
+            return
+        for index in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._run, name=f"outbox-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10):
+        """Отправить накопленные сообщения и остановить потоки."""
+        deadline = time.monotonic() + timeout
+        while self._threads and self._scheduled and time.monotonic() < deadline:
+            time.sleep(0.05)
+        for _ in self._threads:
+            self._ready.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def send(self, chat_id: Hashable, text: str, put_timeout: float | None = 0, **kwargs) -> bool:
+        """
+        Поставить сообщение в очередь (параметры как у bot.send_message).
+
+        Если очередь заполнена, ждет не дольше put_timeout секунд
+        (None — без ограничения), после чего сообщение отбрасывается.
+        Текст длиннее MAX_MESSAGE_LENGTH отправляется несколькими сообщениями.
+        Возвращает False, если сообщение отброшено.
+        """
+        chunks = split_message(text)
+        # Отправка идет в другом потоке: команду для метрик запоминаем здесь
+        command = current_command.get()
+        with self._not_full:
+            if not self._not_full.wait_for(lambda: self._backlog < self.max_queue, put_timeout):
+                self.dropped += 1
+                print(f"Очередь отправки переполнена, сообщение в чат {chat_id} отброшено")
+                return False
+            queued_at = time.monotonic()
+            self._pending.setdefault(chat_id, []).extend(
+                (chunk, kwargs, queued_at, command) for chunk in chunks
+            )
+            self._backlog += len(chunks)
+            self.enqueued += len(chunks)
+            if chat_id not in self._scheduled:
+                self._scheduled.add(chat_id)
+                self._ready.put(chat_id)
+        return True
+
+    def stats(self) -> dict:
+        """Размер очереди, счетчики и задержки доставки."""
+        with self._lock:
+            return {
+                "backlog": self._backlog,
+                "chats": len(self._pending),
+                "enqueued": self.enqueued,
+                "sent": self.sent,
+                "messages_sent": self.messages_sent,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "max_latency_seconds": self.max_latency_seconds,
+                "avg_latency_seconds": (
+                    self.total_latency_seconds / self.messages_sent if self.messages_sent else 0.0
+                ),
+                "avg_send_seconds": self.total_send_seconds / self.sent if self.sent else 0.0,
+            }
+
+    def coalesce(
+        self, messages: list[tuple[str, dict, float, str]]
+    ) -> list[tuple[str, dict, list[float], str]]:
+        """
+        Объединить подряд идущие сообщения с одинаковыми параметрами,
+        пока общий текст укладывается в MAX_MESSAGE_LENGTH.
+
+        Время отправки объединенного сообщения учитывается за командой первого.
+        """
+        batches: list[tuple[str, dict, list[float], str]] = []
+        for text, kwargs, enqueued_at, command in messages:
+            if batches:
+                last_text, last_kwargs, times, first_command = batches[-1]
+                merged = last_text + self.separator + text
+                if last_kwargs == kwargs and len(merged) <= MAX_MESSAGE_LENGTH:
+                    batches[-1] = (merged, kwargs, times + [enqueued_at], first_command)
+                    continue
+            batches.append((text, kwargs, [enqueued_at], command))
+        return batches
+
+    def _run(self):
+        """Цикл потока: забирать чат из очереди и отправлять все его сообщения."""
+        while True:
+            chat_id = self._ready.get()
+            if chat_id is _STOP:
+                return
+
+            with self._not_full:
+                messages = self._pending.pop(chat_id, [])
+                self._backlog -= len(messages)
+                self._not_full.notify_all()
+
+            for text, kwargs, times, command in self.coalesce(messages):
+                self._deliver(chat_id, text, kwargs, times, command)
+
+            # Пока чат отправлялся, в него могли поставить новые сообщения
+            with self._lock:
+                if chat_id in self._pending:
+                    self._ready.put(chat_id)
+                else:
+                    self._scheduled.discard(chat_id)
+
+    def _deliver(self, chat_id: Hashable, text: str, kwargs: dict, times: list[float], command: str):
+        """Отправить одно (возможно, объединенное) сообщение с повторами при 429."""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait(chat_id)
+            started = time.monotonic()
+            try:
+                self._send(chat_id, text, **kwargs)
+            except Exception as e:
+                observe_dependency("telegram", time.monotonic() - started, e, command=command)
+                delay = retry_after(e)
+                if delay is None or attempt == self.max_retries:
+                    with self._lock:
+                        self.failed += len(times)
+                    print(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
+                    return
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                continue
+
+            finished = time.monotonic()
+            observe_dependency("telegram", finished - started, command=command)
+            with self._lock:
+                self.sent += 1
+                self.messages_sent += len(times)
+                self.coalesced += len(times) - 1
+                self.total_send_seconds += finished - started
+                for enqueued_at in times:
+                    latency = finished - enqueued_at
+                    self.total_latency_seconds += latency
+                    self.max_latency_seconds = max(self.max_latency_seconds, latency)
+            return
@@ -0,0 +1,111 @@
+"""
+Ограничение частоты операций по алгоритму «ведро токенов».
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TokenBucket:
+    """Потокобезопасное ведро токенов: rate токенов в секунду, не больше capacity."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Списать токены (баланс может уйти в минус).
+
+        Возвращает, сколько секунд нужно подождать, прежде чем действовать.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Списать токены, только если их хватает прямо сейчас."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def wait(self, tokens: float = 1):
+        """Дождаться токенов и списать их."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _refill(self):
+        """Начислить токены за прошедшее время (вызывается под блокировкой)."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class SendRateLimiter:
+    """
+    Ограничения Telegram на отправку: общее (около 30 сообщений в секунду)
+    и для каждого чата (около 1 сообщения в секунду).
+    """
+
+    def __init__(self, global_rate: float = 30, per_chat_rate: float = 1, max_chats: int = 10000):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.max_chats = max_chats
+        self._chats: OrderedDict[Hashable, TokenBucket] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+        """Ведро токенов чата (давно не использованные вытесняются)."""
+        with self._lock:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, 1)
+                while len(self._chats) > self.max_chats:
+                    self._chats.popitem(last=False)
+            else:
+                self._chats.move_to_end(chat_id)
+            return bucket
+
+    def wait(self, chat_id: Hashable):
+        """Дождаться, пока отправка в чат уложится в оба ограничения."""
+        self.chat_bucket(chat_id).wait()
+        self.global_bucket.wait()
+
+
+class SharedSendRateLimiter:
+    """
+    Те же ограничения Telegram, общие для нескольких процессов.
+
+    Отправки считаются в общем хранилище (services/state.py) по окнам
+    фиксированной длины: не больше rate * окно отправок за окно.
+    """
+
+    def __init__(self, backend, global_rate: float = 30, per_chat_rate: float = 1):
+        self.backend = backend
+        self.global_rate = global_rate
+        self.per_chat_rate = per_chat_rate
+
+    def wait(self, chat_id: Hashable):
+        """Дождаться, пока отправка в чат уложится в оба ограничения."""
+        self._wait_window(f"rate:chat:{chat_id}", self.per_chat_rate)
+        self._wait_window("rate:global", self.global_rate)
+
+    def _wait_window(self, name: str, rate: float):
+        period = max(1.0, 1 / rate)
+        limit = max(1, int(rate * period))
+        while True:
+            now = time.time()
+            window = int(now // period)
+            if self.backend.incr(f"{name}:{window}", 1, ttl=period * 2) <= limit:
+                return
+            time.sleep((window + 1) * period - now)
@@ -0,0 +1,133 @@
+"""
+Формирование текстов ответов бота.
+
+Используется и синхронным, и асинхронным режимом работы.
+Шаблоны сообщений задаются один раз при импорте, даты форматируются
+без strftime и locale, поэтому результат не зависит от настроек хоста
+и безопасен при работе из нескольких потоков.
+"""
+
+import html
+import re
+from functools import lru_cache
+
+# Максимальная длина текста сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+START_TEXT = (
+    "Привет, {name}! Я твой информационный помощник. \n\n"
+    "Набери /help, чтобы узнать, что я умею."
+)
+
+HELP_TEXT = (
+    "Доступные команды:\n"
+    "/start - запустить бота\n"
+    "/help - показать это меню\n"
+    "/weather - узнать погоду\n"
+    "/news - свежие новости\n"
+    "/events - события рядом"
+)
+
+WEATHER_TEMPLATE = (
+    "Погода в городе {city}:\n"
+    "{description}\n"
+    "Температура: {temp}°C\n"
+    "Влажность: {humidity}%\n"
+    "Ветер: {wind} м/с"
+).format
+ARTICLE_TEMPLATE = "{title}\n{url}".format
+EVENT_TEMPLATE = "{name}{location}\nДата: {date}\n{url}".format
+LOCATION_TEMPLATE = " ({city}, {address})".format
+
+# Дата и время в начале ISO-строки: 2024-05-01T19:00, 2024-05-01 19:00 или 2024-05-01
+_ISO_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2}))?")
+
+
+@lru_cache(maxsize=4096)
+def format_datetime(dt_str):
+    """
+    Преобразовать ISO-дату в читаемый формат dd.mm.yyyy, HH:MM.
+
+    Время выводится как в строке (в часовом поясе события).
+    Нераспознанная строка возвращается без изменений.
+    """
+    match = _ISO_RE.match(dt_str) if isinstance(dt_str, str) else None
+    if match is None:
+        return dt_str
+    year, month, day, hour, minute = match.groups(default="00")
+    return f"{day}.{month}.{year}, {hour}:{minute}"
+
+
+def _unescape(text: str) -> str:
+    """html.unescape только для строк с HTML-сущностями."""
+    return html.unescape(text) if "&" in text else text
+
+
+def render_weather(city: str, data: dict) -> str:
+    """Ответ OpenWeatherMap в текст сообщения о погоде."""
+    main = data["main"]
+    return WEATHER_TEMPLATE(
+        city=city,
+        description=data["weather"][0]["description"].capitalize(),
+        temp=round(main["temp"]),
+        humidity=main["humidity"],
+        wind=round(data["wind"]["speed"]),
+    )
+
+
+def render_news(articles: list[dict]) -> str:
+    """Список статей NewsAPI в текст сообщения: заголовок и ссылка."""
+    return "\n\n".join(
+        ARTICLE_TEMPLATE(
+            title=article.get("title", "Без заголовка"), url=article.get("url", "")
+        )
+        for article in articles
+    )
+
+
+def _render_event(ev: dict) -> str:
+    starts_at = ev.get("starts_at", "Дата неизвестна")
+    loc = ev.get("location", {})
+    city_name, address = "", ""
+    if isinstance(loc, dict):
+        city_name = loc.get("city", "")
+        address = _unescape(loc.get("address", ""))
+    return EVENT_TEMPLATE(
+        name=_unescape(ev.get("name", "Без названия")),
+        location=LOCATION_TEMPLATE(city=city_name, address=address)
+        if city_name or address
+        else "",
+        date=format_datetime(starts_at),
+        url=ev.get("url", ""),
+    )
+
+
+def render_events(events: list[dict]) -> str:
+    """Список событий TimePad в текст сообщения: название, место, дата, ссылка."""
+    return "\n\n".join(map(_render_event, events))
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """
+    Разбить текст на части не длиннее limit символов.
+
+    Резать стараемся между абзацами, затем между строками
+    и только в крайнем случае — посреди строки.
+    """
+    if len(text) <= limit:
+        return [text]
+
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n\n", 0, limit + 1)
+        skip = 2
+        if cut <= 0:
+            cut = text.rfind("\n", 0, limit + 1)
+            skip = 1
+        if cut <= 0:
+            cut, skip = limit, 0
+        chunks.append(text[:cut])
+        text = text[cut + skip:]
+    if text:
+        chunks.append(text)
+    return chunks
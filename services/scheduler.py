@@ -0,0 +1,32 @@
+"""
+Общий планировщик фоновых задач (APScheduler).
+"""
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+scheduler = BackgroundScheduler(
+    timezone="UTC",
+    job_defaults={"coalesce": True, "max_instances": 1},
+)
+
+# Задачи, которые выполняет только один процесс из нескольких (лидер):
+# планировщик запускается приостановленным и возобновляется при получении аренды
+leader_scheduler = BackgroundScheduler(
+    timezone="UTC",
+    job_defaults={"coalesce": True, "max_instances": 1},
+)
+
+
+def start_scheduler():
+    """Запустить планировщики, если они еще не запущены (задачи лидера — на паузе)."""
+    if not scheduler.running:
+        scheduler.start()
+    if not leader_scheduler.running:
+        leader_scheduler.start(paused=True)
+
+
+def shutdown_scheduler():
+    """Остановить планировщики, не дожидаясь выполняющихся задач."""
+    for instance in (scheduler, leader_scheduler):
+        if instance.running:
+            instance.shutdown(wait=False)
@@ -0,0 +1,266 @@
+"""
+Общее состояние нескольких процессов бота.
+
+Кэши внешних API, принятые update_id, бюджеты частоты отправки
+и аренда лидера хранятся в хранилище ключ — значение с временем жизни.
+По умолчанию это память процесса (один процесс), для нескольких
+процессов или серверов — Redis или совместимый сервер:
+
+    STATE_BACKEND=redis://localhost:6379/0
+
+Для Redis нужен пакет redis (pip install redis).
+"""
+
+import os
+import socket
+import threading
+import time
+from typing import Callable
+
+# Атомарное продление и снятие аренды: только если ею владеет этот узел
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class MemoryBackend:
+    """Хранилище в памяти процесса (значения — строки, время жизни в секундах)."""
+
+    shared = False
+
+    def __init__(self):
+        self._values: dict[str, tuple[str, float | None]] = {}
+        self._lock = threading.Lock()
+        self._operations = 0
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key: str, value: str, ttl: float | None = None):
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def add(self, key: str, value: str, ttl: float | None = None) -> bool:
+        """Записать значение, только если ключа нет; False, если он уже есть."""
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._set(key, value, ttl)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        """Увеличить счетчик; ttl задает время жизни ключа от последнего изменения."""
+        with self._lock:
+            value = int(self._get(key) or 0) + amount
+            self._set(key, str(value), ttl)
+            return value
+
+    def renew(self, key: str, value: str, ttl: float) -> bool:
+        """Продлить ключ, если в нем записано value."""
+        with self._lock:
+            if self._get(key) != value:
+                return False
+            self._set(key, value, ttl)
+            return True
+
+    def release(self, key: str, value: str) -> bool:
+        """Удалить ключ, если в нем записано value."""
+        with self._lock:
+            if self._get(key) != value:
+                return False
+            del self._values[key]
+            return True
+
+    def _get(self, key: str) -> str | None:
+        """Значение ключа (вызывается под блокировкой)."""
+        item = self._values.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    def _set(self, key: str, value: str, ttl: float | None):
+        """Записать значение (вызывается под блокировкой)."""
+        self._values[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        # Время от времени удаляем истекшие ключи, чтобы память не росла
+        self._operations += 1
+        if self._operations % 10000 == 0:
+            now = time.monotonic()
+            for expired in [k for k, (_, at) in self._values.items() if at is not None and at <= now]:
+                del self._values[expired]
+
+
+class RedisBackend:
+    """Хранилище в Redis (или совместимом сервере) с тем же интерфейсом, что MemoryBackend."""
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "bot:", **kwargs):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("Для STATE_BACKEND=redis://... установите пакет redis") from e
+        self.url = url
+        self.prefix = prefix
+        # RESP2 понимают и Redis, и совместимые серверы
+        kwargs.setdefault("protocol", 2)
+        self.client = redis.Redis.from_url(url, decode_responses=True, **kwargs)
+
+    def get(self, key: str) -> str | None:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: float | None = None):
+        self.client.set(self.prefix + key, value, px=_milliseconds(ttl))
+
+    def add(self, key: str, value: str, ttl: float | None = None) -> bool:
+        return bool(self.client.set(self.prefix + key, value, px=_milliseconds(ttl), nx=True))
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        pipe = self.client.pipeline()
+        pipe.incrby(self.prefix + key, amount)
+        if ttl is not None:
+            pipe.pexpire(self.prefix + key, _milliseconds(ttl))
+        return int(pipe.execute()[0])
+
+    def renew(self, key: str, value: str, ttl: float) -> bool:
+        return bool(self.client.eval(_RENEW_SCRIPT, 1, self.prefix + key, value, _milliseconds(ttl)))
+
+    def release(self, key: str, value: str) -> bool:
+        return bool(self.client.eval(_RELEASE_SCRIPT, 1, self.prefix + key, value))
+
+
+def _milliseconds(ttl: float | None) -> int | None:
+    return max(1, int(ttl * 1000)) if ttl is not None else None
+
+
+def create_backend(url: str | None) -> MemoryBackend | RedisBackend:
+    """Хранилище по адресу: memory (по умолчанию) или redis://host:port/db."""
+    if not url or url == "memory":
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Неизвестное хранилище состояния: {url}")
+
+
+def default_node_id() -> str:
+    """Имя узла для аренды лидера: хост и PID."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaderLease:
+    """
+    Аренда лидера: задачи, которые должен выполнять один узел из нескольких.
+
+    Узел захватывает ключ на ttl секунд и продлевает его каждые ttl/3 секунд.
+    Если продлить не удалось (ключ истек или хранилище недоступно),
+    узел перестает быть лидером; ключ захватит другой узел.
+    """
+
+    def __init__(
+        self,
+        backend: MemoryBackend | RedisBackend,
+        name: str = "leader",
+        ttl: float = 30,
+        node_id: str | None = None,
+        on_acquire: Callable[[], None] | None = None,
+        on_release: Callable[[], None] | None = None,
+    ):
+        self.backend = backend
+        self.key = f"lease:{name}"
+        self.ttl = ttl
+        self.node_id = node_id or default_node_id()
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+
+        self._leader = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self.acquired = 0
+        self.lost = 0
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader.is_set()
+
+    def start(self):
+        """Попытаться стать лидером сразу и продолжать в фоновом потоке."""
+        self.tick()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="leader-lease", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановить продление и освободить аренду, чтобы ее сразу подхватил другой узел."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self.is_leader:
+            try:
+                self.backend.release(self.key, self.node_id)
+            except Exception as e:
+                print(f"Ошибка при освобождении аренды лидера: {e}")
+            self._set_leader(False)
+
+    def wait_leader(self, timeout: float | None = None) -> bool:
+        """Дождаться, пока узел станет лидером."""
+        return self._leader.wait(timeout)
+
+    def tick(self) -> bool:
+        """Продлить или захватить аренду; True, если узел — лидер."""
+        try:
+            if self.is_leader:
+                leader = self.backend.renew(self.key, self.node_id, self.ttl)
+            else:
+                leader = self.backend.add(self.key, self.node_id, self.ttl)
+        except Exception as e:
+            print(f"Ошибка при продлении аренды лидера: {e}")
+            leader = False
+        self._set_leader(leader)
+        return leader
+
+    def stats(self) -> dict:
+        return {"leader": self.is_leader, "acquired": self.acquired, "lost": self.lost}
+
+    def _run(self):
+        while not self._stop.wait(self.ttl / 3):
+            self.tick()
+
+    def _set_leader(self, leader: bool):
+        if leader == self.is_leader:
+            return
+        if leader:
+            self._leader.set()
+            self.acquired += 1
+            print(f"Узел {self.node_id} стал лидером")
+            callback = self.on_acquire
+        else:
+            self._leader.clear()
+            self.lost += 1
+            print(f"Узел {self.node_id} больше не лидер")
+            callback = self.on_release
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Ошибка при смене лидера: {e}")
@@ -0,0 +1,277 @@
+"""
+Рассылка уведомлений по подпискам пользователей.
+
+Подписки хранятся в таблице subscriptions с временем следующей отправки.
+Наступившие подписки группируются в корзины по (тип, город, частота):
+содержимое для каждой пары (тип, город) запрашивается один раз за запуск,
+а готовый текст рассылается всем подписчикам корзины.
+"""
+
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Callable, NamedTuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.orm import Session
+
+from database.crud import (
+    advance_subscriptions,
+    get_due_subscriptions,
+    replace_user_subscriptions,
+    update_user_subscription,
+)
+from services.cities import normalize_city
+from services.ratelimit import SendRateLimiter
+
+KINDS = ("weather", "news", "events")
+FREQUENCIES = ("hourly", "daily", "weekly")
+# Еженедельные подписки отправляются по понедельникам (datetime.weekday())
+WEEKLY_DAY = 0
+
+_TIME_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+class SubscriptionSpec(NamedTuple):
+    """Одна подписка: тип содержимого, город, частота и время отправки."""
+
+    kind: str
+    city: str | None
+    frequency: str
+    time: str
+
+
+def _make_subscription(kind, city=None, frequency="daily", time=None) -> SubscriptionSpec | None:
+    """Проверить поля подписки; None, если подписка некорректна."""
+    kind = (kind or "").strip().lower()
+    frequency = (frequency or "daily").strip().lower()
+    if kind not in KINDS or frequency not in FREQUENCIES:
+        return None
+    if kind == "weather" and not city:
+        return None
+    time = time or ("00:00" if frequency == "hourly" else "09:00")
+    if not _TIME_RE.match(time):
+        return None
+    hour, minute = time.split(":")
+    return SubscriptionSpec(kind, city.strip() if city else None, frequency, f"{int(hour):02d}:{minute}")
+
+
+def parse_subscription_settings(settings: str | None) -> list[SubscriptionSpec]:
+    """
+    Разобрать users.subscription_settings.
+
+    Поддерживаются JSON (объект или список объектов с полями
+    kind, city, frequency, time) и текст вида «events daily»,
+    «weather Москва daily 08:00» — по одной подписке на строку или через «;».
+    time — минуты часа для hourly и время дня для daily и weekly;
+    день недели не задается: weekly отправляется по понедельникам.
+    """
+    if not settings or not settings.strip():
+        return []
+
+    try:
+        data = json.loads(settings)
+    except ValueError:
+        data = None
+
+    subscriptions = []
+    if isinstance(data, (dict, list)):
+        items = [data] if isinstance(data, dict) else data
+        for item in items:
+            if isinstance(item, dict):
+                subscriptions.append(_make_subscription(
+                    item.get("kind") or item.get("type"),
+                    item.get("city"),
+                    item.get("frequency"),
+                    item.get("time"),
+                ))
+        return [s for s in subscriptions if s]
+
+    for line in re.split(r"[;\n]", settings):
+        words = line.split()
+        if not words:
+            continue
+        kind, rest = words[0], words[1:]
+        time = rest.pop() if rest and _TIME_RE.match(rest[-1]) else None
+        frequency = rest.pop() if rest and rest[-1].lower() in FREQUENCIES else None
+        city = " ".join(rest) or None
+        subscriptions.append(_make_subscription(kind, city, frequency, time))
+    return [s for s in subscriptions if s]
+
+
+def next_run_at(spec: SubscriptionSpec, after: datetime, tz: ZoneInfo) -> datetime:
+    """
+    Ближайшее время отправки строго позже after.
+
+    after и результат — наивное время UTC, spec.time задано в часовом поясе tz.
+    Для weekly — ближайший понедельник (WEEKLY_DAY) в spec.time,
+    независимо от дня, в который оформлена подписка.
+    """
+    after = after.replace(tzinfo=timezone.utc)
+    local = after.astimezone(tz)
+    hour, minute = map(int, spec.time.split(":"))
+
+    if spec.frequency == "hourly":
+        # Часы отсчитываются по UTC: при переводе часов назад
+        # повторяющийся час не пропускается
+        candidate = local.replace(minute=minute, second=0, microsecond=0).astimezone(timezone.utc)
+        while candidate <= after:
+            candidate += timedelta(hours=1)
+        return candidate.replace(tzinfo=None)
+
+    # Дни — по местному времени, чтобы время отправки не сдвигалось при переводе часов
+    candidate = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    step = timedelta(days=1)
+    if spec.frequency == "weekly":
+        candidate += timedelta(days=(WEEKLY_DAY - local.weekday()) % 7)
+        step = timedelta(days=7)
+
+    while candidate.astimezone(timezone.utc) <= after:
+        candidate += step
+    return candidate.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def subscription_rows(specs: list[SubscriptionSpec], now: datetime, tz: ZoneInfo) -> list[dict]:
+    """Строки таблицы subscriptions для разобранных подписок."""
+    return [
+        {
+            "kind": spec.kind,
+            "city": normalize_city(spec.city) if spec.city else None,
+            "city_name": spec.city,
+            "frequency": spec.frequency,
+            "send_time": spec.time,
+            "next_run_at": next_run_at(spec, now, tz),
+        }
+        for spec in specs
+    ]
+
+
+def set_user_subscriptions(
+    db: Session, user_id: int, settings: str | None, tz: ZoneInfo, now: datetime | None = None
+) -> list[SubscriptionSpec]:
+    """Сохранить настройки подписки пользователя в текстовом виде и в таблице."""
+    specs = parse_subscription_settings(settings)
+    update_user_subscription(db, user_id, settings)
+    replace_user_subscriptions(db, user_id, subscription_rows(specs, now or datetime.utcnow(), tz))
+    return specs
+
+
+class SubscriptionScheduler:
+    """Периодическая рассылка подписок с ограничением частоты отправки."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        renderers: dict[str, Callable[[str | None], str | None]],
+        send: Callable[[int, str], None],
+        rate_limiter: SendRateLimiter | None = None,
+        timezone: str = "Europe/Moscow",
+        prefetchers: dict[str, Callable[[list[str]], object]] | None = None,
+    ):
+        self._session_factory = session_factory
+        self._renderers = renderers
+        # Пакетная загрузка содержимого для всех городов рассылки перед отправкой
+        self._prefetchers = prefetchers or {}
+        self._send = send
+        # Без rate_limiter частоту отправки ограничивает сам send (например, Outbox)
+        self.rate_limiter = rate_limiter
+        self.timezone = ZoneInfo(timezone)
+
+        self.runs = 0
+        self.payloads = 0
+        self.sent = 0
+        self.errors = 0
+
+    def schedule(self, scheduler):
+        """Добавить ежеминутную рассылку в планировщик."""
+        scheduler.add_job(
+            self.run, "cron", second=0, id="subscriptions", replace_existing=True
+        )
+
+    def collect_buckets(self, now: datetime) -> tuple[dict, list[dict]]:
+        """
+        Наступившие подписки (now — наивное UTC).
+
+        Возвращает корзины: (тип, нормализованный город, частота) →
+        (название города, список chat_id), а также сдвиги next_run_at
+        для пакетного обновления.
+        """
+        buckets: dict[tuple, tuple[str | None, list[int]]] = {}
+        advances: list[dict] = []
+        db = self._session_factory()
+        try:
+            for row in get_due_subscriptions(db, now):
+                bucket = buckets.setdefault(
+                    (row.kind, row.city, row.frequency), (row.city_name, [])
+                )
+                bucket[1].append(row.telegram_id)
+                spec = SubscriptionSpec(row.kind, row.city_name, row.frequency, row.send_time)
+                advances.append({"id": row.id, "next_run_at": next_run_at(spec, now, self.timezone)})
+        finally:
+            db.close()
+        return buckets, advances
+
+    def run(self, now: datetime | None = None):
+        """Разослать подписки, срок которых наступил."""
+        now = now or datetime.utcnow()
+        self.runs += 1
+        buckets, advances = self.collect_buckets(now)
+
+        # Сдвигаем next_run_at до отправки: при сбое подписка не уйдет дважды
+        db = self._session_factory()
+        try:
+            for start in range(0, len(advances), 1000):
+                advance_subscriptions(db, advances[start:start + 1000])
+        finally:
+            db.close()
+
+        self._prefetch(buckets)
+
+        payloads: dict[tuple, str | None] = {}
+        for (kind, city_key, _), (city, chat_ids) in buckets.items():
+            payload_key = (kind, city_key)
+            if payload_key not in payloads:
+                payloads[payload_key] = self._render(kind, city)
+            text = payloads[payload_key]
+            if not text:
+                continue
+            for chat_id in dict.fromkeys(chat_ids):
+                if self.rate_limiter is not None:
+                    self.rate_limiter.wait(chat_id)
+                try:
+                    self._send(chat_id, text)
+                    self.sent += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Ошибка при отправке подписки в чат {chat_id}: {e}")
+
+    def stats(self) -> dict[str, int]:
+        """Счетчики запусков, запросов содержимого и отправленных сообщений."""
+        return {
+            "runs": self.runs,
+            "payloads": self.payloads,
+            "sent": self.sent,
+            "errors": self.errors,
+        }
+
+    def _prefetch(self, buckets: dict):
+        """Передать города рассылки пакетным загрузчикам (по типам подписок)."""
+        cities: dict[str, dict[str, None]] = {}
+        for (kind, _, _), (city, _) in buckets.items():
+            if kind in self._prefetchers and city:
+                cities.setdefault(kind, {})[city] = None
+        for kind, names in cities.items():
+            try:
+                self._prefetchers[kind](list(names))
+            except Exception as e:
+                print(f"Ошибка при пакетной загрузке подписок {kind}: {e}")
+
+    def _render(self, kind: str, city: str | None) -> str | None:
+        """Получить текст уведомления для (тип, город)."""
+        self.payloads += 1
+        try:
+            return self._renderers[kind](city)
+        except Exception as e:
+            self.errors += 1
+            print(f"Ошибка при подготовке подписки {kind} {city or ''}: {e}")
+            return None
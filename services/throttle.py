@@ -0,0 +1,203 @@
+"""
+Ограничение частоты команд для каждого пользователя.
+
+Для пары (пользователь, команда) заводится ведро токенов с лимитом
+команды. Отклоненная команда не доходит до обработчика: без запросов
+к БД и внешним API пользователь получает короткий ответ, один раз
+до следующего разрешенного запроса.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+
+from telebot import asyncio_handler_backends
+from telebot.handler_backends import BaseMiddleware, CancelUpdate
+
+from services.metrics import registry
+
+THROTTLED = registry.counter(
+    "bot_throttled_total", "Команды, отклоненные ограничителем частоты", ("command",)
+)
+
+# Лимиты по умолчанию: команд за период (в секундах)
+DEFAULT_LIMITS = {
+    "weather": (10, 60),
+    "events": (10, 60),
+    "news": (10, 60),
+    "default": (30, 60),
+}
+
+THROTTLED_TEXT = "Слишком много запросов. Попробуйте через {seconds} с."
+
+
+class Limit(NamedTuple):
+    """Лимит команды: не больше count команд за period секунд (все сразу — тоже можно)."""
+
+    count: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.count / self.period
+
+
+class Throttled(NamedTuple):
+    """Команда отклонена: через сколько секунд появится токен и нужно ли ответить."""
+
+    retry_after: float
+    notify: bool
+
+
+def parse_limits(spec: str | None) -> dict[str, Limit]:
+    """
+    Лимиты из строки вида «weather=10/60,news=5/60,default=30/60»
+    поверх DEFAULT_LIMITS.
+    """
+    limits = {command: Limit(*value) for command, value in DEFAULT_LIMITS.items()}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        command, _, value = item.partition("=")
+        count, _, period = value.partition("/")
+        limits[command.strip().lstrip("/")] = Limit(int(count), float(period or 60))
+    return limits
+
+
+def message_command(message) -> str | None:
+    """Команда сообщения без «/» и имени бота (None, если это не команда)."""
+    text = getattr(message, "text", None)
+    if not text or not text.startswith("/"):
+        return None
+    return text.split(maxsplit=1)[0][1:].split("@", 1)[0].lower()
+
+
+class UserRateLimiter:
+    """
+    Ведра токенов по (пользователь, команда) с ограниченной памятью.
+
+    Ведра хранятся в порядке последнего использования. Ведро, которое
+    простаивало дольше времени полного пополнения, ничем не отличается
+    от нового, поэтому такие ведра удаляются с начала очереди при каждом
+    обращении; сверх max_size удаляются самые давние. Обе операции — O(1)
+    в среднем на запрос.
+    """
+
+    def __init__(self, limits: dict[str, Limit] | None = None, max_size: int = 100000):
+        self.limits = limits or parse_limits(None)
+        self.max_size = max_size
+        # (пользователь, команда) → [токены, время обновления, ответ уже отправлен]
+        self._buckets: OrderedDict[tuple, list] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def limit(self, command: str) -> Limit:
+        return self.limits.get(command) or self.limits["default"]
+
+    def hit(self, user_id: int, command: str) -> Throttled | None:
+        """Списать токен; None, если команда разрешена."""
+        limit = self.limit(command)
+        key = (user_id, command)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(limit.count), now, False]
+                if len(self._buckets) > self.max_size:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(limit.count, bucket[0] + (now - bucket[1]) * limit.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                bucket[2] = False
+                self.allowed += 1
+                return None
+
+            throttled = Throttled((1 - bucket[0]) / limit.rate, not bucket[2])
+            bucket[2] = True
+            self.rejected += 1
+        THROTTLED.inc(command=command)
+        return throttled
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "buckets": len(self._buckets),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "evicted": self.evicted,
+            }
+
+    def _evict_idle(self, now: float):
+        """Удалить ведра, которые уже пополнились целиком (вызывается под блокировкой)."""
+        while self._buckets:
+            (_, command), bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < self.limit(command).period:
+                return
+            self._buckets.popitem(last=False)
+            self.evicted += 1
+
+
+def throttled_text(throttled: Throttled) -> str:
+    return THROTTLED_TEXT.format(seconds=max(1, round(throttled.retry_after)))
+
+
+class ThrottleMiddleware(BaseMiddleware):
+    """
+    Отклоняет команды сверх лимита до остальных middleware и обработчика.
+
+    Регистрируется первым, чтобы отклоненная команда не открывала сессию БД.
+    """
+
+    def __init__(self, limiter: UserRateLimiter, reply: Callable[[int, str], object]):
+        super().__init__()
+        self.update_types = ["message"]
+        self.limiter = limiter
+        self._reply = reply
+
+    def pre_process(self, message, data):
+        command = message_command(message)
+        if command is None or message.from_user is None:
+            return None
+        throttled = self.limiter.hit(message.from_user.id, command)
+        if throttled is None:
+            return None
+        if throttled.notify:
+            self._reply(message.chat.id, throttled_text(throttled))
+        return CancelUpdate()
+
+    def post_process(self, message, data, exception):
+        pass
+
+
+class AsyncThrottleMiddleware(asyncio_handler_backends.BaseMiddleware):
+    """ThrottleMiddleware для AsyncTeleBot (reply — корутина)."""
+
+    def __init__(self, limiter: UserRateLimiter, reply):
+        super().__init__()
+        self.update_types = ["message"]
+        self.limiter = limiter
+        self._reply = reply
+
+    async def pre_process(self, message, data):
+        command = message_command(message)
+        if command is None or message.from_user is None:
+            return None
+        throttled = self.limiter.hit(message.from_user.id, command)
+        if throttled is None:
+            return None
+        if throttled.notify:
+            await self._reply(message.chat.id, throttled_text(throttled))
+        return asyncio_handler_backends.CancelUpdate()
+
+    async def post_process(self, message, data, exception):
+        pass
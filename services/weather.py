@@ -0,0 +1,128 @@
+"""
+Пакетное получение погоды из OpenWeatherMap.
+
+Для прогрева кэша и рассылки подписок погода запрашивается сразу
+для многих городов: сначала по идентификаторам через /group (до 20 городов
+за запрос), а оставшиеся города группируются в квадраты координат,
+каждый из которых обслуживает один запрос /find. Ответ раскладывается
+по городам в том же формате, что и ответ /weather для одного города.
+"""
+
+import math
+from typing import Iterable
+
+from services.city_index import City
+from services.http import UpstreamClient
+
+GROUP_API_URL = "https://api.openweathermap.org/data/2.5/group"
+FIND_API_URL = "https://api.openweathermap.org/data/2.5/find"
+
+# Ограничение /group на число идентификаторов в одном запросе
+GROUP_LIMIT = 20
+# Ограничение /find на число городов в ответе
+FIND_LIMIT = 50
+
+
+class BulkWeatherFetcher:
+    """
+    Погода для набора городов за несколько запросов.
+
+    Идентификаторы городов OpenWeatherMap совпадают с geonameid GeoNames
+    для большинства городов; города, которых нет в ответе /group,
+    ищутся в ответе /find по ближайшим координатам (не дальше match_distance
+    градусов). Города, не найденные ни там, ни там, в результат не попадают —
+    их погода загружается обычным запросом по одному городу.
+    """
+
+    def __init__(
+        self,
+        http: UpstreamClient,
+        api_key: str | None,
+        group_url: str = GROUP_API_URL,
+        find_url: str = FIND_API_URL,
+        tile_size: float = 1.0,
+        match_distance: float = 0.1,
+    ):
+        self.http = http
+        self.api_key = api_key
+        self.group_url = group_url
+        self.find_url = find_url
+        self.tile_size = tile_size
+        self.match_distance = match_distance
+
+        self.requests = 0
+        self.errors = 0
+        self.fetched = 0
+
+    def fetch(self, cities: Iterable[City]) -> dict[int, dict]:
+        """Погода по городам: geonameid → ответ в формате /weather."""
+        pending = {city.id: city for city in cities}
+        results: dict[int, dict] = {}
+
+        ids = list(pending)
+        for start in range(0, len(ids), GROUP_LIMIT):
+            data = self._request(self.group_url, {"id": ",".join(map(str, ids[start:start + GROUP_LIMIT]))})
+            for item in data.get("list", []):
+                if item.get("id") in pending:
+                    results[item["id"]] = self._entry(item)
+
+        tiles: dict[tuple[int, int], list[City]] = {}
+        for city_id, city in pending.items():
+            if city_id not in results:
+                tile = (math.floor(city.lat / self.tile_size), math.floor(city.lon / self.tile_size))
+                tiles.setdefault(tile, []).append(city)
+        for tile_cities in tiles.values():
+            results.update(self._fetch_tile(tile_cities))
+
+        self.fetched += len(results)
+        return results
+
+    def stats(self) -> dict[str, int]:
+        return {"requests": self.requests, "errors": self.errors, "fetched": self.fetched}
+
+    # ---------------------------------------------------------------
+    # Вспомогательные функции
+    # ---------------------------------------------------------------
+    def _fetch_tile(self, cities: list[City]) -> dict[int, dict]:
+        """Один запрос /find из центра городов квадрата, сопоставление по координатам."""
+        lat = sum(city.lat for city in cities) / len(cities)
+        lon = sum(city.lon for city in cities) / len(cities)
+        data = self._request(self.find_url, {"lat": round(lat, 4), "lon": round(lon, 4), "cnt": FIND_LIMIT})
+        items = data.get("list", [])
+
+        results = {}
+        for city in cities:
+            best, best_distance = None, self.match_distance
+            for item in items:
+                if item.get("id") == city.id:
+                    best = item
+                    break
+                coord = item.get("coord", {})
+                distance = math.hypot(coord.get("lat", 1e9) - city.lat, coord.get("lon", 1e9) - city.lon)
+                if distance <= best_distance:
+                    best, best_distance = item, distance
+            if best is not None:
+                results[city.id] = self._entry(best)
+        return results
+
+    def _request(self, url: str, params: dict) -> dict:
+        """GET к OpenWeatherMap; при ошибке — пустой ответ."""
+        self.requests += 1
+        try:
+            response = self.http.get(
+                url, params={**params, "appid": self.api_key, "units": "metric", "lang": "ru"}
+            )
+            if response.status_code != 200:
+                self.errors += 1
+                print(f"OpenWeatherMap {url}: {response.status_code}")
+                return {}
+            return response.json()
+        except Exception as e:
+            self.errors += 1
+            print(f"Ошибка пакетного запроса погоды: {e}")
+            return {}
+
+    @staticmethod
+    def _entry(item: dict) -> dict:
+        # В элементах списка нет поля cod, которое есть в ответе /weather
+        return {**item, "cod": 200}
@@ -0,0 +1,183 @@
+"""
+Прием обновлений Telegram через webhook.
+
+Легкий HTTP-сервер проверяет секретный токен, отбрасывает повторно
+доставленные обновления (по update_id) и ставит остальные в очередь
+ChatDispatcher. Несколько процессов бота могут работать за балансировщиком:
+каждый принимает свою часть POST-запросов Telegram.
+"""
+
+import hmac
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class UpdateDeduplicator:
+    """
+    Недавно принятые update_id (давно принятые вытесняются).
+
+    С общим хранилищем backend (services/state.py) update_id хранятся
+    в нем ttl секунд, и повторная доставка отсекается во всех процессах.
+    """
+
+    def __init__(self, max_size: int = 100000, backend=None, ttl: float = 86400):
+        self.max_size = max_size
+        self.backend = backend
+        self.ttl = ttl
+        self._seen: OrderedDict[int, None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, update_id: int) -> bool:
+        """Запомнить update_id; False, если он уже был принят."""
+        if self.backend is not None:
+            try:
+                return self.backend.add(f"update:{update_id}", "1", self.ttl)
+            except Exception as e:
+                # Без хранилища лучше обработать обновление, чем потерять его
+                print(f"Ошибка при проверке update_id {update_id}: {e}")
+                return True
+        with self._lock:
+            if update_id in self._seen:
+                return False
+            self._seen[update_id] = None
+            while len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+            return True
+
+    def discard(self, update_id: int):
+        """Забыть update_id (обновление не принято и будет доставлено снова)."""
+        if self.backend is not None:
+            try:
+                self.backend.delete(f"update:{update_id}")
+            except Exception as e:
+                print(f"Ошибка при удалении update_id {update_id}: {e}")
+            return
+        with self._lock:
+            self._seen.pop(update_id, None)
+
+
+class WebhookServer:
+    """HTTP-сервер, принимающий обновления для DispatchingTeleBot."""
+
+    def __init__(
+        self,
+        bot,
+        secret_token: str,
+        host: str = "0.0.0.0",
+        port: int = 8443,
+        path: str = "/webhook",
+        dedup: UpdateDeduplicator | None = None,
+    ):
+        if not secret_token:
+            # Без секрета обновления мог бы подделать любой, кто видит порт
+            raise ValueError("Для webhook нужен секретный токен (WEBHOOK_SECRET)")
+        self.bot = bot
+        self.secret_token = secret_token
+        self.path = path
+        self.dedup = dedup or UpdateDeduplicator()
+
+        self.received = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.shed = 0
+        # Запросы обрабатываются в разных потоках
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                server._handle_post(self)
+
+            def do_GET(self):
+                # Проверка живости для балансировщика
+                status = 200 if self.path == "/healthz" else 404
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        """Фактический порт (если при создании указан 0)."""
+        return self.httpd.server_address[1]
+
+    def serve_forever(self):
+        """Принимать запросы до вызова shutdown()."""
+        self.httpd.serve_forever()
+
+    def start(self) -> threading.Thread:
+        """Запустить сервер в фоновом потоке."""
+        thread = threading.Thread(target=self.serve_forever, name="webhook", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        """Остановить сервер."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self) -> dict[str, int]:
+        """Счетчики принятых, повторных и отклоненных обновлений."""
+        with self._lock:
+            return {
+                "received": self.received,
+                "accepted": self.accepted,
+                "duplicates": self.duplicates,
+                "rejected": self.rejected,
+                "shed": self.shed,
+            }
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _handle_post(self, request: BaseHTTPRequestHandler):
+        """Проверить запрос Telegram и поставить обновление в очередь."""
+        self._count("received")
+        if request.path != self.path:
+            return self._reply(request, 404)
+
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            self._count("rejected")
+            return self._reply(request, 403)
+
+        try:
+            length = int(request.headers.get("Content-Length", 0))
+            update = types.Update.de_json(json.loads(request.rfile.read(length)))
+        except (ValueError, KeyError, TypeError) as e:
+            self._count("rejected")
+            print(f"Некорректное обновление webhook: {e}")
+            return self._reply(request, 400)
+
+        if not self.dedup.add(update.update_id):
+            self._count("duplicates")
+            return self._reply(request, 200)
+
+        if not self.bot.submit_update(update):
+            # Очередь переполнена: Telegram доставит обновление повторно
+            self.dedup.discard(update.update_id)
+            self._count("shed")
+            return self._reply(request, 503)
+
+        self._count("accepted")
+        self._reply(request, 200)
+
+    @staticmethod
+    def _reply(request: BaseHTTPRequestHandler, status: int):
+        request.send_response(status)
+        request.send_header("Content-Length", "0")
+        request.end_headers()
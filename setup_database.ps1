@@ -4,9 +4,6 @@
 Write-Host "Установка зависимостей..." -ForegroundColor Green
 pip install -r requirements.txt
 
-Write-Host "Создание первой миграции..." -ForegroundColor Green
-alembic revision --autogenerate -m "Initial migration"
-
 Write-Host "Применение миграций..." -ForegroundColor Green
 alembic upgrade head
 
@@ -0,0 +1,50 @@
+"""
+Общие фикстуры тестов.
+"""
+
+import threading
+
+import pytest
+
+
+class FakeClock:
+    """Управляемое время вместо модуля time в проверяемом модуле."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+        self._lock = threading.Lock()
+
+    def monotonic(self) -> float:
+        with self._lock:
+            return self.now
+
+    time = perf_counter = monotonic
+
+    def advance(self, seconds: float):
+        with self._lock:
+            self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """SQLite во временном каталоге со схемой из моделей."""
+    from sqlalchemy import create_engine
+
+    from database.models import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    from sqlalchemy.orm import sessionmaker
+
+    return sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
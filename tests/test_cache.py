@@ -0,0 +1,144 @@
+"""
+StaleWhileRevalidateCache: объединение запросов, фоновое обновление
+и последнее известное значение при ошибке загрузчика.
+"""
+
+import threading
+import time
+
+import pytest
+
+from services import cache as cache_module
+from services.cache import StaleWhileRevalidateCache
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "условие не выполнилось"
+        time.sleep(0.005)
+
+
+def test_concurrent_misses_share_one_load():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader(arg):
+        calls.append(arg)
+        started.set()
+        release.wait(2)
+        return f"value-{arg}"
+
+    cache = StaleWhileRevalidateCache(loader, ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("москва"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    started.wait(2)
+    # Все потоки успели дойти до кэша, пока первый загружает значение
+    wait_for(lambda: cache.stats()["misses"] == 8)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert calls == ["москва"]
+    assert results == ["value-москва"] * 8
+
+
+def test_key_func_merges_spellings():
+    calls = []
+    cache = StaleWhileRevalidateCache(lambda arg: calls.append(arg) or arg, ttl=60, key_func=str.lower)
+    assert cache.get("Москва") == "Москва"
+    assert cache.get("МОСКВА") == "Москва"
+    assert calls == ["Москва"]
+
+
+def test_fresh_hit_does_not_reload(clock):
+    calls = []
+    cache = StaleWhileRevalidateCache(lambda arg: calls.append(arg) or len(calls), ttl=60)
+    assert cache.get("k") == 1
+    clock.advance(59)
+    assert cache.get("k") == 1
+    assert calls == ["k"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_stale_value_served_while_refreshing(clock):
+    release = threading.Event()
+    values = iter(["old", "new"])
+
+    def loader(arg):
+        value = next(values)
+        if value == "new":
+            release.wait(2)
+        return value
+
+    cache = StaleWhileRevalidateCache(loader, ttl=60, max_stale=60)
+    assert cache.get("k") == "old"
+    clock.advance(90)
+
+    # Устаревшее значение отдается сразу, обновление идет в фоне (одно на ключ)
+    assert cache.get("k") == "old"
+    assert cache.get("k") == "old"
+    assert cache.stats()["refreshes"] == 1
+    release.set()
+    wait_for(lambda: cache.peek("k") == "new")
+    assert cache.get("k") == "new"
+
+
+def test_falls_back_to_last_value_when_loader_fails(clock):
+    fail = False
+
+    def loader(arg):
+        if fail:
+            raise ConnectionError("upstream down")
+        return "forecast"
+
+    cache = StaleWhileRevalidateCache(loader, ttl=60, max_stale=60)
+    assert cache.get("k") == "forecast"
+
+    # Запись старше ttl + max_stale: загрузка синхронная, но при ошибке
+    # отдается последнее известное значение
+    clock.advance(600)
+    fail = True
+    assert cache.get("k") == "forecast"
+    assert cache.stats()["fallbacks"] == 1
+
+
+def test_error_without_cached_value_is_raised():
+    def loader(arg):
+        raise ConnectionError("upstream down")
+
+    cache = StaleWhileRevalidateCache(loader, ttl=60)
+    with pytest.raises(ConnectionError):
+        cache.get("k")
+    # Ошибка не кэшируется
+    assert cache.peek("k") is None
+
+
+def test_uncacheable_values_are_not_stored():
+    calls = []
+    cache = StaleWhileRevalidateCache(
+        lambda arg: calls.append(arg) or {"cod": "404"},
+        ttl=60,
+        cacheable=lambda data: data.get("cod") == 200,
+    )
+    cache.get("нет такого")
+    cache.get("нет такого")
+    assert len(calls) == 2
+
+
+def test_lru_eviction():
+    cache = StaleWhileRevalidateCache(lambda arg: arg, ttl=60, max_size=2)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    assert cache.keys() == ["a", "c"]
@@ -0,0 +1,89 @@
+"""
+CityIndex: точный поиск, префикс, опечатки и ограничение просмотра ключей.
+"""
+
+import pytest
+
+from services.city_index import CityIndex, build_index, edit_distance, search_key
+
+# geonameid, name, asciiname, alternatenames, lat, lon, ..., country (8), ..., population (14)
+CITIES = [
+    (524901, "Moscow", "Moscow", "Moskva,Москва", 55.75, 37.62, "RU", 10381222),
+    (498817, "Saint Petersburg", "Saint Petersburg", "Санкт-Петербург", 59.94, 30.31, "RU", 5351935),
+    (4400648, "Moscow", "Moscow", "", 46.73, -117.0, "US", 25000),
+    (551487, "Kazan", "Kazan", "Казань", 55.79, 49.12, "RU", 1104738),
+    (2643743, "London", "London", "Лондон", 51.51, -0.13, "GB", 8961989),
+]
+
+
+def geonames_line(geonameid, name, ascii_name, alternates, lat, lon, country, population):
+    row = [""] * 19
+    row[0], row[1], row[2], row[3] = str(geonameid), name, ascii_name, alternates
+    row[4], row[5], row[8], row[14] = str(lat), str(lon), country, str(population)
+    return "\t".join(row)
+
+
+@pytest.fixture
+def index(tmp_path):
+    source = tmp_path / "cities.txt"
+    source.write_text("\n".join(geonames_line(*city) for city in CITIES) + "\n", encoding="utf-8")
+    path = tmp_path / "cities.idx"
+    assert build_index(str(source), str(path)) == len(CITIES)
+    index = CityIndex(str(path))
+    yield index
+    index.close()
+
+
+def test_search_key():
+    assert search_key("Санкт-Петербург") == "sankt peterburg"
+    assert search_key("  МСК ") == "moskva"
+    assert search_key("Zürich") == "zurich"
+
+
+def test_edit_distance():
+    assert edit_distance("moskva", "moskva", 2) == 0
+    assert edit_distance("mosvka", "moskva", 2) == 1  # перестановка
+    assert edit_distance("kazan", "london", 2) == 3
+
+
+def test_exact_prefers_largest_city(index):
+    city = index.exact("Moscow")
+    assert (city.id, city.display_name, city.country) == (524901, "Москва", "RU")
+    assert index.exact("Москва").id == 524901
+    # Синонимы из CITY_ALIASES
+    assert index.exact("Питер").id == 498817
+    assert index.exact("Нью-Йорк") is None
+
+
+def test_prefix(index):
+    assert [city.id for city in index.prefix("mos")] == [524901, 4400648]
+
+
+def test_fuzzy(index):
+    assert index.fuzzy("Мосвка").id == 524901
+    assert index.fuzzy("Казнь").id == 551487
+    # Переставленные первые буквы
+    assert index.fuzzy("Olndon").id == 2643743
+    assert index.fuzzy("Нью-Йорк") is None
+
+
+def test_fuzzy_scans_bounded_number_of_keys(index, monkeypatch):
+    scanned = []
+    scan_prefix = index._scan_prefix
+
+    def counting_scan(prefix):
+        for item in scan_prefix(prefix):
+            scanned.append(item)
+            yield item
+
+    monkeypatch.setattr(index, "_scan_prefix", counting_scan)
+    # Ключи за пределами бюджета не сравниваются
+    assert index.fuzzy("Лондн", max_candidates=0) is None
+    assert len(scanned) <= 2
+    assert index.fuzzy("Лондн").id == 2643743
+
+
+def test_resolve_caches_misses(index):
+    assert index.resolve("Нью-Йорк") is None
+    assert index.resolve("Нью-Йорк") is None
+    assert index.stats()["hits"] == 1
@@ -0,0 +1,129 @@
+"""
+upsert_user и кэш пользователей: вставка без фиксации (commit делает
+SessionMiddleware), гонка по telegram_id и кэш только после commit.
+"""
+
+import pytest
+from sqlalchemy import func, select
+
+from database import crud
+from database.crud import get_or_create_user_cached, upsert_user
+from database.middleware import after_commit
+from database.models import StatCounter, User
+from database.user_cache import user_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_user_cache():
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+
+def count_users(session_factory) -> int:
+    with session_factory() as db:
+        return db.scalar(select(func.count()).select_from(User))
+
+
+def users_counter(session_factory) -> int | None:
+    with session_factory() as db:
+        counter = db.get(StatCounter, ("total", "users"))
+        return counter.value if counter else None
+
+
+def test_upsert_does_not_commit(session_factory):
+    db = session_factory()
+    user = upsert_user(db, 100, "Анна")
+    assert user.name == "Анна"
+    # Без commit вставка не видна другим сессиям
+    assert count_users(session_factory) == 0
+    db.commit()
+    db.close()
+    assert count_users(session_factory) == 1
+    assert users_counter(session_factory) == 1
+
+
+def test_upsert_existing_user_is_not_counted_twice(session_factory):
+    for _ in range(2):
+        with session_factory() as db:
+            upsert_user(db, 100, "Анна")
+            db.commit()
+    assert count_users(session_factory) == 1
+    assert users_counter(session_factory) == 1
+
+
+@pytest.mark.parametrize("on_conflict", [True, False])
+def test_concurrent_insert_keeps_other_work(session_factory, monkeypatch, on_conflict):
+    if not on_conflict:
+        # СУБД без ON CONFLICT: вставка в точке сохранения
+        monkeypatch.setattr(crud, "_UPSERT_INSERTS", {})
+    # Пользователя 100 уже создал другой процесс, но выборка его не увидела
+    with session_factory() as other:
+        other.add(User(telegram_id=100, name="Анна"))
+        other.commit()
+    db = session_factory()
+    db.add(User(telegram_id=1, name="другая работа обновления"))
+    db.flush()
+    monkeypatch.setattr(db, "execute", _hide_first_select(db.execute))
+
+    user = upsert_user(db, 100, "Анна")
+    db.commit()
+    db.close()
+    assert user.name == "Анна"
+    # Работа обновления до вставки не потеряна, счетчик не увеличен
+    assert count_users(session_factory) == 2
+    assert users_counter(session_factory) is None
+
+
+def _hide_first_select(execute):
+    calls = []
+
+    def wrapped(statement, *args, **kwargs):
+        result = execute(statement, *args, **kwargs)
+        if not calls and statement.is_select:
+            calls.append(statement)
+            return _Empty()
+        return result
+
+    return wrapped
+
+
+class _Empty:
+    def first(self):
+        return None
+
+
+def test_user_is_cached_after_commit(session_factory):
+    db = session_factory()
+    user = get_or_create_user_cached(db, 100, "Анна")
+    assert user_cache.get(100) is None
+    db.commit()
+    assert user_cache.get(100) == user
+    db.close()
+
+
+def test_rollback_does_not_cache_unsaved_user(session_factory):
+    db = session_factory()
+    get_or_create_user_cached(db, 100, "Анна")
+    db.rollback()
+    db.close()
+    assert user_cache.get(100) is None
+    assert count_users(session_factory) == 0
+
+
+def test_after_commit_without_transaction_runs_immediately(session_factory):
+    calls = []
+    with session_factory() as db:
+        after_commit(db, lambda: calls.append("сразу"))
+        assert calls == ["сразу"]
+        db.execute(select(User.id))
+        after_commit(db, lambda: calls.append("после commit"))
+        assert calls == ["сразу"]
+        db.commit()
+    assert calls == ["сразу", "после commit"]
+
+
+def test_invalidate_user_id():
+    user_cache.put(100, crud.CachedUser(1, "Анна"))
+    user_cache.invalidate_user_id(1)
+    assert user_cache.get(100) is None
@@ -0,0 +1,100 @@
+"""
+ChatDispatcher: обновления одного чата обрабатываются по порядку
+одним потоком, переполненная очередь отбрасывает обновления.
+"""
+
+import threading
+import time
+import types
+
+from services.dispatcher import ChatDispatcher, DispatchingTeleBot, update_chat_id
+
+
+def test_update_chat_id():
+    chat = types.SimpleNamespace(id=42)
+    message_update = types.SimpleNamespace(update_id=1, message=types.SimpleNamespace(chat=chat))
+    assert update_chat_id(message_update) == 42
+
+    inline_update = types.SimpleNamespace(update_id=2, inline_query=types.SimpleNamespace(from_user=chat))
+    assert update_chat_id(inline_update) == 42
+
+    assert update_chat_id(types.SimpleNamespace(update_id=3)) == 3
+
+
+def test_updates_of_one_chat_are_processed_in_order():
+    seen: dict[int, list[int]] = {}
+    threads: dict[int, set[str]] = {}
+    lock = threading.Lock()
+
+    def handler(item):
+        chat_id, index = item
+        # Разные чаты обрабатываются вперемешку и с разной задержкой
+        time.sleep(0.001 * (index % 3))
+        with lock:
+            seen.setdefault(chat_id, []).append(index)
+            threads.setdefault(chat_id, set()).add(threading.current_thread().name)
+
+    dispatcher = ChatDispatcher(handler, num_workers=4, queue_size=1000)
+    dispatcher.start()
+    for index in range(50):
+        for chat_id in range(10):
+            assert dispatcher.submit(chat_id, (chat_id, index))
+    dispatcher.stop(5)
+
+    assert all(indexes == list(range(50)) for indexes in seen.values())
+    assert all(len(names) == 1 for names in threads.values())
+    assert sum(dispatcher.stats()["processed"]) == 500
+
+
+def test_full_queue_sheds_updates():
+    release = threading.Event()
+    dispatcher = ChatDispatcher(lambda item: release.wait(2), num_workers=1, queue_size=2)
+    dispatcher.start()
+    # Первое обновление занимает поток, два ждут в очереди, остальные отбрасываются
+    results = [dispatcher.submit(1, index) for index in range(6)]
+    release.set()
+    dispatcher.stop(5)
+
+    assert results.count(False) == dispatcher.stats()["shed"][0] >= 3
+    assert dispatcher.stats()["processed"][0] == results.count(True)
+
+
+def test_handler_errors_do_not_stop_the_worker():
+    processed = []
+
+    def handler(item):
+        if item == "bad":
+            raise ValueError("boom")
+        processed.append(item)
+
+    dispatcher = ChatDispatcher(handler, num_workers=1)
+    dispatcher.start()
+    for item in ("a", "bad", "b"):
+        dispatcher.submit(1, item)
+    dispatcher.stop(5)
+
+    assert processed == ["a", "b"]
+    assert dispatcher.stats()["errors"] == [1]
+
+
+def test_offset_advances_past_duplicate_updates():
+    from services.state import MemoryBackend
+    from services.webhook import UpdateDeduplicator
+
+    # Обновления 5 и 6 уже принял прежний лидер, но не подтвердил Telegram
+    backend = MemoryBackend()
+    for update_id in (5, 6):
+        backend.add(f"update:{update_id}", "1")
+    bot = DispatchingTeleBot("123:test", num_workers=1)
+    bot.dedup = UpdateDeduplicator(backend=backend)
+    submitted = []
+    bot.submit_update = lambda update: submitted.append(update.update_id)
+
+    chat = types.SimpleNamespace(chat=types.SimpleNamespace(id=1))
+    bot.process_new_updates([types.SimpleNamespace(update_id=i, message=chat) for i in (5, 6)])
+    assert submitted == []
+    # Следующий getUpdates запросит обновления после 6
+    assert bot.last_update_id == 6
+
+    bot.process_new_updates([types.SimpleNamespace(update_id=7, message=chat)])
+    assert submitted == [7]
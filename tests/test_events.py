@@ -0,0 +1,87 @@
+"""
+EventsPrefetcher: популярные города по логам /events и прогрев
+истекающих записей кэша событий.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from database.models import Log, User
+from services import cache as cache_module
+from services.cache import StaleWhileRevalidateCache
+from services.cities import normalize_city
+from services.events import UNKNOWN_CITY_MARK, EventsPrefetcher
+
+NOW = datetime(2024, 5, 2, 12, 0)
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def logs(engine):
+    def add(*commands, hours_ago: int = 1):
+        with engine.begin() as connection:
+            connection.execute(insert(Log), [
+                {"user_id": 1, "command": command, "timestamp": NOW - timedelta(hours=hours_ago)}
+                for command in commands
+            ])
+
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"id": 1, "telegram_id": 100, "name": "Анна", "registered_at": NOW}])
+    return add
+
+
+def events_cache(calls):
+    return StaleWhileRevalidateCache(
+        lambda city: calls.append(city) or [f"событие {city}"],
+        ttl=600,
+        key_func=lambda city: normalize_city(city) if city else None,
+    )
+
+
+def test_popular_cities(session_factory, logs):
+    logs(*["/events Москва"] * 3, *["/events мск"] * 2, *["/events Казань"] * 4, "/events", "/weather Омск")
+    logs(f"/events Атлантида {UNKNOWN_CITY_MARK}", f"/events Атлантида {UNKNOWN_CITY_MARK}")
+    # За пределами окна
+    logs(*["/events Омск"] * 10, hours_ago=30)
+
+    prefetcher = EventsPrefetcher(session_factory, events_cache([]), window_hours=24)
+    # Написания одного города складываются, берется самое частое
+    assert prefetcher.popular_cities(NOW) == ["Москва", "Казань"]
+
+    prefetcher.top = 1
+    assert prefetcher.popular_cities(NOW) == ["Москва"]
+
+
+def test_unknown_cities_are_skipped(session_factory, logs):
+    logs("/events Москва", "/events Мосвка", "/events Мосвка")
+    prefetcher = EventsPrefetcher(
+        session_factory, events_cache([]), is_known_city=lambda city: city == "Москва"
+    )
+    assert prefetcher.popular_cities(NOW) == ["Москва"]
+
+
+def test_run_refreshes_missing_and_expiring_entries(session_factory, logs, clock, monkeypatch):
+    calls = []
+    cache = events_cache(calls)
+    prefetcher = EventsPrefetcher(session_factory, cache)
+    monkeypatch.setattr(prefetcher, "popular_cities", lambda: ["Москва", "Казань"])
+
+    prefetcher.run()
+    assert calls == [None, "Москва", "Казань"]
+
+    # Записи свежие дольше интервала прогрева (ttl / 2) — не обновляются
+    clock.advance(200)
+    prefetcher.run()
+    assert len(calls) == 3
+
+    clock.advance(200)
+    prefetcher.run()
+    assert len(calls) == 6
+    assert (prefetcher.runs, prefetcher.prefetched) == (3, 6)
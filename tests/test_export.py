@@ -0,0 +1,80 @@
+"""
+export_data: выгрузка порциями, продолжение по отметке с обрезкой CSV
+и проверка периода отметки.
+"""
+
+import csv
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+import export_data
+from database.models import Log, User
+
+
+@pytest.fixture
+def logs(engine, monkeypatch):
+    """100 логов по одному в час, начиная с 01.05.2024."""
+    monkeypatch.setattr(export_data, "get_engine", lambda: engine)
+    start = datetime(2024, 5, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"telegram_id": 1, "name": "Анна", "registered_at": start}])
+        connection.execute(insert(Log), [
+            {"user_id": 1, "command": f"/weather {i}", "timestamp": start + timedelta(hours=i)}
+            for i in range(100)
+        ])
+    return engine
+
+
+def read_ids(path) -> list[int]:
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["id", "user_id", "command", "timestamp"]
+    return [int(row[0]) for row in rows[1:]]
+
+
+def test_export_in_chunks_with_period(logs, tmp_path):
+    since, until = datetime(2024, 5, 2), datetime(2024, 5, 3)
+    assert export_data.export_table("logs", str(tmp_path), since=since, until=until, chunk_size=7) == 24
+    assert read_ids(tmp_path / "logs.csv") == list(range(25, 49))
+    assert export_data.load_checkpoint(str(tmp_path / "logs.csv.checkpoint"), since, until)[0] == 48
+
+
+def test_resume_truncates_rows_written_after_checkpoint(logs, tmp_path):
+    path = tmp_path / "logs.csv"
+    checkpoint = str(tmp_path / "logs.csv.checkpoint")
+    # Обрыв после 30 строк: отметка сохранена, но в файл успела попасть часть следующей порции
+    chunks = export_data.read_chunks(Log, chunk_size=30)
+    writer = export_data.CsvWriter(str(path), ["id", "user_id", "command", "timestamp"])
+    writer.write(next(chunks))
+    export_data.save_checkpoint(checkpoint, 30, offset=writer.offset)
+    writer.write(next(chunks)[:5])
+    writer.close()
+
+    assert export_data.export_table("logs", str(tmp_path), resume=True, chunk_size=30) == 70
+    assert read_ids(path) == list(range(1, 101))
+    assert export_data.load_checkpoint(checkpoint) == (100, os.path.getsize(path))
+
+
+def test_resume_without_new_rows(logs, tmp_path):
+    export_data.export_table("logs", str(tmp_path))
+    assert export_data.export_table("logs", str(tmp_path), resume=True) == 0
+    assert read_ids(tmp_path / "logs.csv") == list(range(1, 101))
+
+
+def test_checkpoint_of_other_period_is_refused(logs, tmp_path):
+    export_data.export_table("logs", str(tmp_path), since=datetime(2024, 5, 2))
+    with pytest.raises(ValueError):
+        export_data.export_table("logs", str(tmp_path), since=datetime(2024, 5, 3), resume=True)
+
+
+def test_parquet_resume_without_new_rows_creates_no_file(logs, tmp_path):
+    pytest.importorskip("pyarrow")
+    export_data.export_table("logs", str(tmp_path), fmt="parquet")
+    assert export_data.export_table("logs", str(tmp_path), fmt="parquet", resume=True) == 0
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("logs")) == [
+        "logs.parquet",
+        "logs.parquet.checkpoint",
+    ]
@@ -0,0 +1,122 @@
+"""
+CircuitBreaker и UpstreamClient: размыкание после ошибок подряд,
+один пробный запрос, замыкание и повторное размыкание.
+"""
+
+import types
+
+import pytest
+import requests
+
+from services import http as http_module
+from services.http import CircuitBreaker, CircuitOpenError, UpstreamClient, _CappedRetry
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(http_module, "time", clock)
+    return clock
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("api", failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    # Успех сбрасывает серию ошибок
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opened == 1
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    assert breaker.rejected == 1
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("api", failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    clock.advance(29)
+    assert not breaker.allow()
+
+    clock.advance(1)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    # Пока пробный запрос не завершился, остальные отклоняются
+    assert not breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes(clock):
+    breaker = CircuitBreaker("api", failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert all(breaker.allow() for _ in range(5))
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker("api", failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record_failure()
+    # Одной ошибки пробного запроса достаточно, пауза отсчитывается заново
+    assert breaker.state == "open"
+    assert breaker.opened == 2
+    clock.advance(29)
+    assert not breaker.allow()
+    clock.advance(1)
+    assert breaker.allow()
+
+
+def test_released_probe_lets_next_request_probe(clock):
+    breaker = CircuitBreaker("api", failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    clock.advance(30)
+    assert breaker.allow()
+    # Пробный запрос отменен: исход не учитывается, но следующий запрос — новая проба
+    breaker.release_probe()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_capped_retry_after():
+    retry = _CappedRetry(total=2)
+    response = types.SimpleNamespace(headers={"Retry-After": "120"})
+    assert retry.get_retry_after(response) == _CappedRetry.MAX_RETRY_AFTER
+    assert retry.get_retry_after(types.SimpleNamespace(headers={"Retry-After": "3"})) == 3
+    assert retry.get_retry_after(types.SimpleNamespace(headers={})) is None
+
+
+def test_client_counts_failures_and_rejects_when_open(monkeypatch):
+    client = UpstreamClient("api", failure_threshold=2, reset_timeout=30)
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(kwargs["timeout"])
+        if len(calls) == 1:
+            raise requests.ConnectionError("refused")
+        return types.SimpleNamespace(status_code=503)
+
+    monkeypatch.setattr(client.session, "get", get)
+    with pytest.raises(requests.ConnectionError):
+        client.get("http://api.test")
+    assert client.get("http://api.test").status_code == 503
+    with pytest.raises(CircuitOpenError):
+        client.get("http://api.test")
+
+    assert calls == [client.timeout, client.timeout]
+    assert client.stats() == {"requests": 2, "failures": 2, "circuit": "open", "rejected": 1}
@@ -0,0 +1,90 @@
+"""
+LogWriter: запись пачками, запись остатка при остановке
+и отбрасывание при переполненной очереди.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func, insert, select
+
+from database.log_writer import LogWriter
+from database.models import Log, User
+
+
+def count_logs(session_factory) -> int:
+    with session_factory() as db:
+        return db.scalar(select(func.count()).select_from(Log))
+
+
+def make_user(engine) -> int:
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"telegram_id": 1, "name": "Анна", "registered_at": datetime(2024, 5, 1)}])
+    return 1
+
+
+def test_batches_by_size(engine, session_factory):
+    user_id = make_user(engine)
+    flushed = []
+
+    def tracking_factory():
+        flushed.append(threading.current_thread().name)
+        return session_factory()
+
+    writer = LogWriter(tracking_factory, batch_size=10, flush_interval=60)
+    for i in range(25):
+        assert writer.enqueue(user_id, f"/weather {i}")
+    writer.start()
+    writer.stop(5)
+
+    assert count_logs(session_factory) == 25
+    stats = writer.stats()
+    # Две полные пачки и остаток при остановке
+    assert (stats["written"], stats["flushes"], stats["failed"]) == (25, 3, 0)
+    assert set(flushed) == {"log-writer"}
+
+
+def test_flushes_by_interval(engine, session_factory):
+    user_id = make_user(engine)
+    writer = LogWriter(session_factory, batch_size=500, flush_interval=0.05)
+    writer.start()
+    writer.enqueue(user_id, "/news")
+    deadline = time.monotonic() + 2
+    while writer.stats()["written"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.stats()["written"] == 1
+    writer.stop(5)
+
+
+def test_stop_writes_pending_logs(engine, session_factory):
+    user_id = make_user(engine)
+    writer = LogWriter(session_factory, batch_size=500, flush_interval=60)
+    writer.start()
+    for _ in range(3):
+        writer.enqueue(user_id, "/help")
+    writer.stop(5)
+    assert count_logs(session_factory) == 3
+    with session_factory() as db:
+        assert db.scalar(select(func.count()).select_from(Log).where(Log.command == "/help")) == 3
+
+
+def test_full_queue_drops_records(session_factory):
+    writer = LogWriter(session_factory, max_queue=2, put_timeout=0)
+    assert [writer.enqueue(1, "/start") for _ in range(3)] == [True, True, False]
+    assert writer.stats()["dropped"] == 1
+    assert writer.stats()["queue_depth"] == 2
+
+
+def test_failed_batch_is_counted(session_factory):
+    def broken_factory():
+        db = session_factory()
+        db.execute = lambda *args, **kwargs: (_ for _ in ()).throw(RuntimeError("db down"))
+        return db
+
+    writer = LogWriter(broken_factory, flush_interval=60)
+    writer.enqueue(1, "/start")
+    writer.start()
+    writer.stop(5)
+    assert writer.stats()["failed"] == 1
+    assert writer.stats()["written"] == 0
@@ -0,0 +1,76 @@
+"""
+Метрики: формат Prometheus, результаты обработчиков и замер SQL-запросов.
+"""
+
+from sqlalchemy import create_engine, text
+
+from services.metrics import (
+    DEPENDENCY_SECONDS,
+    HANDLER_RESULTS,
+    Registry,
+    current_command,
+    instrument,
+    instrument_engine,
+    log_error,
+    observe_dependency,
+)
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Запросы", ("command",))
+    seconds = registry.histogram("seconds", "Время", ("command",), buckets=(0.1, 1))
+    registry.gauge("queue_depth", "Очереди", lambda: {"outbox": 3, "logs": 0}, label="queue")
+    registry.gauge("broken", "Ошибка чтения", lambda: 1 / 0)
+
+    requests.inc(command='/weather "Москва"')
+    seconds.observe(0.05, command="/news")
+    seconds.observe(0.5, command="/news")
+    seconds.observe(5, command="/news")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Запросы",
+        "# TYPE requests_total counter",
+        # Кавычки в значении метки заменяются, чтобы не ломать формат
+        "requests_total{command=\"/weather 'Москва'\"} 1",
+        "# HELP seconds Время",
+        "# TYPE seconds histogram",
+        'seconds_bucket{command="/news",le="0.1"} 1',
+        'seconds_bucket{command="/news",le="1.0"} 2',
+        'seconds_bucket{command="/news",le="+Inf"} 3',
+        'seconds_sum{command="/news"} 5.55',
+        'seconds_count{command="/news"} 3',
+        "# HELP queue_depth Очереди",
+        "# TYPE queue_depth gauge",
+        'queue_depth{queue="logs"} 0',
+        'queue_depth{queue="outbox"} 3',
+    ]
+
+
+def test_instrument_records_outcome_and_command():
+    @instrument("/test-ok")
+    def ok():
+        observe_dependency("test-api", 0.01)
+        return current_command.get()
+
+    @instrument("/test-handled")
+    def handled():
+        log_error("Ошибка", ValueError("boom"))
+
+    assert ok() == "/test-ok"
+    assert current_command.get() == "background"
+    handled()
+
+    assert HANDLER_RESULTS.value(command="/test-ok", outcome="ok") == 1
+    assert HANDLER_RESULTS.value(command="/test-handled", outcome="handled_error") == 1
+    assert DEPENDENCY_SECONDS.count(dependency="test-api", command="/test-ok") == 1
+
+
+def test_instrument_engine_is_idempotent():
+    engine = create_engine("sqlite://")
+    # Повторный вызов (второй create_app в том же процессе) не удваивает замеры
+    instrument_engine(engine, dependency="test-db")
+    instrument_engine(engine, dependency="test-db")
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    assert DEPENDENCY_SECONDS.count(dependency="test-db", command="background") == 1
@@ -0,0 +1,147 @@
+"""
+Миграции Alembic: схема и перенос накопленных данных.
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+from alembic import command
+from alembic.config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Migrator:
+    """БД во временном каталоге, обновляемая до нужной ревизии."""
+
+    def __init__(self, url: str):
+        self.config = Config()
+        self.config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+        self.engine = sa.create_engine(url)
+
+    def upgrade(self, revision: str):
+        command.upgrade(self.config, revision)
+
+    def insert(self, table: str, rows: list[dict]):
+        with self.engine.begin() as connection:
+            connection.execute(sa.table(table, *map(sa.column, rows[0])).insert(), rows)
+
+    def rows(self, query: str) -> list[tuple]:
+        with self.engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(sa.text(query))]
+
+    def indexes(self, table: str) -> set[str]:
+        return {index["name"] for index in sa.inspect(self.engine).get_indexes(table)}
+
+
+@pytest.fixture
+def migrator(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    migrator = Migrator(url)
+    yield migrator
+    migrator.engine.dispose()
+
+
+def user(user_id: int, settings: str | None = None) -> dict:
+    return {
+        "id": user_id,
+        "telegram_id": 1000 + user_id,
+        "name": f"Пользователь {user_id}",
+        "registered_at": datetime(2024, 5, 1),
+        "subscription_settings": settings,
+    }
+
+
+def test_0002_moves_subscription_settings(migrator):
+    migrator.upgrade("0001")
+    migrator.insert("users", [
+        user(1, "weather Мск daily 08:00; news"),
+        user(2, '{"kind": "events", "frequency": "weekly"}'),
+        user(3, "что-то непонятное"),
+        user(4),
+    ])
+    before = datetime.utcnow()
+    migrator.upgrade("0002")
+
+    rows = migrator.rows(
+        "SELECT user_id, kind, city, city_name, frequency, send_time, next_run_at"
+        " FROM subscriptions ORDER BY user_id, kind"
+    )
+    assert [row[:6] for row in rows] == [
+        (1, "news", None, None, "daily", "09:00"),
+        # Город нормализуется синонимами на момент миграции
+        (1, "weather", "москва", "Мск", "daily", "08:00"),
+        (2, "events", None, None, "weekly", "09:00"),
+    ]
+    assert all(datetime.fromisoformat(row[6]) > before for row in rows)
+    assert migrator.indexes("subscriptions") >= {
+        "ix_subscriptions_user_id",
+        "ix_subscriptions_kind_city_next_run_at",
+        "ix_subscriptions_next_run_at",
+    }
+
+
+def test_0002_does_not_import_live_code():
+    with open(os.path.join(ROOT, "alembic", "versions", "0002_subscriptions.py"), encoding="utf-8") as f:
+        source = f.read()
+    assert "from services" not in source and "import services" not in source
+
+
+def test_0003_adds_log_indexes_and_daily_stats(migrator):
+    migrator.upgrade("0003")
+    assert migrator.indexes("logs") >= {"ix_logs_user_id_timestamp", "ix_logs_timestamp"}
+    assert migrator.rows("SELECT COUNT(*) FROM log_daily_stats") == [(0,)]
+
+
+def test_0004_backfills_counters_once(migrator):
+    migrator.upgrade("0003")
+    migrator.insert("users", [user(1), user(2)])
+    migrator.insert("logs", [
+        {"user_id": 1, "command": "/weather Мск", "timestamp": datetime(2024, 5, 2, 8)},
+        {"user_id": 2, "command": "/weather Москва (ошибка)", "timestamp": datetime(2024, 5, 2, 9)},
+        {"user_id": 1, "command": "/news", "timestamp": datetime(2024, 5, 2, 10)},
+    ])
+    # Свернутые в агрегаты логи прошлых дней
+    migrator.insert("log_daily_stats", [
+        {"day": datetime(2024, 5, 1).date(), "user_id": 2, "command": "/events Казань", "count": 4},
+        {"day": datetime(2024, 5, 2).date(), "user_id": 2, "command": "/news", "count": 2},
+    ])
+    migrator.upgrade("0004")
+
+    assert dict(((kind, key), value) for kind, key, value in migrator.rows(
+        "SELECT kind, key, value FROM stat_counters"
+    )) == {
+        ("total", "users"): 2,
+        ("total", "logs"): 9,
+        ("command", "/weather"): 2,
+        ("command", "/news"): 3,
+        ("command", "/events"): 4,
+        ("city", "москва"): 2,
+        ("city", "казань"): 4,
+        ("dau", "2024-05-01"): 1,
+        # Пользователь 2 есть и в логах, и в агрегатах за 02.05 — учтен один раз
+        ("dau", "2024-05-02"): 2,
+    }
+    assert sorted(migrator.rows("SELECT day, user_id FROM daily_active_users")) == [
+        ("2024-05-01", 2),
+        ("2024-05-02", 1),
+        ("2024-05-02", 2),
+    ]
+
+
+def test_0004_skips_backfill_when_counters_exist(migrator):
+    migrator.upgrade("0003")
+    migrator.insert("users", [user(1)])
+    # Таблицу уже создал init_db(), и счетчики ведет LogWriter
+    with migrator.engine.begin() as connection:
+        connection.execute(sa.text(
+            "CREATE TABLE stat_counters (kind VARCHAR(32) NOT NULL, key VARCHAR(255) NOT NULL,"
+            " value INTEGER NOT NULL, PRIMARY KEY (kind, key))"
+        ))
+        connection.execute(sa.text("INSERT INTO stat_counters VALUES ('total', 'users', 1)"))
+    migrator.upgrade("0004")
+    assert migrator.rows("SELECT kind, key, value FROM stat_counters") == [("total", "users", 1)]
+    assert migrator.rows("SELECT COUNT(*) FROM daily_active_users") == [(0,)]
@@ -0,0 +1,96 @@
+"""
+NewsSnapshot: условные запросы по ETag, ответ 304 и последний
+удачный снимок при ошибках NewsAPI.
+"""
+
+import types
+
+import pytest
+
+from services import news as news_module
+from services.news import NewsSnapshot
+
+ARTICLES = [{"title": f"Новость {i}", "url": f"https://news.test/{i}"} for i in range(7)]
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(news_module, "time", clock)
+    return clock
+
+
+class FakeNewsAPI:
+    """HTTP-клиент с методом get, отвечающий заранее заданными ответами."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.requests.append(dict(headers or {}))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        status, headers, data = response
+        return types.SimpleNamespace(status_code=status, headers=headers, json=lambda: data)
+
+
+def ok(articles=ARTICLES, etag='"v1"'):
+    return 200, {"ETag": etag, "Last-Modified": "Wed, 01 May 2024 07:00:00 GMT"}, {
+        "status": "ok",
+        "articles": articles,
+    }
+
+
+def test_snapshot_keeps_limit_and_renders_text(clock):
+    snapshot = NewsSnapshot("key", limit=5, http=FakeNewsAPI(ok()))
+    assert snapshot.refresh()
+    assert len(snapshot.articles) == 5
+    assert snapshot.text.startswith("Новость 0")
+    assert "https://news.test/4" in snapshot.text
+    assert "Новость 5" not in snapshot.text
+
+
+def test_conditional_request_and_not_modified(clock):
+    api = FakeNewsAPI(ok(), (304, {}, None))
+    snapshot = NewsSnapshot("key", http=api)
+    snapshot.refresh()
+    text = snapshot.text
+
+    assert snapshot.refresh()
+    assert api.requests == [
+        {},
+        {"If-None-Match": '"v1"', "If-Modified-Since": "Wed, 01 May 2024 07:00:00 GMT"},
+    ]
+    assert snapshot.text == text
+    assert snapshot.stats()["not_modified"] == 1
+
+
+def test_errors_keep_last_snapshot(clock):
+    api = FakeNewsAPI(
+        ok(),
+        ConnectionError("network down"),
+        (429, {}, {"status": "error", "message": "rate limited"}),
+        ok(articles=[]),
+    )
+    snapshot = NewsSnapshot("key", http=api)
+    snapshot.refresh()
+    text = snapshot.text
+    for _ in range(3):
+        assert snapshot.refresh()
+    assert snapshot.text == text
+    assert snapshot.stats()["errors"] == 2
+
+
+def test_get_text_fetches_once_before_first_snapshot(clock):
+    api = FakeNewsAPI(ConnectionError("network down"), ok())
+    snapshot = NewsSnapshot("key", http=api)
+    # Первая загрузка не удалась; повтор — не раньше чем через 30 секунд
+    assert snapshot.get_text() is None
+    assert snapshot.get_text() is None
+    assert len(api.requests) == 1
+
+    clock.advance(31)
+    assert snapshot.get_text().startswith("Новость 0")
+    assert snapshot.get_text() is not None
+    assert len(api.requests) == 2
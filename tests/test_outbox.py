@@ -0,0 +1,134 @@
+"""
+Outbox: повтор после 429, объединение сообщений и порядок в чате.
+"""
+
+import threading
+import time
+import types
+
+import pytest
+
+from services import outbox as outbox_module
+from services.outbox import Outbox, retry_after
+from services.ratelimit import SendRateLimiter
+from services.render import MAX_MESSAGE_LENGTH
+
+
+class TooManyRequests(Exception):
+    """Ответ 429 в том виде, в каком его возвращает telebot."""
+
+    error_code = 429
+
+    def __init__(self, seconds):
+        super().__init__(f"Too Many Requests: retry after {seconds}")
+        self.result_json = {"ok": False, "parameters": {"retry_after": seconds}}
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Паузы Outbox записываются, а не выдерживаются."""
+    recorded = []
+
+    def sleep(seconds):
+        recorded.append(seconds)
+        time.sleep(min(seconds, 0.01))
+
+    monkeypatch.setattr(outbox_module, "time", types.SimpleNamespace(monotonic=time.monotonic, sleep=sleep))
+    return recorded
+
+
+def make_outbox(send, **kwargs):
+    # Без ограничения частоты: проверяется только логика очереди
+    return Outbox(send, rate_limiter=SendRateLimiter(global_rate=10000, per_chat_rate=10000), **kwargs)
+
+
+def test_retry_after():
+    assert retry_after(TooManyRequests(7)) == 7
+    assert retry_after(ValueError("boom")) is None
+
+
+def test_429_is_retried_after_server_pause(sleeps):
+    attempts = []
+
+    def send(chat_id, text, **kwargs):
+        attempts.append(text)
+        if len(attempts) == 1:
+            raise TooManyRequests(3)
+
+    outbox = make_outbox(send, num_workers=1)
+    outbox.start()
+    outbox.send(1, "прогноз")
+    outbox.stop(2)
+
+    assert attempts == ["прогноз", "прогноз"]
+    assert 3 in sleeps
+    stats = outbox.stats()
+    assert (stats["retries"], stats["sent"], stats["failed"]) == (1, 1, 0)
+
+
+def test_gives_up_after_max_retries(sleeps):
+    attempts = []
+
+    def send(chat_id, text, **kwargs):
+        attempts.append(text)
+        raise TooManyRequests(1)
+
+    outbox = make_outbox(send, num_workers=1, max_retries=2)
+    outbox.start()
+    outbox.send(1, "прогноз")
+    outbox.stop(2)
+
+    assert len(attempts) == 3
+    assert outbox.stats()["failed"] == 1
+
+
+def test_other_errors_are_not_retried(sleeps):
+    attempts = []
+
+    def send(chat_id, text, **kwargs):
+        attempts.append(text)
+        raise ConnectionError("network down")
+
+    outbox = make_outbox(send, num_workers=1)
+    outbox.start()
+    outbox.send(1, "прогноз")
+    outbox.stop(2)
+
+    assert len(attempts) == 1
+    assert outbox.stats()["retries"] == 0
+
+
+def test_pending_messages_to_one_chat_are_coalesced():
+    sent = []
+    entered = threading.Event()
+    gate = threading.Event()
+
+    def send(chat_id, text, **kwargs):
+        entered.set()
+        gate.wait(2)
+        sent.append((chat_id, text))
+
+    outbox = make_outbox(send, num_workers=1)
+    outbox.start()
+    # Первое сообщение задерживает поток, остальные копятся и уходят одним
+    outbox.send(1, "первое")
+    entered.wait(2)
+    for text in ("второе", "третье"):
+        outbox.send(1, text)
+    gate.set()
+    outbox.stop(2)
+
+    assert sent == [(1, "первое"), (1, "второе\n\nтретье")]
+    assert outbox.stats()["coalesced"] == 1
+
+
+def test_long_text_is_split_and_order_is_kept():
+    sent = []
+    outbox = make_outbox(lambda chat_id, text, **kwargs: sent.append(text), num_workers=2)
+    text = "\n\n".join(f"абзац {i} " + "x" * 1000 for i in range(10))
+    outbox.send(1, text)
+    outbox.start()
+    outbox.stop(2)
+
+    assert all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in sent)
+    assert "\n\n".join(sent) == text
@@ -0,0 +1,78 @@
+"""
+Тексты ответов: шаблоны, даты без locale и разбиение длинных сообщений.
+"""
+
+import locale
+
+import pytest
+
+from services.render import (
+    format_datetime,
+    render_events,
+    render_news,
+    render_weather,
+    split_message,
+)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2024-05-01T19:30:00+03:00", "01.05.2024, 19:30"),
+        ("2024-05-01 09:05", "01.05.2024, 09:05"),
+        ("2024-05-01", "01.05.2024, 00:00"),
+        ("Дата неизвестна", "Дата неизвестна"),
+        (None, None),
+    ],
+)
+def test_format_datetime(value, expected):
+    assert format_datetime(value) == expected
+
+
+def test_format_datetime_ignores_locale():
+    previous = locale.setlocale(locale.LC_TIME)
+    try:
+        locale.setlocale(locale.LC_TIME, "C")
+        assert format_datetime("2024-12-31T23:59") == "31.12.2024, 23:59"
+    finally:
+        locale.setlocale(locale.LC_TIME, previous)
+
+
+def test_render_weather():
+    data = {
+        "main": {"temp": 21.6, "humidity": 40},
+        "weather": [{"description": "ясно"}],
+        "wind": {"speed": 3.4},
+    }
+    assert render_weather("Москва", data) == (
+        "Погода в городе Москва:\nЯсно\nТемпература: 22°C\nВлажность: 40%\nВетер: 3 м/с"
+    )
+
+
+def test_render_news_and_events():
+    assert render_news([{"title": "Заголовок", "url": "https://n.test/1"}, {}]) == (
+        "Заголовок\nhttps://n.test/1\n\nБез заголовка\n"
+    )
+    events = [
+        {
+            "name": "Концерт &amp; лекция",
+            "starts_at": "2024-05-01T19:00:00+0300",
+            "location": {"city": "Москва", "address": "Тверская, 1"},
+            "url": "https://e.test/1",
+        },
+        {"name": "Онлайн", "starts_at": "2024-05-02T10:00:00+0300", "location": {}, "url": "https://e.test/2"},
+    ]
+    assert render_events(events) == (
+        "Концерт & лекция (Москва, Тверская, 1)\nДата: 01.05.2024, 19:00\nhttps://e.test/1\n\n"
+        "Онлайн\nДата: 02.05.2024, 10:00\nhttps://e.test/2"
+    )
+
+
+def test_split_message_prefers_paragraphs_then_lines():
+    assert split_message("короткий") == ["короткий"]
+
+    text = "a" * 6 + "\n\n" + "b" * 6 + "\n" + "c" * 5
+    assert split_message(text, limit=10) == ["a" * 6, "b" * 6, "c" * 5]
+
+    # Без переводов строки режется по лимиту
+    assert split_message("x" * 25, limit=10) == ["x" * 10, "x" * 10, "x" * 5]
@@ -0,0 +1,74 @@
+"""
+Сворачивание старых логов в дневные агрегаты по сроку хранения.
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from database.models import DailyActiveUser, Log, LogDailyStat, User
+from database.retention import LogRetentionJob, rollup_logs
+
+NOW = datetime(2024, 6, 10, 12, 0)
+
+
+def add_logs(engine, logs: list[tuple[int, str, datetime]]):
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"id": user_id, "telegram_id": 1000 + user_id, "name": "Анна", "registered_at": datetime(2024, 5, 1)}
+            for user_id in sorted({user_id for user_id, _, _ in logs})
+        ])
+        connection.execute(insert(Log), [
+            {"user_id": user_id, "command": command, "timestamp": timestamp}
+            for user_id, command, timestamp in logs
+        ])
+
+
+def test_rollup_whole_days_before_cutoff(engine, session_factory):
+    add_logs(engine, [
+        (1, "/weather Москва", datetime(2024, 6, 1, 8, 0)),
+        (1, "/weather Москва", datetime(2024, 6, 1, 23, 59)),
+        (2, "/news", datetime(2024, 6, 1, 10, 0)),
+        (1, "/news", datetime(2024, 6, 2, 0, 0)),
+        # Срок хранения 7 дней: граница — начало 03.06 (целые сутки по UTC)
+        (1, "/news", datetime(2024, 6, 3, 0, 0)),
+        (2, "/events", datetime(2024, 6, 10, 9, 0)),
+    ])
+    with session_factory() as db:
+        db.add(DailyActiveUser(day=date(2024, 6, 1), user_id=1))
+        db.add(DailyActiveUser(day=date(2024, 6, 3), user_id=1))
+        db.commit()
+
+        assert rollup_logs(db, retention_days=7, now=NOW) == 4
+
+        assert db.execute(select(Log.timestamp).order_by(Log.timestamp)).scalars().all() == [
+            datetime(2024, 6, 3, 0, 0),
+            datetime(2024, 6, 10, 9, 0),
+        ]
+        stats = db.execute(
+            select(LogDailyStat.day, LogDailyStat.user_id, LogDailyStat.command, LogDailyStat.count)
+            .order_by(LogDailyStat.day, LogDailyStat.user_id, LogDailyStat.command)
+        ).all()
+        assert [tuple(row) for row in stats] == [
+            (date(2024, 6, 1), 1, "/weather Москва", 2),
+            (date(2024, 6, 1), 2, "/news", 1),
+            (date(2024, 6, 2), 1, "/news", 1),
+        ]
+        assert db.execute(select(DailyActiveUser.day)).scalars().all() == [date(2024, 6, 3)]
+
+
+def test_rollup_adds_to_existing_aggregates(engine, session_factory):
+    add_logs(engine, [(1, "/news", datetime(2024, 6, 1, 8, 0))])
+    with session_factory() as db:
+        db.add(LogDailyStat(day=date(2024, 6, 1), user_id=1, command="/news", count=5))
+        db.commit()
+        rollup_logs(db, retention_days=7, now=NOW)
+        assert db.get(LogDailyStat, (date(2024, 6, 1), 1, "/news")).count == 6
+
+
+def test_job_counts_deleted_logs(engine, session_factory):
+    add_logs(engine, [(1, "/news", datetime.utcnow() - timedelta(days=100))])
+    job = LogRetentionJob(session_factory, retention_days=90)
+    job.run()
+    job.run()
+    assert (job.runs, job.deleted) == (2, 1)
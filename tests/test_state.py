@@ -0,0 +1,121 @@
+"""
+Общее состояние: хранилище в памяти, аренда лидера и отсев
+повторных update_id через общее хранилище.
+"""
+
+import pytest
+
+from services import state
+from services.state import LeaderLease, MemoryBackend, create_backend
+from services.webhook import UpdateDeduplicator
+
+
+@pytest.fixture
+def backend(clock, monkeypatch):
+    monkeypatch.setattr(state, "time", clock)
+    return MemoryBackend()
+
+
+def test_memory_backend_expires_keys(backend, clock):
+    assert backend.add("key", "a", ttl=10)
+    assert not backend.add("key", "b", ttl=10)
+    assert backend.incr("counter", 2, ttl=5) == 2
+
+    clock.advance(10)
+    assert backend.get("key") is None
+    assert backend.get("counter") is None
+    assert backend.add("key", "b")
+
+
+def test_renew_and_release_only_by_owner(backend):
+    backend.add("lease", "node-1", ttl=10)
+    assert not backend.renew("lease", "node-2", 10)
+    assert not backend.release("lease", "node-2")
+    assert backend.renew("lease", "node-1", 10)
+    assert backend.release("lease", "node-1")
+    assert backend.get("lease") is None
+
+
+def test_create_backend():
+    assert isinstance(create_backend(None), MemoryBackend)
+    assert isinstance(create_backend("memory"), MemoryBackend)
+    with pytest.raises(ValueError):
+        create_backend("mysql://localhost")
+
+
+def test_lease_is_held_by_one_node(backend, clock):
+    events = []
+    first = LeaderLease(backend, ttl=30, node_id="node-1",
+                        on_acquire=lambda: events.append("acquire"),
+                        on_release=lambda: events.append("release"))
+    second = LeaderLease(backend, ttl=30, node_id="node-2")
+
+    assert first.tick()
+    assert not second.tick()
+    # Продление сдвигает срок аренды
+    clock.advance(20)
+    assert first.tick()
+    clock.advance(20)
+    assert not second.tick()
+    assert first.stats() == {"leader": True, "acquired": 1, "lost": 0}
+    assert events == ["acquire"]
+
+
+def test_lease_is_lost_when_it_expires(backend, clock):
+    first = LeaderLease(backend, ttl=30, node_id="node-1")
+    second = LeaderLease(backend, ttl=30, node_id="node-2")
+    first.tick()
+
+    # Первый узел не продлевал аренду дольше ttl, ее захватил второй
+    clock.advance(31)
+    assert second.tick()
+    assert not first.tick()
+    assert first.stats() == {"leader": False, "acquired": 1, "lost": 1}
+
+
+def test_lease_is_lost_when_backend_fails(backend):
+    lease = LeaderLease(backend, node_id="node-1")
+    lease.tick()
+
+    def broken(*args):
+        raise ConnectionError("down")
+
+    backend.renew = broken
+    assert not lease.tick()
+    assert not lease.is_leader
+
+
+def test_stop_releases_the_lease(backend):
+    released = []
+    first = LeaderLease(backend, ttl=30, node_id="node-1", on_release=lambda: released.append(1))
+    second = LeaderLease(backend, ttl=30, node_id="node-2")
+    first.start()
+    assert first.wait_leader(1)
+    first.stop()
+
+    assert released == [1]
+    assert not first.is_leader
+    # Другой узел подхватывает аренду, не дожидаясь истечения ttl
+    assert second.tick()
+
+
+def test_deduplicator_shares_update_ids(backend, clock):
+    first = UpdateDeduplicator(backend=backend, ttl=60)
+    second = UpdateDeduplicator(backend=backend, ttl=60)
+    assert first.add(1)
+    assert not second.add(1)
+
+    second.discard(1)
+    assert second.add(1)
+    clock.advance(60)
+    assert first.add(1)
+
+
+def test_deduplicator_accepts_updates_when_backend_fails():
+    class BrokenBackend:
+        def add(self, *args):
+            raise ConnectionError("down")
+
+    dedup = UpdateDeduplicator(backend=BrokenBackend())
+    assert dedup.add(1)
+    assert dedup.add(1)
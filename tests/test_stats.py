@@ -0,0 +1,56 @@
+"""
+Накопительная статистика: разбор команд, счетчики пачек логов
+и активные пользователи по дням.
+"""
+
+from datetime import date, datetime
+
+from database.crud import create_logs_bulk, upsert_user
+from database.stats import parse_command, read_stats
+
+
+def test_parse_command():
+    assert parse_command("/weather Москва (город не найден)") == ("/weather", "москва")
+    assert parse_command("/events  Питер") == ("/events", "санкт-петербург")
+    assert parse_command("/weather (без города)") == ("/weather", None)
+    assert parse_command("/news") == ("/news", None)
+
+
+def record(user_id: int, command: str, day: int, hour: int = 12) -> dict:
+    return {"user_id": user_id, "command": command, "timestamp": datetime(2024, 5, day, hour)}
+
+
+def test_counters_follow_log_batches(session_factory):
+    with session_factory() as db:
+        anna = upsert_user(db, 100, "Анна").id
+        boris = upsert_user(db, 200, "Борис").id
+        db.commit()
+
+        create_logs_bulk(db, [
+            record(anna, "/weather Москва", 1),
+            record(anna, "/weather мск", 1),
+            record(boris, "/news", 1),
+            record(boris, "/events Казань", 2),
+        ])
+        # Вторая пачка того же дня: Анна уже учтена как активная
+        create_logs_bulk(db, [record(anna, "/news", 2, 8), record(anna, "/news", 2, 9)])
+
+        stats = read_stats(db, days=3, today=date(2024, 5, 3))
+
+    assert stats["users_total"] == 2
+    assert stats["logs_total"] == 6
+    assert stats["commands"] == {"/weather": 2, "/news": 3, "/events": 1}
+    assert stats["active_users"] == {"2024-05-03": 0, "2024-05-02": 2, "2024-05-01": 2}
+    assert stats["top_cities"] == {"москва": 2, "казань": 1}
+
+
+def test_empty_database(session_factory):
+    with session_factory() as db:
+        stats = read_stats(db, days=1, today=date(2024, 5, 1))
+    assert stats == {
+        "users_total": 0,
+        "logs_total": 0,
+        "commands": {},
+        "active_users": {"2024-05-01": 0},
+        "top_cities": {},
+    }
@@ -0,0 +1,85 @@
+"""
+Расписание подписок: next_run_at для hourly, daily и weekly,
+в том числе при переводе часов.
+"""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from services.subscriptions import SubscriptionSpec, next_run_at, parse_subscription_settings
+
+MOSCOW = ZoneInfo("Europe/Moscow")
+# Переход на летнее время 31.03.2024 в 01:00 UTC, на зимнее — 27.10.2024 в 01:00 UTC
+BERLIN = ZoneInfo("Europe/Berlin")
+
+
+def spec(frequency, time):
+    return SubscriptionSpec("news", None, frequency, time)
+
+
+@pytest.mark.parametrize(
+    "after, expected",
+    [
+        # 10:00 MSK — сегодняшние 09:00 уже прошли
+        (datetime(2024, 5, 1, 7, 0), datetime(2024, 5, 2, 6, 0)),
+        (datetime(2024, 5, 1, 5, 59), datetime(2024, 5, 1, 6, 0)),
+        # Строго позже after
+        (datetime(2024, 5, 1, 6, 0), datetime(2024, 5, 2, 6, 0)),
+    ],
+)
+def test_daily(after, expected):
+    assert next_run_at(spec("daily", "09:00"), after, MOSCOW) == expected
+
+
+def test_daily_keeps_local_time_across_dst():
+    # 09:00 в Берлине: 08:00 UTC зимой, 07:00 UTC летом
+    assert next_run_at(spec("daily", "09:00"), datetime(2024, 3, 30, 8, 0), BERLIN) == datetime(2024, 3, 31, 7, 0)
+    assert next_run_at(spec("daily", "09:00"), datetime(2024, 10, 26, 7, 0), BERLIN) == datetime(2024, 10, 27, 8, 0)
+
+
+def test_weekly_runs_on_monday():
+    # 01.05.2024 — среда, ближайший понедельник — 06.05
+    assert next_run_at(spec("weekly", "09:00"), datetime(2024, 5, 1, 7, 0), MOSCOW) == datetime(2024, 5, 6, 6, 0)
+    # В понедельник до времени отправки — в тот же день, после — через неделю
+    assert next_run_at(spec("weekly", "09:00"), datetime(2024, 5, 6, 5, 0), MOSCOW) == datetime(2024, 5, 6, 6, 0)
+    assert next_run_at(spec("weekly", "09:00"), datetime(2024, 5, 6, 6, 0), MOSCOW) == datetime(2024, 5, 13, 6, 0)
+
+
+def test_weekly_across_dst():
+    # Понедельник 25.03 — еще зимнее время, 01.04 — уже летнее
+    assert next_run_at(spec("weekly", "09:00"), datetime(2024, 3, 25, 8, 0), BERLIN) == datetime(2024, 4, 1, 7, 0)
+
+
+def test_hourly():
+    assert next_run_at(spec("hourly", "00:15"), datetime(2024, 5, 1, 7, 20), MOSCOW) == datetime(2024, 5, 1, 8, 15)
+    assert next_run_at(spec("hourly", "00:15"), datetime(2024, 5, 1, 7, 10), MOSCOW) == datetime(2024, 5, 1, 7, 15)
+
+
+@pytest.mark.parametrize(
+    "after",
+    [
+        datetime(2024, 3, 30, 23, 45),  # переход на летнее время
+        datetime(2024, 10, 26, 23, 45),  # переход на зимнее время
+    ],
+)
+def test_hourly_runs_every_hour_across_dst(after):
+    runs = []
+    for _ in range(4):
+        after = next_run_at(spec("hourly", "00:30"), after, BERLIN)
+        runs.append(after)
+    day = runs[0].date()
+    assert runs == [datetime(day.year, day.month, day.day, hour, 30) for hour in range(4)]
+
+
+def test_parse_subscription_settings():
+    assert parse_subscription_settings("weather Москва daily 08:00; events weekly") == [
+        SubscriptionSpec("weather", "Москва", "daily", "08:00"),
+        SubscriptionSpec("events", None, "weekly", "09:00"),
+    ]
+    assert parse_subscription_settings('{"kind": "news", "frequency": "hourly", "time": "0:05"}') == [
+        SubscriptionSpec("news", None, "hourly", "00:05"),
+    ]
+    # Погода без города и неизвестный тип отбрасываются
+    assert parse_subscription_settings("weather daily; sports daily") == []
@@ -0,0 +1,109 @@
+"""
+UserRateLimiter: ведра токенов по (пользователь, команда),
+пополнение, ответ один раз и вытеснение ведер.
+"""
+
+import types
+
+import pytest
+from telebot.handler_backends import CancelUpdate
+
+from services import throttle as throttle_module
+from services.throttle import Limit, ThrottleMiddleware, UserRateLimiter, message_command, parse_limits
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(throttle_module, "time", clock)
+    return clock
+
+
+def limiter(max_size=100):
+    return UserRateLimiter({"weather": Limit(3, 60), "default": Limit(30, 60)}, max_size=max_size)
+
+
+def test_parse_limits():
+    limits = parse_limits("weather=5/30, /news=2")
+    assert limits["weather"] == Limit(5, 30)
+    assert limits["news"] == Limit(2, 60)
+    # Остальное — по умолчанию
+    assert limits["default"] == Limit(30, 60)
+    assert parse_limits(None)["events"] == Limit(10, 60)
+
+
+def test_message_command():
+    message = types.SimpleNamespace
+    assert message_command(message(text="/Weather@InfoBot Москва")) == "weather"
+    assert message_command(message(text="привет")) is None
+    assert message_command(message(text=None)) is None
+
+
+def test_burst_then_reject_with_single_notice(clock):
+    users = limiter()
+    assert [users.hit(1, "weather") for _ in range(3)] == [None] * 3
+
+    first = users.hit(1, "weather")
+    second = users.hit(1, "weather")
+    assert first.notify and not second.notify
+    # Токен пополняется за 60 / 3 = 20 секунд
+    assert first.retry_after == pytest.approx(20)
+
+    # Другая команда и другой пользователь — свои ведра
+    assert users.hit(1, "news") is None
+    assert users.hit(2, "weather") is None
+
+
+def test_refill(clock):
+    users = limiter()
+    for _ in range(3):
+        users.hit(1, "weather")
+    assert users.hit(1, "weather") is not None
+
+    clock.advance(20)
+    assert users.hit(1, "weather") is None
+    # После разрешенной команды об отказе сообщается снова
+    assert users.hit(1, "weather").notify
+
+    # Ведро не копит больше count токенов
+    clock.advance(600)
+    assert [users.hit(1, "weather") is None for _ in range(4)] == [True, True, True, False]
+
+
+def test_idle_buckets_are_evicted(clock):
+    users = limiter()
+    users.hit(1, "weather")
+    users.hit(2, "weather")
+    clock.advance(61)
+    users.hit(3, "weather")
+    assert users.stats()["buckets"] == 1
+    assert users.stats()["evicted"] == 2
+
+
+def test_max_size_evicts_least_recently_used(clock):
+    users = limiter(max_size=2)
+    for _ in range(3):
+        users.hit(1, "weather")
+    users.hit(2, "weather")
+    users.hit(3, "weather")
+    assert users.stats() == {"buckets": 2, "allowed": 5, "rejected": 0, "evicted": 1}
+    # Вытесненное ведро пользователя 1 создается заново полным
+    assert users.hit(1, "weather") is None
+
+
+def test_middleware_cancels_and_replies_once(clock):
+    replies = []
+    middleware = ThrottleMiddleware(limiter(), lambda chat_id, text: replies.append((chat_id, text)))
+
+    def message(text):
+        return types.SimpleNamespace(
+            text=text,
+            from_user=types.SimpleNamespace(id=7),
+            chat=types.SimpleNamespace(id=70),
+        )
+
+    results = [middleware.pre_process(message("/weather Москва"), {}) for _ in range(5)]
+    assert results[:3] == [None] * 3
+    assert all(isinstance(result, CancelUpdate) for result in results[3:])
+    assert replies == [(70, "Слишком много запросов. Попробуйте через 20 с.")]
+    # Не команды не ограничиваются
+    assert middleware.pre_process(message("привет"), {}) is None
@@ -0,0 +1,57 @@
+"""
+UserCache: LRU-вытеснение, счетчики и сброс при изменении пользователя.
+"""
+
+import pytest
+
+from database.crud import get_or_create_user_cached, update_user_subscription
+from database.user_cache import CachedUser, UserCache, user_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_user_cache():
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+
+def test_lru_eviction_and_stats():
+    cache = UserCache(max_size=2)
+    cache.put(100, CachedUser(1, "Анна"))
+    cache.put(200, CachedUser(2, "Борис"))
+    assert cache.get(100) == CachedUser(1, "Анна")
+    cache.put(300, CachedUser(3, "Вера"))
+
+    # Вытеснен давно не использованный 200, а не 100
+    assert cache.get(200) is None
+    assert cache.get(100) is not None
+    assert cache.stats() == {"size": 2, "hits": 2, "misses": 1}
+
+    # Для вытесненного пользователя сброс по id ничего не делает
+    cache.invalidate_user_id(2)
+    assert cache.stats()["size"] == 2
+
+
+def test_returning_user_needs_no_queries(session_factory):
+    db = session_factory()
+    user = get_or_create_user_cached(db, 100, "Анна")
+    db.commit()
+    db.close()
+
+    queries = []
+    db = session_factory()
+    db.execute = lambda *args, **kwargs: queries.append(args)
+    assert get_or_create_user_cached(db, 100, "Анна") == user
+    assert queries == []
+    db.close()
+
+
+def test_subscription_update_invalidates_cached_user(session_factory):
+    db = session_factory()
+    user = get_or_create_user_cached(db, 100, "Анна")
+    db.commit()
+    assert user_cache.get(100) is not None
+
+    update_user_subscription(db, user.id, "news daily")
+    db.close()
+    assert user_cache.get(100) is None
@@ -0,0 +1,71 @@
+"""
+BulkWeatherFetcher: /group по идентификаторам, /find по квадратам
+координат и сопоставление ответа с городами.
+"""
+
+import types
+
+from services.city_index import City
+from services.weather import GROUP_LIMIT, BulkWeatherFetcher
+
+
+def city(city_id: int, lat: float, lon: float) -> City:
+    return City(city_id, f"city-{city_id}", "", "RU", lat, lon, 100000)
+
+
+class FakeOpenWeatherMap:
+    """Клиент с методом get: /group знает только known_ids, /find — items."""
+
+    def __init__(self, known_ids=(), items=(), fail=False):
+        self.known_ids = set(known_ids)
+        self.items = list(items)
+        self.fail = fail
+        self.calls = []
+
+    def get(self, url, params):
+        self.calls.append((url.rsplit("/", 1)[1], params))
+        if self.fail:
+            return types.SimpleNamespace(status_code=503)
+        if url.endswith("/group"):
+            ids = map(int, params["id"].split(","))
+            data = {"list": [{"id": i, "main": {"temp": i}} for i in ids if i in self.known_ids]}
+        else:
+            data = {"list": self.items}
+        return types.SimpleNamespace(status_code=200, json=lambda: data)
+
+
+def test_group_requests_are_batched():
+    cities = [city(i, 55.0, 37.0) for i in range(1, 46)]
+    api = FakeOpenWeatherMap(known_ids=range(1, 46))
+    results = BulkWeatherFetcher(api, "key").fetch(cities)
+
+    assert [name for name, _ in api.calls] == ["group"] * 3
+    assert len(api.calls[0][1]["id"].split(",")) == GROUP_LIMIT
+    assert results[7] == {"id": 7, "main": {"temp": 7}, "cod": 200}
+    assert len(results) == 45
+
+
+def test_missing_cities_are_tiled_and_matched_by_coordinates():
+    # 1 есть в /group, 2 и 3 — в одном квадрате, 4 — в другом
+    cities = [city(1, 55.75, 37.61), city(2, 55.1, 37.2), city(3, 55.9, 37.8), city(4, 59.9, 30.3)]
+    items = [
+        {"id": 3, "coord": {"lat": 50.0, "lon": 30.0}},  # совпадает по id
+        {"id": 902, "coord": {"lat": 55.15, "lon": 37.2}},  # ближе 0.1° к городу 2
+        {"id": 904, "coord": {"lat": 60.5, "lon": 30.3}},  # слишком далеко от города 4
+    ]
+    api = FakeOpenWeatherMap(known_ids=[1], items=items)
+    fetcher = BulkWeatherFetcher(api, "key", tile_size=1.0, match_distance=0.1)
+    results = fetcher.fetch(cities)
+
+    assert [name for name, _ in api.calls] == ["group", "find", "find"]
+    # Запрос /find — из центра городов квадрата
+    assert (api.calls[1][1]["lat"], api.calls[1][1]["lon"]) == (55.5, 37.5)
+    assert {city_id: item["id"] for city_id, item in results.items()} == {1: 1, 2: 902, 3: 3}
+    assert fetcher.stats() == {"requests": 3, "errors": 0, "fetched": 3}
+
+
+def test_errors_leave_cities_for_single_requests():
+    api = FakeOpenWeatherMap(fail=True)
+    fetcher = BulkWeatherFetcher(api, "key")
+    assert fetcher.fetch([city(1, 55.75, 37.61)]) == {}
+    assert fetcher.stats()["errors"] == 2
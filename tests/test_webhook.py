@@ -0,0 +1,86 @@
+"""
+WebhookServer: проверка секретного токена, отсев повторов
+и ответ 503 при переполненной очереди.
+"""
+
+import urllib.request
+
+import pytest
+
+from fake_telegram import make_update, post_update
+from services.webhook import SECRET_HEADER, UpdateDeduplicator, WebhookServer
+
+SECRET = "s3cret"
+
+
+class FakeBot:
+    def __init__(self):
+        self.submitted = []
+        self.accept = True
+
+    def submit_update(self, update) -> bool:
+        if self.accept:
+            self.submitted.append(update.update_id)
+        return self.accept
+
+
+@pytest.fixture
+def server():
+    bot = FakeBot()
+    server = WebhookServer(bot, SECRET, host="127.0.0.1", port=0)
+    server.start()
+    server.url = f"http://127.0.0.1:{server.port}/webhook"
+    yield server
+    server.shutdown()
+
+
+def test_secret_is_required():
+    with pytest.raises(ValueError):
+        WebhookServer(FakeBot(), "", host="127.0.0.1", port=0)
+
+
+def test_wrong_or_missing_secret_is_rejected(server):
+    assert post_update(server.url, make_update(1, 7, "/news")) == 403
+    assert post_update(server.url, make_update(1, 7, "/news"), secret="wrong") == 403
+    # Заголовок не в ASCII — тоже 403, а не ошибка сервера
+    request = urllib.request.Request(server.url, data=b"{}", method="POST", headers={SECRET_HEADER: "сек".encode()})
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request, timeout=5)
+    assert error.value.code == 403
+
+    assert server.bot.submitted == []
+    assert server.stats()["rejected"] == 3
+
+
+def test_duplicates_are_acknowledged_once(server):
+    for update_id in (1, 2, 1):
+        assert post_update(server.url, make_update(update_id, 7, "/news"), secret=SECRET) == 200
+    assert server.bot.submitted == [1, 2]
+    assert server.stats()["duplicates"] == 1
+
+
+def test_full_queue_returns_503_and_allows_redelivery(server):
+    server.bot.accept = False
+    assert post_update(server.url, make_update(5, 7, "/news"), secret=SECRET) == 503
+    # Telegram доставит обновление повторно — оно не должно считаться дубликатом
+    server.bot.accept = True
+    assert post_update(server.url, make_update(5, 7, "/news"), secret=SECRET) == 200
+    assert server.bot.submitted == [5]
+    assert server.stats()["shed"] == 1
+
+
+def test_bad_body_and_unknown_path(server):
+    request = urllib.request.Request(server.url, data=b"not json", method="POST", headers={SECRET_HEADER: SECRET})
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request, timeout=5)
+    assert error.value.code == 400
+    assert post_update(server.url.replace("/webhook", "/other"), make_update(1, 7, "/news"), secret=SECRET) == 404
+
+
+def test_deduplicator_forgets_oldest_ids():
+    dedup = UpdateDeduplicator(max_size=2)
+    assert [dedup.add(update_id) for update_id in (1, 2, 1, 3)] == [True, True, False, True]
+    # 1 вытеснен
+    assert dedup.add(1)
+    dedup.discard(1)
+    assert dedup.add(1)
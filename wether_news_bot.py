@@ -1,18 +1,38 @@
 """
 Информационный бот: погода, новости, события.
+
+Импорт модуля только читает настройки; клиент Telegram, кэши, очереди
+и фоновые задачи создаются фабрикой create_app(). Запуск: python wether_news_bot.py
 """
 
-import html
-import locale
 import os
+import time
 from datetime import datetime
 
-import requests
-import telebot
 from dotenv import load_dotenv
 
-from database.config import get_db
-from database.crud import get_or_create_user, create_log
+from database.config import SessionLocal, get_engine
+from database.crud import get_or_create_user_cached
+from database.log_writer import LogWriter
+from database.middleware import SessionMiddleware, after_commit
+from database.retention import LogRetentionJob
+from services.cache import StaleWhileRevalidateCache
+from services.city_index import City, CityIndex
+from services.cities import normalize_city
+from services.dispatcher import DispatchingTeleBot
+from services.events import EventsPrefetcher
+from services.http import RETRY_STATUSES, UpstreamClient
+from services.metrics import MetricsServer, instrument, instrument_engine, log_error, registry
+from services.news import NewsSnapshot
+from services.outbox import Outbox
+from services.ratelimit import SendRateLimiter, SharedSendRateLimiter
+from services.render import HELP_TEXT, START_TEXT, render_events, render_weather
+from services.scheduler import leader_scheduler, scheduler, start_scheduler, shutdown_scheduler
+from services.state import LeaderLease, create_backend
+from services.subscriptions import SubscriptionScheduler
+from services.throttle import ThrottleMiddleware, UserRateLimiter, parse_limits
+from services.weather import BulkWeatherFetcher
+from services.webhook import UpdateDeduplicator, WebhookServer
 
 
 # -------------------------------------------------------------------
@@ -25,282 +45,666 @@ WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 EVENTS_API_KEY = os.getenv("EVENTS_API_KEY")
 
-if not TOKEN:
-    raise ValueError("TELEGRAM_BOT_TOKEN не найден в переменных окружения")
-
+# Адреса внешних API (переопределяются, например, для нагрузочных тестов)
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.openweathermap.org/data/2.5/weather")
+WEATHER_GROUP_API_URL = os.getenv("WEATHER_GROUP_API_URL", "https://api.openweathermap.org/data/2.5/group")
+WEATHER_FIND_API_URL = os.getenv("WEATHER_FIND_API_URL", "https://api.openweathermap.org/data/2.5/find")
+NEWS_API_URL = os.getenv("NEWS_API_URL", "https://newsapi.org/v2/top-headlines")
+EVENTS_API_URL = os.getenv("EVENTS_API_URL", "https://api.timepad.ru/v1/events/")
+
+# Кэш погоды: время жизни записи, допустимое устаревание и размер (в записях)
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_CACHE_MAX_STALE = int(os.getenv("WEATHER_CACHE_MAX_STALE", "3600"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1024"))
+
+# Кэш событий: время жизни готового сообщения, размер и число городов для прогрева
+EVENTS_CACHE_TTL = int(os.getenv("EVENTS_CACHE_TTL", "900"))
+EVENTS_CACHE_SIZE = int(os.getenv("EVENTS_CACHE_SIZE", "512"))
+EVENTS_PREFETCH_TOP = int(os.getenv("EVENTS_PREFETCH_TOP", "20"))
+
+# Пул обработчиков обновлений: число потоков и размер очереди каждого
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "8"))
+BOT_WORKER_QUEUE_SIZE = int(os.getenv("BOT_WORKER_QUEUE_SIZE", "100"))
+
+# Очередь исходящих сообщений: число потоков отправки и размер очереди
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_QUEUE_SIZE = int(os.getenv("OUTBOX_QUEUE_SIZE", "10000"))
+
+# Лимиты команд на пользователя: «команда=число/период в секундах» через запятую
+# (поверх лимитов по умолчанию, см. services/throttle.py) и число хранимых ведер
+THROTTLE_LIMITS = os.getenv("THROTTLE_LIMITS", "")
+THROTTLE_MAX_BUCKETS = int(os.getenv("THROTTLE_MAX_BUCKETS", "100000"))
+
+# Часовой пояс, в котором пользователи указывают время подписок
+SUBSCRIPTION_TIMEZONE = os.getenv("SUBSCRIPTION_TIMEZONE", "Europe/Moscow")
+
+# Пакетная запись логов: размер пачки, период сброса (в секундах), размер очереди
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Срок хранения сырых логов (в днях); более старые сворачиваются в дневные агрегаты
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "90"))
+
+# Период фонового обновления новостей (в секундах)
+NEWS_REFRESH_INTERVAL = int(os.getenv("NEWS_REFRESH_INTERVAL", "300"))
+
+# Внешние API: таймауты (в секундах), повторы при 5xx/429, размер пула соединений
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "10"))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_BACKOFF = float(os.getenv("UPSTREAM_BACKOFF", "0.5"))
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "20"))
+
+# Предохранитель внешних API: число ошибок подряд и пауза до пробного запроса
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+# Режим получения обновлений: polling (getUpdates) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Webhook: публичный адрес (если задан, регистрируется в Telegram при запуске),
+# секретный токен, адрес и путь локального HTTP-сервера
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+
+# Индекс городов GeoNames (python -m services.city_index); без файла
+# названия городов передаются во внешние API как есть
+CITY_INDEX_PATH = os.getenv("CITY_INDEX_PATH", "data/cities.idx")
+
+# Общее состояние нескольких процессов: memory (один процесс) или redis://host:port/db;
+# аренда лидера (в секундах) и имя узла (по умолчанию хост:PID)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", "30"))
+NODE_ID = os.getenv("NODE_ID")
+
+# Порт HTTP-сервера метрик Prometheus (GET /metrics); 0 — не запускать
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
 
-bot = telebot.TeleBot(TOKEN)
 
 
 # -------------------------------------------------------------------
 # Вспомогательные функции
 # -------------------------------------------------------------------
-def get_weather(city):
-    """Получить погоду по названию города через OpenWeatherMap API."""
-    url = (
-        f"https://api.openweathermap.org/data/2.5/weather?q={city}"
-        f"&appid={WEATHER_API_KEY}&units=metric&lang=ru"
+def upstream_client(name):
+    """HTTP-клиент внешнего API с общими настройками таймаутов и повторов."""
+    return UpstreamClient(
+        name,
+        connect_timeout=UPSTREAM_CONNECT_TIMEOUT,
+        read_timeout=UPSTREAM_READ_TIMEOUT,
+        retries=UPSTREAM_RETRIES,
+        backoff_factor=UPSTREAM_BACKOFF,
+        pool_size=UPSTREAM_POOL_SIZE,
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=BREAKER_RESET_TIMEOUT,
     )
-    response = requests.get(url)
-    return response.json()
-
-
-def get_news():
-    """Получить свежие новости через NewsAPI."""
-    url = f"https://newsapi.org/v2/top-headlines?country=us&apiKey={NEWS_API_KEY}"
-    response = requests.get(url)
-    return response.json().get("articles", [])
-
 
-def get_events(city=None):
-    """Получить список событий через TimePad API."""
-    url = "https://api.timepad.ru/v1/events/"
-    headers = {"Authorization": f"Bearer {EVENTS_API_KEY}"}
-    params = {
-        "sort": "date",            # сортировка по дате
-        "limit": 5,                # количество событий
-        "fields": "name,starts_at,description,url,location",
-        "is_deleted": False,
-        "is_confirmed": True,
-    }
-    if city:
-        params["cities"] = city
 
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        return response.json().get("values", [])
-
-    print(f"TimePad API error: {response.status_code} {response.text}")
-    return []
-
-
-def format_datetime(dt_str):
-    """Преобразовать ISO-дату в читаемый формат dd.mm.yyyy, HH:MM."""
+def load_city_index(path):
+    """Открыть индекс городов (None, если файла нет или он поврежден)."""
+    if not path or not os.path.exists(path):
+        print(f"Индекс городов {path} не найден, города не проверяются")
+        return None
     try:
-        dt = datetime.fromisoformat(dt_str)
-        return dt.strftime("%d.%m.%Y, %H:%M")
-    except Exception:
-        return dt_str
+        return CityIndex(path)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка при открытии индекса городов: {e}")
+        return None
 
 
 # -------------------------------------------------------------------
-# Настройка локали
+# Приложение бота
 # -------------------------------------------------------------------
-try:
-    locale.setlocale(locale.LC_TIME, "ru_RU.UTF-8")
-except locale.Error:
-    pass
+class InformationBot:
+    """Клиент Telegram, внешние API, кэши, очереди и фоновые задачи бота."""
+
+    def __init__(self, token: str):
+        # Общее состояние процессов: кэши, принятые update_id, лимиты отправки
+        # и аренда лидера. В памяти (по умолчанию) оно видно только этому процессу.
+        self.state = create_backend(STATE_BACKEND)
+        shared = self.state if self.state.shared else None
+
+        # Обновления одного чата обрабатываются по порядку, разных чатов — параллельно
+        self.bot = DispatchingTeleBot(
+            token,
+            num_workers=BOT_WORKERS,
+            queue_size=BOT_WORKER_QUEUE_SIZE,
+            use_class_middlewares=True,
+        )
 
+        # Команды сверх лимита отклоняются до открытия сессии БД и обращения к API
+        self.throttle = UserRateLimiter(parse_limits(THROTTLE_LIMITS), max_size=THROTTLE_MAX_BUCKETS)
+        self.bot.setup_middleware(
+            ThrottleMiddleware(self.throttle, lambda chat_id, text: self.outbox.send(chat_id, text))
+        )
 
-# -------------------------------------------------------------------
-# Обработчики команд
-# -------------------------------------------------------------------
-@bot.message_handler(commands=["start"])
-def start_handler(message):
-    """Команда /start — регистрация пользователя и приветствие."""
-    db = next(get_db())
-    try:
-        user = get_or_create_user(
-            db, message.from_user.id, message.from_user.first_name or "Пользователь"
+        # Одна сессия БД на обновление: обработчик получает ее аргументом db,
+        # вся работа фиксируется одним commit после обработчика
+        self.bot.setup_middleware(SessionMiddleware(SessionLocal))
+
+        # Повторно доставленные обновления отсекаются и в polling, и в webhook
+        self.dedup = UpdateDeduplicator(backend=shared)
+        self.bot.dedup = self.dedup
+
+        # Задачи по расписанию (рассылки, прогрев, очистка логов) выполняет
+        # только лидер; при потере аренды они приостанавливаются
+        self.lease = LeaderLease(
+            self.state,
+            ttl=LEADER_LEASE_TTL,
+            node_id=NODE_ID,
+            on_acquire=self.on_leadership_acquired,
+            on_release=self.on_leadership_lost,
         )
-        create_log(db, user.id, "/start")
 
-        bot.send_message(
-            message.chat.id,
-            f"Привет, {user.name}! Я твой информационный помощник. \n\n"
-            "Набери /help, чтобы узнать, что я умею.",
+        # Ответы отправляются фоновыми потоками с учетом лимитов Telegram:
+        # обработчик ставит сообщение в очередь и сразу возвращается
+        self.outbox = Outbox(
+            self.bot.send_message,
+            rate_limiter=SharedSendRateLimiter(shared) if shared else SendRateLimiter(),
+            num_workers=OUTBOX_WORKERS,
+            max_queue=OUTBOX_QUEUE_SIZE,
         )
-    except Exception as e:
-        print(f"Ошибка при обработке команды /start: {e}")
-        bot.send_message(
-            message.chat.id,
-            "Привет! Я твой информационный помощник. \n\n"
-            "Набери /help, чтобы узнать, что я умею.",
+
+        # Логи команд пишутся в БД пачками в фоновом потоке
+        self.log_writer = LogWriter(
+            SessionLocal,
+            batch_size=LOG_BATCH_SIZE,
+            flush_interval=LOG_FLUSH_INTERVAL,
+            max_queue=LOG_QUEUE_SIZE,
         )
-    finally:
-        db.close()
 
+        self.log_retention = LogRetentionJob(SessionLocal, retention_days=LOG_RETENTION_DAYS)
+
+        # Справочник городов: опечатки и синонимы сводятся к одному городу,
+        # неизвестные города отклоняются без запроса к внешним API
+        self.city_index = load_city_index(CITY_INDEX_PATH)
+
+        self.weather_api = upstream_client("openweathermap")
+        self.news_api = upstream_client("newsapi")
+        self.events_api = upstream_client("timepad")
+
+        # Погода кэшируется по городу из справочника (или по нормализованному
+        # названию без справочника): «москва», «Масква» и «Moscow» — одна запись.
+        # Ответы с ошибкой (город не найден и т.п.) не кэшируются;
+        # пока API недоступен, отдается последний известный прогноз.
+        self.weather_cache = StaleWhileRevalidateCache(
+            self.get_weather,
+            ttl=WEATHER_CACHE_TTL,
+            max_size=WEATHER_CACHE_SIZE,
+            max_stale=WEATHER_CACHE_MAX_STALE,
+            key_func=self.city_key,
+            cacheable=lambda data: data.get("cod") == 200,
+            shared=shared,
+            namespace="weather",
+        )
 
-@bot.message_handler(commands=["help"])
-def help_handler(message):
-    """Команда /help — список доступных команд."""
-    db = next(get_db())
-    try:
-        user = get_or_create_user(
-            db, message.from_user.id, message.from_user.first_name or "Пользователь"
+        # Погода для многих городов сразу (прогрев кэша, рассылка подписок):
+        # до 20 городов за запрос /group, остальные — квадратами координат через /find
+        self.bulk_weather = BulkWeatherFetcher(
+            self.weather_api,
+            WEATHER_API_KEY,
+            group_url=WEATHER_GROUP_API_URL,
+            find_url=WEATHER_FIND_API_URL,
         )
-        create_log(db, user.id, "/help")
-
-        bot.send_message(
-            message.chat.id,
-            "Доступные команды:\n"
-            "/start - запустить бота\n"
-            "/help - показать это меню\n"
-            "/weather - узнать погоду\n"
-            "/news - свежие новости\n"
-            "/events - события рядом",
+
+        # Новости одинаковы для всех пользователей: снимок обновляется
+        # планировщиком, а /news отвечает готовым текстом без сетевых запросов.
+        self.news_snapshot = NewsSnapshot(
+            NEWS_API_KEY,
+            limit=5,
+            timeout=self.news_api.timeout,
+            http=self.news_api,
+            url=NEWS_API_URL,
         )
-    except Exception as e:
-        print(f"Ошибка при обработке команды /help: {e}")
-        bot.send_message(
-            message.chat.id,
-            "Доступные команды:\n"
-            "/start - запустить бота\n"
-            "/help - показать это меню\n"
-            "/weather - узнать погоду\n"
-            "/news - свежие новости\n"
-            "/events - события рядом",
+
+        # События кэшируются уже отформатированным сообщением по городу
+        # (и отдельно без города); популярные города обновляются заранее.
+        self.events_cache = StaleWhileRevalidateCache(
+            self.get_events_message,
+            ttl=EVENTS_CACHE_TTL,
+            max_size=EVENTS_CACHE_SIZE,
+            max_stale=EVENTS_CACHE_TTL,
+            key_func=self.events_cache_key,
+            cacheable=lambda text: text is not None,
+            shared=shared,
+            namespace="events",
         )
-    finally:
-        db.close()
 
+        self.events_prefetcher = EventsPrefetcher(
+            SessionLocal,
+            self.events_cache,
+            top=EVENTS_PREFETCH_TOP,
+            is_known_city=lambda city: not self.is_unknown_city(city),
+        )
 
-@bot.message_handler(commands=["weather"])
-def weather_handler(message):
-    """Команда /weather — прогноз погоды для указанного города."""
-    db = next(get_db())
-    user = get_or_create_user(
-        db, message.from_user.id, message.from_user.first_name or "Пользователь"
-    )
+        # Рассылка подписок: содержимое запрашивается один раз на (тип, город),
+        # отправка укладывается в общие и поканальные лимиты Telegram.
+        self.subscription_scheduler = SubscriptionScheduler(
+            SessionLocal,
+            renderers={
+                "weather": self.render_weather_subscription,
+                "news": lambda city: self.news_snapshot.get_text(),
+                "events": self.events_cache.get,
+            },
+            send=lambda chat_id, text: self.outbox.send(chat_id, text, put_timeout=None),
+            timezone=SUBSCRIPTION_TIMEZONE,
+            prefetchers={"weather": self.warm_weather},
+        )
 
-    parts = message.text.split(maxsplit=1)
-    if len(parts) < 2:
-        bot.send_message(
-            message.chat.id, "Пожалуйста, укажите город. Пример: /weather Москва"
+        self.register_handlers()
+        self.register_metrics()
+
+    # ---------------------------------------------------------------
+    # Вспомогательные функции
+    # ---------------------------------------------------------------
+    def resolve_city(self, city: str) -> City | None:
+        """Город из справочника (None, если не найден или справочника нет)."""
+        return self.city_index.resolve(city) if self.city_index else None
+
+    def is_unknown_city(self, city: str) -> bool:
+        """Города нет в справочнике (без справочника любой город считается известным)."""
+        return self.city_index is not None and self.resolve_city(city) is None
+
+    def city_key(self, city: str):
+        """Ключ кэша по городу: geonameid или нормализованное название."""
+        resolved = self.resolve_city(city)
+        return resolved.id if resolved else normalize_city(city)
+
+    def events_cache_key(self, city):
+        """Ключ кэша событий: город или "" без города."""
+        return self.city_key(city) if city else ""
+
+    def get_weather(self, city):
+        """Получить погоду в городе через OpenWeatherMap API (по координатам, если город известен)."""
+        resolved = self.resolve_city(city)
+        location = {"lat": resolved.lat, "lon": resolved.lon} if resolved else {"q": city}
+        response = self.weather_api.get(
+            WEATHER_API_URL,
+            params={**location, "appid": WEATHER_API_KEY, "units": "metric", "lang": "ru"},
+        )
+        if response.status_code in RETRY_STATUSES:
+            response.raise_for_status()
+        return response.json()
+
+    def get_events(self, city=None):
+        """Получить список событий через TimePad API."""
+        url = EVENTS_API_URL
+        headers = {"Authorization": f"Bearer {EVENTS_API_KEY}"}
+        params = {
+            "sort": "date",            # сортировка по дате
+            "limit": 5,                # количество событий
+            "fields": "name,starts_at,description,url,location",
+            "is_deleted": False,
+            "is_confirmed": True,
+        }
+        if city:
+            resolved = self.resolve_city(city)
+            params["cities"] = resolved.display_name if resolved else city
+
+        response = self.events_api.get(url, headers=headers, params=params)
+        if response.status_code in RETRY_STATUSES:
+            response.raise_for_status()
+        if response.status_code == 200:
+            return response.json().get("values", [])
+
+        print(f"TimePad API error: {response.status_code} {response.text}")
+        return []
+
+    def get_events_message(self, city=None):
+        """Готовый текст сообщения о событиях (None, если событий нет)."""
+        events = self.get_events(city)
+        return render_events(events) if events else None
+
+    def warm_weather(self, cities, min_ttl=None):
+        """
+        Загрузить в кэш погоду для многих городов пакетными запросами.
+
+        Пропускаются неизвестные города и записи, которые останутся свежими
+        дольше min_ttl секунд (по умолчанию половина WEATHER_CACHE_TTL).
+        Без справочника городов ничего не делает. Возвращает число загруженных городов.
+        """
+        if self.city_index is None:
+            return 0
+        min_ttl = WEATHER_CACHE_TTL / 2 if min_ttl is None else min_ttl
+
+        names = {}
+        for city in cities:
+            resolved = self.resolve_city(city)
+            if resolved is None or resolved.id in names:
+                continue
+            expires_in = self.weather_cache.expires_in(city)
+            if expires_in is None or expires_in < min_ttl:
+                names[resolved.id] = (city, resolved)
+
+        results = self.bulk_weather.fetch(resolved for _, resolved in names.values())
+        for city_id, data in results.items():
+            self.weather_cache.put(names[city_id][0], data)
+        return len(results)
+
+    def render_weather_subscription(self, city):
+        """Текст уведомления о погоде (None, если город не найден)."""
+        if self.is_unknown_city(city):
+            return None
+        data = self.weather_cache.get(city)
+        if data.get("cod") != 200:
+            return None
+        resolved = self.resolve_city(city)
+        return render_weather(resolved.display_name if resolved else city, data)
+
+    def register_metrics(self):
+        """Метрики: время SQL-запросов и текущее состояние очередей, кэшей и API."""
+        instrument_engine(get_engine())
+        registry.gauge(
+            "bot_outbox_backlog",
+            "Сообщений в очереди отправки",
+            lambda: self.outbox.stats()["backlog"],
+        )
+        registry.gauge(
+            "bot_log_queue_depth",
+            "Логов в очереди записи",
+            lambda: self.log_writer.stats()["queue_depth"],
+        )
+        registry.gauge(
+            "bot_dispatcher_queue_depth",
+            "Обновлений в очередях обработчиков",
+            lambda: sum(self.bot.dispatcher.stats()["queue_depth"]),
+        )
+        registry.gauge(
+            "bot_cache_size",
+            "Записей в кэшах",
+            lambda: {
+                "weather": self.weather_cache.stats()["size"],
+                "events": self.events_cache.stats()["size"],
+            },
+            label="cache",
+        )
+        registry.gauge(
+            "bot_upstream_circuit_open",
+            "Предохранитель внешнего API разомкнут (1) или замкнут (0)",
+            lambda: {
+                api.name: int(api.breaker.state != "closed")
+                for api in (self.weather_api, self.news_api, self.events_api)
+            },
+            label="api",
+        )
+        registry.gauge(
+            "bot_leader",
+            "Процесс — лидер и выполняет задачи по расписанию (1) или нет (0)",
+            lambda: int(self.lease.is_leader),
         )
-        create_log(db, user.id, "/weather (без города)")
-        db.close()
-        return
 
-    city = parts[1]
-    data = get_weather(city)
+    # ---------------------------------------------------------------
+    # Обработчики команд
+    # ---------------------------------------------------------------
+    def log_command(self, db, user_id: int, command: str):
+        """
+        Записать команду в лог после фиксации транзакции обновления:
+        новый пользователь к этому моменту уже сохранен в БД.
+        """
+        timestamp = datetime.utcnow()
+        after_commit(db, lambda: self.log_writer.enqueue(user_id, command, timestamp))
+
+    def register_handlers(self):
+        """Зарегистрировать обработчики команд в клиенте Telegram."""
+        self.bot.register_message_handler(self.start_handler, commands=["start"])
+        self.bot.register_message_handler(self.help_handler, commands=["help"])
+        self.bot.register_message_handler(self.weather_handler, commands=["weather"])
+        self.bot.register_message_handler(self.news_handler, commands=["news"])
+        self.bot.register_message_handler(self.events_handler, commands=["events"])
+
+    @instrument("/start")
+    def start_handler(self, message, db):
+        """Команда /start — регистрация пользователя и приветствие."""
+        try:
+            user = get_or_create_user_cached(
+                db, message.from_user.id, message.from_user.first_name or "Пользователь"
+            )
+            self.log_command(db, user.id, "/start")
 
-    if data.get("cod") != 200:
-        bot.send_message(
-            message.chat.id, f"Город '{city}' не найден. Попробуйте еще раз."
-        )
-        create_log(db, user.id, f"/weather {city} (город не найден)")
-        db.close()
-        return
-
-    temp = round(data["main"]["temp"])
-    descr = data["weather"][0]["description"]
-    humidity = data["main"]["humidity"]
-    wind = round(data["wind"]["speed"])
-
-    msg = (
-        f"Погода в городе {city}:\n"
-        f"{descr.capitalize()}\n"
-        f"Температура: {temp}°C\n"
-        f"Влажность: {humidity}%\n"
-        f"Ветер: {wind} м/с"
-    )
-    bot.send_message(message.chat.id, msg)
-    create_log(db, user.id, f"/weather {city}")
-    db.close()
+            self.outbox.send(message.chat.id, START_TEXT.format(name=user.name))
+        except Exception as e:
+            log_error("Ошибка при обработке команды /start", e)
+            self.outbox.send(
+                message.chat.id,
+                "Привет! Я твой информационный помощник. \n\n"
+                "Набери /help, чтобы узнать, что я умею.",
+            )
 
+    @instrument("/help")
+    def help_handler(self, message, db):
+        """Команда /help — список доступных команд."""
+        try:
+            user = get_or_create_user_cached(
+                db, message.from_user.id, message.from_user.first_name or "Пользователь"
+            )
+            self.log_command(db, user.id, "/help")
 
-@bot.message_handler(commands=["news"])
-def news_handler(message):
-    """Команда /news — свежие новости."""
-    db = next(get_db())
-    try:
-        user = get_or_create_user(
+            self.outbox.send(message.chat.id, HELP_TEXT)
+        except Exception as e:
+            log_error("Ошибка при обработке команды /help", e)
+            self.outbox.send(message.chat.id, HELP_TEXT)
+
+    @instrument("/weather")
+    def weather_handler(self, message, db):
+        """Команда /weather — прогноз погоды для указанного города."""
+        user = get_or_create_user_cached(
             db, message.from_user.id, message.from_user.first_name or "Пользователь"
         )
 
-        articles = get_news()
-        if not articles:
-            bot.send_message(
-                message.chat.id, "Не удалось получить новости. Попробуйте позже."
+        parts = message.text.split(maxsplit=1)
+        if len(parts) < 2:
+            self.outbox.send(
+                message.chat.id, "Пожалуйста, укажите город. Пример: /weather Москва"
             )
-            create_log(db, user.id, "/news (ошибка получения)")
+            self.log_command(db, user.id, "/weather (без города)")
             return
 
-        news_messages = [
-            f"{article.get('title', 'Без заголовка')}\n{article.get('url', '')}"
-            for article in articles[:5]
-        ]
-
-        bot.send_message(message.chat.id, "\n\n".join(news_messages))
-        create_log(db, user.id, "/news")
+        city = parts[1]
+        if self.is_unknown_city(city):
+            self.outbox.send(
+                message.chat.id, f"Город '{city}' не найден. Попробуйте еще раз."
+            )
+            self.log_command(db, user.id, f"/weather {city} (город не найден)")
+            return
 
-    except Exception as e:
-        print(f"Ошибка при получении новостей: {e}")
-        bot.send_message(message.chat.id, "Произошла ошибка при получении новостей.")
         try:
-            user = get_or_create_user(
-                db, message.from_user.id, message.from_user.first_name or "Пользователь"
-            )
-            create_log(db, user.id, "/news (ошибка)")
-        except Exception:
-            pass
-    finally:
-        db.close()
+            data = self.weather_cache.get(city)
+        except Exception as e:
+            log_error("Ошибка при получении погоды", e)
+            self.outbox.send(message.chat.id, "Произошла ошибка при получении погоды.")
+            self.log_command(db, user.id, f"/weather {city} (ошибка)")
+            return
 
+        if data.get("cod") != 200:
+            self.outbox.send(
+                message.chat.id, f"Город '{city}' не найден. Попробуйте еще раз."
+            )
+            self.log_command(db, user.id, f"/weather {city} (город не найден)")
+            return
 
-@bot.message_handler(commands=["events"])
-def events_handler(message):
-    """Команда /events — список событий (по городу, если указан)."""
-    db = next(get_db())
-    try:
-        user = get_or_create_user(
-            db, message.from_user.id, message.from_user.first_name or "Пользователь"
+        resolved = self.resolve_city(city)
+        self.outbox.send(
+            message.chat.id, render_weather(resolved.display_name if resolved else city, data)
         )
-        create_log(db, user.id, "/events")
-    except Exception as e:
-        print(f"Ошибка при обработке команды /events: {e}")
-        bot.send_message(
-            message.chat.id, "События скоро будут доступны! Событие дня: вы молодец!"
-        )
-    finally:
-        db.close()
+        self.log_command(db, user.id, f"/weather {city}")
 
-    try:
+    @instrument("/news")
+    def news_handler(self, message, db):
+        """Команда /news — свежие новости."""
+        user = None
+        try:
+            user = get_or_create_user_cached(
+                db, message.from_user.id, message.from_user.first_name or "Пользователь"
+            )
+
+            text = self.news_snapshot.get_text()
+            if not text:
+                self.outbox.send(
+                    message.chat.id, "Не удалось получить новости. Попробуйте позже."
+                )
+                self.log_command(db, user.id, "/news (ошибка получения)")
+                return
+
+            self.outbox.send(message.chat.id, text)
+            self.log_command(db, user.id, "/news")
+
+        except Exception as e:
+            log_error("Ошибка при получении новостей", e)
+            self.outbox.send(message.chat.id, "Произошла ошибка при получении новостей.")
+            if user is not None:
+                self.log_command(db, user.id, "/news (ошибка)")
+
+    @instrument("/events")
+    def events_handler(self, message, db):
+        """Команда /events — список событий (по городу, если указан)."""
         parts = message.text.split(maxsplit=1)
         city = parts[1] if len(parts) > 1 else None
 
-        events = get_events(city)
-        if not events:
-            bot.send_message(
-                message.chat.id,
-                "Не удалось найти события. Попробуйте позже или укажите другой город.",
-            )
-            return
+        unknown = bool(city) and self.is_unknown_city(city)
 
-        event_messages = []
-        for ev in events:
-            name = html.unescape(ev.get("name", "Без названия"))
-            starts_at = ev.get("starts_at", "Дата неизвестна")
-            readable_date = (
-                format_datetime(starts_at)
-                if starts_at != "Дата неизвестна"
-                else starts_at
+        try:
+            user = get_or_create_user_cached(
+                db, message.from_user.id, message.from_user.first_name or "Пользователь"
             )
-            loc = ev.get("location", {})
-            city_name = loc.get("city", "") if isinstance(loc, dict) else ""
-            address = html.unescape(loc.get("address", "")) if isinstance(loc, dict) else ""
-            location_str = (
-                f" ({city_name}, {address})" if city_name or address else ""
+            # Неизвестные города помечаются, чтобы прогрев кэша их не учитывал
+            if unknown:
+                self.log_command(db, user.id, f"/events {city} (город не найден)")
+            else:
+                self.log_command(db, user.id, f"/events {city}" if city else "/events")
+        except Exception as e:
+            log_error("Ошибка при обработке команды /events", e)
+            self.outbox.send(
+                message.chat.id, "События скоро будут доступны! Событие дня: вы молодец!"
             )
-            url = ev.get("url", "")
-            event_messages.append(
-                f"{name}{location_str}\nДата: {readable_date}\n{url}"
+
+        if unknown:
+            self.outbox.send(
+                message.chat.id, f"Город '{city}' не найден. Попробуйте еще раз."
             )
+            return
+
+        try:
+            text = self.events_cache.get(city)
+            if not text:
+                self.outbox.send(
+                    message.chat.id,
+                    "Не удалось найти события. Попробуйте позже или укажите другой город.",
+                )
+                return
+
+            self.outbox.send(message.chat.id, text)
+
+        except Exception as e:
+            log_error("Ошибка при получении событий", e)
+            self.outbox.send(message.chat.id, "Произошла ошибка при получении событий.")
+
+    # ---------------------------------------------------------------
+    # Запуск и остановка
+    # ---------------------------------------------------------------
+    def start(self):
+        """Запустить фоновые потоки и задачи планировщика."""
+        self.log_writer.start()
+        self.outbox.start()
+        self.bot.dispatcher.start()
+        # Снимок новостей у каждого процесса свой, остальные задачи — только у лидера
+        self.news_snapshot.schedule(scheduler, NEWS_REFRESH_INTERVAL)
+        self.subscription_scheduler.schedule(leader_scheduler)
+        self.log_retention.schedule(leader_scheduler)
+        self.events_prefetcher.schedule(leader_scheduler, interval=EVENTS_CACHE_TTL // 2)
+        start_scheduler()
+        self.lease.start()
+        if METRICS_PORT:
+            MetricsServer(port=METRICS_PORT).start()
+
+    def stop(self):
+        """Остановить задачи и дождаться отправки сообщений и записи логов."""
+        self.lease.stop()
+        shutdown_scheduler()
+        self.bot.dispatcher.stop()
+        self.outbox.stop()
+        self.log_writer.stop()
+
+    def run_webhook(self):
+        """Принимать обновления через webhook вместо getUpdates."""
+        if not WEBHOOK_SECRET:
+            raise ValueError("WEBHOOK_SECRET не задан: без него webhook принимал бы любые запросы")
+        server = WebhookServer(
+            self.bot,
+            WEBHOOK_SECRET,
+            host=WEBHOOK_HOST,
+            port=WEBHOOK_PORT,
+            path=WEBHOOK_PATH,
+            dedup=self.dedup,
+        )
+        # Регистрировать webhook достаточно одному процессу из нескольких
+        if WEBHOOK_URL:
+            self.bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+        print(f"Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        try:
+            server.serve_forever()
+        finally:
+            server.shutdown()
+
+    def run_polling(self):
+        """
+        Получать обновления через getUpdates.
+
+        Telegram допускает одного получателя getUpdates, поэтому из нескольких
+        процессов опрашивает лидер, а остальные ждут аренды и подхватывают
+        опрос, если лидер остановился.
+        """
+        while True:
+            if not self.lease.is_leader:
+                print("Ожидание аренды лидера для получения обновлений")
+                self.lease.wait_leader()
+            try:
+                self.bot.polling(non_stop=True, timeout=20, long_polling_timeout=20)
+            except Exception as e:
+                print(f"Ошибка при получении обновлений: {e}")
+                time.sleep(3)
+                continue
+            if self.lease.is_leader:
+                return
+
+    def on_leadership_acquired(self):
+        """Возобновить задачи лидера."""
+        if leader_scheduler.running:
+            leader_scheduler.resume()
+
+    def on_leadership_lost(self):
+        """Приостановить задачи лидера и опрос getUpdates."""
+        if leader_scheduler.running:
+            leader_scheduler.pause()
+        if BOT_MODE != "webhook":
+            self.bot.stop_polling()
+
+    def run(self):
+        """Запустить бота в режиме BOT_MODE и остановить при выходе."""
+        self.start()
+        print("Бот запущен!")
+        try:
+            if BOT_MODE == "webhook":
+                self.run_webhook()
+            else:
+                self.run_polling()
+        except Exception as e:
+            print(f"Ошибка при запуске бота {e}")
+        finally:
+            self.stop()
 
-        bot.send_message(message.chat.id, "\n\n".join(event_messages))
 
-    except Exception as e:
-        print(f"Ошибка при получении событий: {e}")
-        bot.send_message(message.chat.id, "Произошла ошибка при получении событий.")
+def create_app(token: str | None = None) -> InformationBot:
+    """Создать приложение бота (токен по умолчанию — из TELEGRAM_BOT_TOKEN)."""
+    token = token or TOKEN
+    if not token:
+        raise ValueError("TELEGRAM_BOT_TOKEN не найден в переменных окружения")
+    return InformationBot(token)
 
 
 # -------------------------------------------------------------------
 # Запуск бота
 # -------------------------------------------------------------------
 if __name__ == "__main__":
-    print("Бот запущен!")
-    try:
-        bot.infinity_polling()
-    except Exception as e:
-        print(f"Ошибка при запуске бота {e}")
+    create_app().run()